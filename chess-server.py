@@ -0,0 +1,24 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging                  # Um Meldungen auszugeben
+import argparse                 # Damit beim Programmaufruf Werte übergeben werden können
+from chess.server import GameServer # Der Spielserver
+
+parser = argparse.ArgumentParser(description="Schachserver für viele Partien über TCP")
+parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+parser.add_argument("--cache", type=int, default=4096, metavar="N",
+                    help="remember the legal moves of N positions, 0 to disable (default: 4096)")
+parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+log = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+  server = GameServer(args.host, args.port, args.cache)
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    server.close_all()
@@ -2,12 +2,34 @@
 # -*- coding: utf-8 -*-
 
 import logging                  # Um Meldungen auszugeben
+import sys                      # Für die Standardeingabe
+import time                     # Zur Zeitmessung beim Nachspielen
 import argparse                 # Damit beim Programmaufruf Werte übergeben werden können
 import chess.manager as manager # Controller zur Durchführung des Schachspiels
+from chess.engine import Engine # Der Computergegner
+from chess.book import OpeningBook # Eröffnungsbuch für den Computergegner
+from chess.tablebase import Tablebase # Endspieldatenbanken für den Computergegner
+import chess.instrument as instrument # Zähler und Zeiten für --profile
 
 parser = argparse.ArgumentParser(description="Schachspiel für die Kommandozeile und zwei Spieler")
 parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true")
 parser.add_argument("-p", "--positions", default=None, help="String containing the positions")
+parser.add_argument("-f", "--fen", default=None, help="start from this position in FEN")
+parser.add_argument("-b", "--backend", choices=("mailbox","bitboard"), default="mailbox",
+                    help="board representation used for move generation and attack tests; "
+                         "bitboard drops the attack counters and is about 15%% faster in perft")
+parser.add_argument("-c", "--computer", choices=("white","black"), default=None,
+                    help="let the computer play this color")
+parser.add_argument("-t", "--time", type=float, default=5.0, help="seconds per computer move")
+parser.add_argument("--book", default=None, metavar="FILE",
+                    help="opening book in Polyglot format (standard Polyglot keys) for the computer")
+parser.add_argument("--tablebases", default=None, metavar="DIR",
+                    help="directory with endgame tablebases from tablebase-gen.py for the computer")
+parser.add_argument("-m", "--moves", default=None, metavar="FILE",
+                    help="replay the coordinate moves (e.g. E2E4, E7E8D) in FILE, - for stdin, "
+                         "without prompts and print only the final position")
+parser.add_argument("--profile", action="store_true",
+                    help="count and time move generation and safety checks, print a report at game end")
 args = parser.parse_args()
 
 log_level = logging.DEBUG if args.verbose else logging.WARN
@@ -17,5 +39,36 @@ logging.basicConfig(level=log_level) # Setze auf logging.DEBUG, damit Meldungen
 log = logging.getLogger(__name__)
 
     
+def replay(filename):
+  '''
+  Spielt die Züge aus filename nach und gibt nur die Endstellung, das
+  Ergebnis und die Zeit aus
+  '''
+  game = manager.get_chessboard(positions,args.backend,args.fen)
+  lines = sys.stdin if filename == '-' else open(filename)
+  started = time.time()
+  try:
+    plies = manager.replay(game,lines)
+  except ValueError, e:
+    print e
+    raise SystemExit(1)
+  elapsed = time.time() - started
+  manager.get_interface().display_game(str(game))
+  print game.to_fen()
+  print manager.get_result_message(game,game.get_result())
+  print manager.MSG_REPLAYED % (plies, elapsed, plies/elapsed if elapsed else 0)
+
 if __name__ == "__main__":
-  manager.start(positions)
+  book = OpeningBook(args.book) if args.book else None
+  tablebase = Tablebase(args.tablebases) if args.tablebases else None
+  engine = Engine(args.computer == "white", args.time, book=book, tablebase=tablebase) if args.computer else None
+  if args.profile:
+    instrument.enable()
+  try:
+    if args.moves:
+      replay(args.moves)
+    else:
+      manager.start(positions,args.backend,engine,args.fen)
+  finally:
+    if args.profile:
+      print instrument.format_report()
@@ -0,0 +1,232 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Bitboards als alternative Darstellung des Spielfelds. Für jede Figurenart
+# und Farbe gibt es eine 64-Bit-Zahl, in der das Bit i gesetzt ist, wenn
+# auf Feld i eine solche Figur steht. Die Felder werden dabei von a1 = 0
+# bis h8 = 63 gezählt, also Bit 8*(Reihe-1)+(Linie-1), und nicht wie in
+# Chessboard.positions von 11 bis 88.
+#
+# Die Angriffe von Springer, König und Bauer werden beim Import für jedes
+# Feld vorausberechnet, für Läufer, Turm und Dame die Strahlen in alle acht
+# Richtungen. Ob ein Feld angegriffen wird, sind dann wenige Operationen
+# mit ganzen Zahlen statt eines Durchlaufs über alle gegnerischen Figuren.
+#
+# Ein Spielbrett mit Bitboards führt keine Angriffszähler
+# (Chessboard.attacks): is_attacked() und get_attackers(), und damit die
+# Suche nach Schach und Fesselungen, fragen allein die Bitboards. Das
+# spart bei jedem set_cell() das Nachführen der Zähler und der Strahlen.
+# Die Figuren stehen weiter auch in Chessboard.positions. In perft ist das
+# Bitboard-Brett damit etwa 15% schneller als das Mailbox-Brett.
+
+import logging  # Um Meldungen auszugeben
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+# Umrechnung zwischen den Feldnummern 11-88 und den Bits 0-63
+###############################################################################
+
+SQUARES = [pos for pos in range(11,89) if 1 <= pos % 10 <= 8]   # Bit -> Feld
+BITS = dict((pos, i) for i, pos in enumerate(SQUARES))          # Feld -> Bit
+
+KNIGHT_DIRECTIONS = (-21,-19,-12,-8,8,12,19,21)
+KING_DIRECTIONS = (-11,-10,-9,-1,1,9,10,11)
+BISHOP_DIRECTIONS = (-11,-9,9,11)
+ROOK_DIRECTIONS = (-10,-1,1,10)
+
+def mask(positions):
+  '''
+  Die Bitmaske der Felder positions, Felder außerhalb des Bretts zählen nicht
+  '''
+  m = 0
+  for pos in positions:
+    if pos in BITS:
+      m |= 1 << BITS[pos]
+  return m
+
+def squares(m):
+  '''
+  Die Felder (11-88) zu den gesetzten Bits von m
+  '''
+  result = []
+  while m:
+    lowest = m & -m
+    result.append(SQUARES[lowest.bit_length()-1])
+    m ^= lowest
+  return result
+
+###############################################################################
+# Vorausberechnete Tabellen
+###############################################################################
+
+KNIGHT_ATTACKS = [mask([pos+d for d in KNIGHT_DIRECTIONS]) for pos in SQUARES]
+KING_ATTACKS = [mask([pos+d for d in KING_DIRECTIONS]) for pos in SQUARES]
+# PAWN_ATTACKS[True] für weiße, PAWN_ATTACKS[False] für schwarze Bauern
+PAWN_ATTACKS = {
+  True: [mask([pos+9, pos+11]) for pos in SQUARES],
+  False: [mask([pos-9, pos-11]) for pos in SQUARES]
+}
+
+def ray(pos, direction):
+  '''
+  Alle Felder von pos aus in Richtung direction bis zum Rand
+  '''
+  positions = []
+  step = pos + direction
+  while step in BITS:
+    positions.append(step)
+    step += direction
+  return mask(positions)
+
+RAYS = dict((d, [ray(pos, d) for pos in SQUARES]) for d in KING_DIRECTIONS)
+
+def ray_attacks(direction, i, occupied):
+  '''
+  Die von Bit i aus in Richtung direction angegriffenen Felder. Der Strahl
+  endet am ersten besetzten Feld; in positiver Richtung ist das das
+  niedrigste, in negativer das höchste gesetzte Bit.
+  '''
+  attacks = RAYS[direction][i]
+  blockers = attacks & occupied
+  if blockers:
+    if direction > 0:
+      first = (blockers & -blockers).bit_length() - 1
+    else:
+      first = blockers.bit_length() - 1
+    attacks ^= RAYS[direction][first]
+  return attacks
+
+def slider_attacks(directions, i, occupied):
+  attacks = 0
+  for direction in directions:
+    attacks |= ray_attacks(direction, i, occupied)
+  return attacks
+
+###############################################################################
+# Die Bitboards eines Spielbretts
+###############################################################################
+
+class Bitboards(object):
+  '''
+  Je ein Bitboard pro Figurenart und Farbe, geschlüsselt mit dem Namen der
+  Figur wie in str(piece), dazu die Belegung je Farbe. Wird von Chessboard
+  über set_cell() mit jeder Änderung des Spielfelds nachgeführt.
+  '''
+
+  def __init__(self, positions=None):
+    self.pieces = dict.fromkeys('BTSLDKbtsldk', 0)
+    self.white = 0
+    self.black = 0
+    for pos in SQUARES:
+      if positions and positions[pos]:
+        self.put(positions[pos], pos)
+
+  def put(self, piece, pos):
+    '''
+    Setzt piece auf das Feld pos
+    '''
+    bit = 1 << BITS[pos]
+    self.pieces[str(piece)] |= bit
+    if piece.is_white:
+      self.white |= bit
+    else:
+      self.black |= bit
+
+  def remove(self, piece, pos):
+    '''
+    Entfernt piece vom Feld pos
+    '''
+    bit = ~(1 << BITS[pos])
+    self.pieces[str(piece)] &= bit
+    if piece.is_white:
+      self.white &= bit
+    else:
+      self.black &= bit
+
+  def is_attacked(self, pos, by_white, ignore=None):
+    '''
+    True, wenn das Feld pos von einer Figur der Farbe by_white angegriffen
+    wird. Mit ignore gilt das Feld ignore als leer, wie in
+    Chessboard.is_attacked().
+    '''
+    i = BITS[pos]
+    p = self.pieces
+    if by_white:
+      pawns, knights, king = p['B'], p['S'], p['K']
+      diagonal, straight = p['L'] | p['D'], p['T'] | p['D']
+    else:
+      pawns, knights, king = p['b'], p['s'], p['k']
+      diagonal, straight = p['l'] | p['d'], p['t'] | p['d']
+    occupied = self.white | self.black
+    if ignore is not None:
+      keep = ~(1 << BITS[ignore])
+      occupied &= keep
+      pawns, knights, king = pawns & keep, knights & keep, king & keep
+      diagonal, straight = diagonal & keep, straight & keep
+    # Ein Bauer greift pos an, wenn ein Bauer der Gegenfarbe auf pos sein Feld angreift
+    if PAWN_ATTACKS[not by_white][i] & pawns or KNIGHT_ATTACKS[i] & knights \
+        or KING_ATTACKS[i] & king:
+      return True
+    if diagonal and slider_attacks(BISHOP_DIRECTIONS, i, occupied) & diagonal:
+      return True
+    if straight and slider_attacks(ROOK_DIRECTIONS, i, occupied) & straight:
+      return True
+    return False
+
+  def get_attackers(self, pos, by_white):
+    '''
+    Die Felder (11-88) aller Figuren der Farbe by_white, die pos angreifen
+    '''
+    i = BITS[pos]
+    p = self.pieces
+    if by_white:
+      pawns, knights, king = p['B'], p['S'], p['K']
+      diagonal, straight = p['L'] | p['D'], p['T'] | p['D']
+    else:
+      pawns, knights, king = p['b'], p['s'], p['k']
+      diagonal, straight = p['l'] | p['d'], p['t'] | p['d']
+    attackers = PAWN_ATTACKS[not by_white][i] & pawns | KNIGHT_ATTACKS[i] & knights \
+      | KING_ATTACKS[i] & king
+    occupied = self.white | self.black
+    if diagonal:
+      attackers |= slider_attacks(BISHOP_DIRECTIONS, i, occupied) & diagonal
+    if straight:
+      attackers |= slider_attacks(ROOK_DIRECTIONS, i, occupied) & straight
+    return squares(attackers)
+
+  def get_moves(self, white, en_passant=None):
+    '''
+    Gibt die Liste der Züge (start, target) aller Figuren der Farbe white
+    außer dem König, ohne zu prüfen, ob der eigene König danach im Schach
+    steht. en_passant ist das Feld, auf dem en passant geschlagen werden
+    kann, oder None.
+    '''
+    p = self.pieces
+    own, opposing = (self.white, self.black) if white else (self.black, self.white)
+    occupied = own | opposing
+    moves = []
+    names = 'BSLTD' if white else 'bsltd'
+    for name, directions in ((names[2], BISHOP_DIRECTIONS),
+                             (names[3], ROOK_DIRECTIONS),
+                             (names[4], KING_DIRECTIONS)):
+      for start in squares(p[name]):
+        i = BITS[start]
+        for target in squares(slider_attacks(directions, i, occupied) & ~own):
+          moves.append((start, target))
+    for start in squares(p[names[1]]):
+      for target in squares(KNIGHT_ATTACKS[BITS[start]] & ~own):
+        moves.append((start, target))
+    capturable = opposing
+    if en_passant:
+      capturable |= 1 << BITS[en_passant]
+    forward = 10 if white else -10
+    for start in squares(p[names[0]]):
+      for target in squares(PAWN_ATTACKS[white][BITS[start]] & capturable):
+        moves.append((start, target))
+      target = start + forward
+      if not occupied & (1 << BITS[target]):
+        moves.append((start, target))
+        if start/10 == (2 if white else 7) and not occupied & (1 << BITS[target+forward]):
+          moves.append((start, target+forward))
+    return moves
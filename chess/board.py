@@ -2,23 +2,98 @@
 # -*- coding: utf-8 -*-
 
 import logging                        # Um Meldungen auszugeben
-from pieces import King, Rook, Pawn   # Für Rochade, Schachbedingung und en passant Regel
+from array import array               # Für die history
+from pieces import King, Pawn, Knight # Für Rochade, Schachbedingung und en passant Regel
+# Vorberechnete Tabellen, um von einem Feld aus nach Angreifern zu suchen
+from pieces import SQUARES, KNIGHT_SQUARES, KING_SQUARES, RAYS
 import manager                        # Für Zugriff auf Textkonstanten und Figurenerzeugung
+from bitboard import Bitboards        # Für die alternative Darstellung als Bitboards
+import zobrist                        # Für den Hashwert der Stellung
 
 log = logging.getLogger(__name__)
 
+###############################################################################
+# FEN (Forsyth-Edwards-Notation) verwendet die englischen Namen der Figuren
+###############################################################################
+
+FEN_NAMES = {'P': 'B', 'R': 'T', 'N': 'S', 'B': 'L', 'Q': 'D', 'K': 'K',
+             'p': 'b', 'r': 't', 'n': 's', 'b': 'l', 'q': 'd', 'k': 'k'}
+FEN_LETTERS = dict((name, letter) for letter, name in FEN_NAMES.items())
+FILES = 'abcdefgh'
+
+###############################################################################
+# Züge in 16 Bit: 6 Bit Start, 6 Bit Ziel, 4 Bit Umwandlungsfigur oder
+# Kennzeichen. So stehen sie in history und in der Transpositionstabelle.
+###############################################################################
+
+INDEX = dict((pos, i) for i, pos in enumerate(SQUARES))
+PROMOTIONS = (None, 'D', 'T', 'L', 'S', 'd', 't', 'l', 's')
+DOUBLE_STEP = 9                  # Bauer zieht zwei Felder, für en passant
+CASTLING = 10                    # König zieht zwei Felder
+NO_MOVE = 0xffff
+
+def pack_move(move, flag=0):
+  '''
+  Verpackt den Zug (start, target[, promotion]) in eine Zahl mit 16 Bit.
+  Ohne Umwandlung kann flag DOUBLE_STEP oder CASTLING sein.
+  '''
+  if move is None:
+    return NO_MOVE
+  promotion = move[2] if len(move) > 2 else None
+  special = PROMOTIONS.index(promotion) if promotion else flag
+  return INDEX[move[0]] | INDEX[move[1]] << 6 | special << 12
+
+def unpack_move(code):
+  '''
+  Das Gegenstück zu pack_move(), liefert (start, target, promotion) oder None
+  '''
+  if code == NO_MOVE:
+    return None
+  special = code >> 12
+  return SQUARES[code & 63], SQUARES[code >> 6 & 63], \
+    PROMOTIONS[special] if special < len(PROMOTIONS) else None
+
+def get_flag(code):
+  return code >> 12
+
+# Ergebnisse von get_result()
+CHECKMATE = 'checkmate'
+STALEMATE = 'stalemate'
+REPETITION = 'repetition'        # Dreimal dieselbe Stellung: remis
+FIFTY_MOVES = 'fifty-moves'      # 50 Züge ohne Bauernzug oder Schlagen: remis
+DRAWS = (STALEMATE, REPETITION, FIFTY_MOVES)
+
+# Die Hashwerte haben 64 Bit; wo long nur 32 Bit hat, in einer Liste
+HASH_TYPE = 'L' if array('L').itemsize >= 8 else None
+
+def new_hash_history(position_hash):
+  return array(HASH_TYPE, [position_hash]) if HASH_TYPE else [position_hash]
+
 class Chessboard():
   '''
   Container für Spielfeldbelegungen
   '''
   has_finnished = False            # Für die Abbruchbedingung
   is_white      = True             # True, wenn weiß am Zug ist
-  history       = None             # Um sich die Spielzüge zu merken
+  history       = None             # Die Spielzüge, mit pack_move() verpackt
+  hashes        = None             # position_hash vor dem ersten und nach jedem Zug in history
+  undo_stack    = None             # Um mit make_move ausgeführte Züge zurückzunehmen
   positions     = None             # Spielfeld mit Belegungen
+  bitboards     = None             # Bitboards, falls mit backend='bitboard' erzeugt
+  position_hash = 0                # Zobrist-Hash der Stellung, wird laufend nachgeführt
+  state_key     = 0                # Anteil von Rochaderechten und en passant am Hash
+  attacks       = None             # Je Farbe die Zahl der Angreifer für jedes Feld, ohne Bitboards
+  pieces        = None             # Die Figuren auf dem Brett je Name wie in str(piece)
+  results       = None             # Matt und Patt aus get_result() je position_hash
+  move_cache    = None             # Optionaler MoveCache, auch von mehreren Brettern geteilt
+  halfmove_clock = 0               # Halbzüge seit dem letzten Bauernzug oder Schlagen
+  is_capture    = False            # Ob set_piece() zuletzt eine Figur geschlagen hat
+  start_ply     = 0                # Halbzüge vor dem ersten Eintrag in history (aus FEN)
   white_king    = None
   black_king    = None
   white_rooks   = None
   black_rooks   = None
+  promotions    = ('D','T','L','S') # In diese Figuren kann ein Bauer verwandelt werden
   initial_positions = [
     "T,S,L,D,K,L,S,T",
     "B,B,B,B,B,B,B,B",
@@ -30,23 +105,34 @@ class Chessboard():
     "t,s,l,d,k,l,s,t"
   ]
 
-  def __init__(self,positions=None):
+  def __init__(self,positions=None,backend='mailbox'):
     # Initialize positions
     #
     # Es werden Reihen à 10 genommen, um bei diagonalen Bewegungn
     # der Figuren den Rand leichter bestimmen zu können. Außerdem
     # oben und unten je eine Reihe mit nix 
+    #
+    # Mit backend='bitboard' werden zusätzlich Bitboards geführt, über die
+    # Angriffe geprüft und Züge erzeugt werden. Die Angriffszähler entfallen
+    # dann. Die Figuren selbst bleiben in positions, damit get_piece() sie
+    # weiter liefern kann.
+    if backend not in ('mailbox','bitboard'):
+      raise ValueError("Unknown backend %s" % backend)
     if isinstance(positions,str):
       positions=positions.splitlines()
     positions = positions if positions is not None else self.initial_positions
     self.positions = []
-    self.history = []
+    self.history = array('H')
+    self.undo_stack = []
+    self.results = {}
     for i in range(10):
       self.positions.append(None)        # Eine Reihe nix
     for i in range(8):
       self.positions.append(None)        # Nix am linken Rand
       if positions:
-        rank = positions[i].split(',')   # Der String mit den Belegungen
+        rank = positions[i]              # Der String mit den Belegungen
+        if isinstance(rank,str):
+          rank = rank.split(',')
       else:
         rank = ['','','','','','','',''] # Leeres Brett initialisieren
       for j in range(8):              
@@ -54,22 +140,30 @@ class Chessboard():
       self.positions.append(None)        # Nix am rechten Rand
     for i in range(10):
       self.positions.append(None)
-    # Positionen der Türme merken für eventuelle Rochaden
-    rooks = filter(lambda p: isinstance(p,Rook),self.positions)
-    self.white_rooks = []
-    self.black_rooks = []
-    for r in rooks:
-      if r.is_white:
-        self.white_rooks.append(r)
-      else:
-        self.black_rooks.append(r)
-    # Positionen der Könige merken um Schach feststellen zu können
-    kings = filter(lambda p: isinstance(p,King),self.positions)
-    for k in kings:
-      if k.is_white:
-        self.white_king = k
-      else:
-        self.black_king = k
+    # Die Figuren sollen Züge auf diesem Brett prüfen
+    for piece in self.positions:
+      if piece:
+        piece.chessboard = self
+    # Die Figuren je Art und Farbe, geschlüsselt mit dem Namen wie in str(piece)
+    self.pieces = dict((name, []) for name in 'BTSLDKbtsldk')
+    for piece in self.positions:
+      if piece:
+        self.pieces[str(piece)].append(piece)
+    # Die Listen der Türme für eventuelle Rochaden sind dieselben Listen
+    self.white_rooks = self.pieces['T']
+    self.black_rooks = self.pieces['t']
+    # Die Könige merken um Schach feststellen zu können
+    if self.pieces['K']:
+      self.white_king = self.pieces['K'][0]
+    if self.pieces['k']:
+      self.black_king = self.pieces['k'][0]
+    if backend == 'bitboard':
+      self.bitboards = Bitboards(self.positions)
+    if not self.bitboards:
+      self.attacks = self.compute_attacks()
+    self.position_hash = zobrist.compute(self)
+    self.state_key = zobrist.state_key(self)
+    self.hashes = new_hash_history(self.position_hash)
     
   def __str__(self):
     out = ''
@@ -80,6 +174,93 @@ class Chessboard():
       s = str(self.get_piece(10*i+8))
       out+="%s\n" % s
     return out.strip()
+
+  ################################################################################
+  # FEN
+  ################################################################################
+
+  @classmethod
+  def from_fen(cls,fen,backend='mailbox'):
+    '''
+    Returns a new Chessboard with the position given in FEN, e.g.
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+
+    Die Figurenaufstellung wird in einem Durchlauf direkt in die Reihen für
+    __init__ übersetzt. Fehlende Rochaderechte werden als bewegter Turm
+    bzw. König abgebildet, das en passant Feld als letzter Zug in history.
+    '''
+    fields = fen.split()
+    if not 1 <= len(fields) <= 6:
+      raise ValueError("Invalid FEN %s" % fen)
+    fields += ['w', '-', '-', '0', '1'][len(fields)-1:]
+    ranks, rank = [], []
+    for c in fields[0]:
+      if c == '/':
+        ranks.append(rank)
+        rank = []
+      elif c in FEN_NAMES:
+        rank.append(FEN_NAMES[c])
+      elif c in '12345678':
+        rank += [''] * int(c)
+      else:
+        raise ValueError("Invalid piece %s in FEN %s" % (c,fen))
+    ranks.append(rank)
+    if len(ranks) != 8 or [r for r in ranks if len(r) != 8]:
+      raise ValueError("FEN %s does not describe 8 ranks of 8 squares" % fen)
+    ranks.reverse()
+    board = cls(ranks,backend)
+    side, castling, en_passant = fields[1], fields[2], fields[3]
+    if side not in ('w','b'):
+      raise ValueError("Invalid side to move %s in FEN %s" % (side,fen))
+    # Rochaderechte: weiß kurz, weiß lang, schwarz kurz, schwarz lang
+    for right, (pos_k, pos_r) in zip('KQkq', zobrist.CORNERS):
+      if right not in castling:
+        rook = board.get_piece(pos_r)
+        if rook:
+          rook.has_never_been_moved = False
+    for king, rights in ((board.white_king, 'KQ'), (board.black_king, 'kq')):
+      if king and not [r for r in rights if r in castling]:
+        king.has_never_been_moved = False
+    if en_passant != '-':
+      if len(en_passant) != 2 or en_passant[0] not in FILES or en_passant[1] not in '36':
+        raise ValueError("Invalid en passant square %s in FEN %s" % (en_passant,fen))
+      pos = 10 * int(en_passant[1]) + FILES.index(en_passant[0]) + 1
+      step = 10 if en_passant[1] == '3' else -10
+      board.append_history((pos-step, pos+step))
+    if side == 'b':
+      board.switch_color()
+    board.halfmove_clock = int(fields[4])
+    board.start_ply = 2 * (int(fields[5]) - 1) + (side == 'b') - len(board.history)
+    board.update_state_key()
+    board.hashes = new_hash_history(board.position_hash)
+    return board
+
+  def to_fen(self):
+    '''
+    Returns the position in FEN
+    '''
+    out = []
+    for i in range(8,0,-1):
+      empty = 0
+      for cell in self.positions[10*i+1:10*i+9]:
+        if cell:
+          if empty:
+            out.append(str(empty))
+            empty = 0
+          out.append(FEN_LETTERS[str(cell)])
+        else:
+          empty += 1
+      if empty:
+        out.append(str(empty))
+      out.append('/' if i > 1 else ' ')
+    out.append('w' if self.is_white else 'b')
+    castling = ''.join([right for right, allowed \
+      in zip('KQkq', zobrist.castling_rights(self)) if allowed])
+    pos = self.get_en_passant_position()
+    en_passant = FILES[pos % 10 - 1] + str(pos / 10) if pos else '-'
+    fullmove = (self.start_ply + len(self.history)) / 2 + 1
+    out.append(" %s %s %i %i" % (castling or '-', en_passant, self.halfmove_clock, fullmove))
+    return ''.join(out)
   
   ################################################################################
   # Public interface
@@ -94,41 +275,216 @@ class Chessboard():
     if self.is_valid_move(move):
       self.set_piece(piece_to_be_moved,target_pos)
       # Wenn durch den Zug der gegnerische König in Schach gestellt wird:
+      # Ob er matt ist, entscheidet get_result(), wenn der Gegner am Zug ist
       opposing_king = self.get_king_of_opponent()
       if not opposing_king.is_safe_position():
         opposing_king.is_check_given = True
-        # Wenn der gegnerische König nicht mehr ausweichen kann:
-        if not opposing_king.get_safe_positions():
-          self.has_finnished = True
       return True
     else:
       return False
 
+  def make_move(self,move):
+    '''
+    Performs the move (start, target[, promotion]) without validation, such
+    that it can be taken back by unmake_move(). Der Zug wird in die history
+    übernommen und die Farbe umgeschaltet.
+
+    Vorher werden alle Felder gemerkt, die der Zug verändern kann (Start,
+    Ziel, Turmfelder bei der Rochade, Feld des en passant geschlagenen
+    Bauern), zusammen mit Position und has_never_been_moved der Figuren
+    darauf und dem Schachzustand der Könige.
+    '''
+    start, target = move[0], move[1]
+    promotion = move[2] if len(move) > 2 else None
+    piece = self.get_piece(start)
+    cells = [start, target]
+    if isinstance(piece,King):
+      if target-start == 2:
+        cells += [target+1, start+1]
+      elif target-start == -2:
+        cells += [target-2, start-1]
+    elif isinstance(piece,Pawn):
+      cells.append(target-10 if piece.is_white else target+10)
+    occupations = [(pos, self.positions[pos]) for pos in cells]
+    states = [(p, p.get_position(), p.has_never_been_moved) \
+              for pos, p in occupations if p]
+    kings = [(k, k.is_check_given) for k in (self.white_king, self.black_king) if k]
+    self.undo_stack.append((occupations, states, kings, self.has_finnished, self.halfmove_clock))
+    self.set_piece(piece,target)
+    if promotion:
+      self.set_cell(target,manager.newinstance(promotion,target))
+      self.positions[target].has_never_been_moved = False
+    self.append_history((start,target,promotion))
+    self.switch_color()
+
+  def unmake_move(self):
+    '''
+    Nimmt den letzten mit make_move() ausgeführten Zug zurück
+    '''
+    occupations, states, kings, has_finnished, halfmove_clock = self.undo_stack.pop()
+    self.switch_color()
+    self.history.pop()
+    self.hashes.pop()
+    self.halfmove_clock = halfmove_clock
+    for pos, occupation in reversed(occupations):
+      self.set_cell(pos,occupation)
+    for piece, pos, has_never_been_moved in states:
+      piece.set_position(pos)
+      piece.has_never_been_moved = has_never_been_moved
+    for king, is_check_given in kings:
+      king.is_check_given = is_check_given
+    self.has_finnished = has_finnished
+    self.update_state_key()
+
   def get_piece(self,pos):
     '''
     Returns piece on position pos or None or -1
     '''
     return  self.positions[pos]
+
+  def set_cell(self,pos,cell_occupation):
+    '''
+    Belegt das Feld pos mit cell_occupation (Figur oder ''), ohne die
+    Position der Figur anzupassen. Alle Änderungen an positions laufen
+    hierüber, damit Bitboards, Figurenlisten und Angriffe aktuell bleiben.
+    '''
+    old = self.positions[pos]
+    if old:
+      self.pieces[str(old)].remove(old)
+      self.position_hash ^= zobrist.PIECES[str(old)][pos]
+      if self.bitboards:
+        self.bitboards.remove(old,pos)
+      else:
+        self.add_attacks(old,pos,-1)
+    # Läufer, Türme und Damen, die über pos hinweg ziehen, reichen nun
+    # weiter oder weniger weit
+    if bool(old) != bool(cell_occupation) and not self.bitboards:
+      self.update_rays(pos,-1 if cell_occupation else 1)
+    self.positions[pos] = cell_occupation
+    if cell_occupation:
+      cell_occupation.chessboard = self
+      self.pieces[str(cell_occupation)].append(cell_occupation)
+      self.position_hash ^= zobrist.PIECES[str(cell_occupation)][pos]
+      if self.bitboards:
+        self.bitboards.put(cell_occupation,pos)
+      else:
+        self.add_attacks(cell_occupation,pos,1)
+
+  def compute_attacks(self):
+    '''
+    Zählt für jedes Feld und jede Farbe, wie viele Figuren es angreifen.
+    Danach werden die Zähler in set_cell() nachgeführt.
+    '''
+    attacks = {True: [0] * 100, False: [0] * 100}
+    for is_white in (True, False):
+      for piece in self.get_pieces(is_white):
+        for pos in piece.get_attacked_positions():
+          attacks[is_white][pos] += 1
+    return attacks
+
+  def add_attacks(self,piece,pos,delta):
+    '''
+    Addiert delta zu den Zählern der Felder, die piece von pos aus angreift
+    '''
+    counts = self.attacks[piece.is_white]
+    for attacked in piece.get_attacked_positions(pos):
+      counts[attacked] += delta
+
+  def update_rays(self,pos,delta):
+    '''
+    Sucht in allen Richtungen die erste Figur. Zieht sie als Läufer, Turm
+    oder Dame über pos hinweg, werden die Felder hinter pos bis zur nächsten
+    Figur um delta geändert.
+    '''
+    positions = self.positions
+    for direction in King.directions:
+      step = pos - direction
+      while positions[step] == '':
+        step -= direction
+      piece = positions[step]
+      if piece and piece.is_sliding and direction in piece.directions:
+        counts = self.attacks[piece.is_white]
+        step = pos + direction
+        while positions[step] == '':
+          counts[step] += delta
+          step += direction
+        if positions[step]:
+          counts[step] += delta
+
+  def update_state_key(self):
+    '''
+    Führt Rochaderechte und en passant im Hash nach, nachdem Figuren
+    gezogen oder die history geändert wurde
+    '''
+    state_key = zobrist.state_key(self)
+    self.position_hash ^= self.state_key ^ state_key
+    self.state_key = state_key
   
   def switch_color(self):
     '''
     Schaltet die Farbe um, um die Farbe des ziehenden Spielers zu bestimmen
     '''
     self.is_white = not self.is_white
+    self.position_hash ^= zobrist.BLACK_TO_MOVE
     
   def append_history(self, move):
     '''
-    Addiert einen Spielzug zur history
+    Addiert den ausgeführten Spielzug (start, target[, promotion]) zur
+    history. Doppelschritte von Bauern und Rochaden werden gekennzeichnet.
+
+    Außerdem werden halfmove_clock weitergezählt und der Hash der Stellung
+    an hashes angehängt, so wie er nach dem Farbwechsel ist, der auf jeden
+    Zug folgt.
     '''
-    start, target = move
+    start, target = move[0], move[1]
     piece = self.get_piece(target)
-    self.history.append((start,target,piece))
+    promotion = move[2] if len(move) > 2 else None
+    flag = 0
+    if isinstance(piece,Pawn) and abs(target-start) == 20:
+      flag = DOUBLE_STEP
+    elif isinstance(piece,King) and abs(target-start) == 2:
+      flag = CASTLING
+    self.history.append(pack_move(move,flag))
+    if self.is_capture or promotion or isinstance(piece,Pawn):
+      self.halfmove_clock = 0
+    else:
+      self.halfmove_clock += 1
+    self.is_capture = False
+    self.update_state_key()
+    self.hashes.append(self.position_hash ^ zobrist.BLACK_TO_MOVE)
+
+  def get_history_data(self):
+    '''
+    Die history als Bytes (2 je Halbzug, in der Byte-Reihenfolge des
+    Rechners), ohne sie zu kopieren. Mit unpack_move() lesbar, nachdem sie
+    mit array('H').fromstring() eingelesen wurden.
+    '''
+    return buffer(self.history)
     
+  def get_pieces(self,is_white):
+    '''
+    Returns a list of all pieces of the given color on the board
+    '''
+    pieces = []
+    for name in 'BTSLDK' if is_white else 'btsldk':
+      pieces += self.pieces[name]
+    return pieces
+
   def get_last_move(self):
     '''
-    gibt den letzten Zug zurück
+    gibt den letzten Zug als (start, target, promotion) zurück, oder None
     '''
-    return self.history[-1] if self.history else (0, 0, -1)
+    return unpack_move(self.history[-1]) if self.history else None
+
+  def get_en_passant_position(self):
+    '''
+    Das Feld, auf dem im nächsten Zug en passant geschlagen werden kann,
+    oder None
+    '''
+    if self.history and get_flag(self.history[-1]) == DOUBLE_STEP:
+      start, target, promotion = unpack_move(self.history[-1])
+      return (start+target)/2
+    return None
      
   def is_check_given(self):
     '''
@@ -172,12 +528,13 @@ class Chessboard():
     pos. Can also perform a castling
     '''
     start_pos = piece.get_position()
-    self.positions[pos] = piece
+    self.is_capture = bool(self.positions[pos]) and self.positions[pos] is not piece
+    self.set_cell(pos,piece)
     if piece.has_never_been_moved:
       piece.has_never_been_moved = False
     # Nicht vergessen das alte Feld auf unbesetzt zu setzen
     if start_pos != pos:
-      self.positions[start_pos] = ''
+      self.set_cell(start_pos,'')
       piece.set_position(pos)
     # Wenn es eine Rochade sein soll
     if isinstance(piece,King):
@@ -188,10 +545,12 @@ class Chessboard():
     # Wenn ein Bauer en passant geschlagen werden soll
     if isinstance(piece, Pawn):
       log.debug("Prüfe, ob auf %i+-10 ein Bauer en passant geschlagen werden kann",pos)
-      p = self.get_piece(pos-10) if self.is_white else self.get_piece(pos+10)
+      p = self.get_piece(pos-10) if piece.is_white else self.get_piece(pos+10)
       if p and p.can_be_hit_en_passant():
         log.debug("Schlage Bauer auf %i en passant!",p.get_position()) 
-        self.positions[p.get_position()]=''
+        self.set_cell(p.get_position(),'')
+        self.is_capture = True
+    self.update_state_key()
     
   ################################################################################
   # Some test functions
@@ -200,59 +559,265 @@ class Chessboard():
   def is_admissible_piece(self, cell_occupation):
     '''
     True if cell is not empty and piece is of admissible color.
-    If check is given, piece must be the attacked king
+    Ob ein Zug ein Schach aufhebt, prüft die Figur selbst über
+    is_safe_move(), deshalb darf auch bei Schach jede eigene Figur ziehen.
     '''
     if cell_occupation:
-      if self.is_check_given():
-        return cell_occupation.is_king_of_moving_player()
-      else:
-        return cell_occupation.is_moving()
+      return cell_occupation.is_moving()
     else:
       return False
   
   def is_valid_move(self,move):
     '''
-    True if piece is admissible and piece can reach target cell
+    True if piece is admissible and piece can reach target cell. Mit einem
+    move_cache wird nur in den erlaubten Zügen der Stellung nachgeschlagen.
     '''
     start, target = move
+    if self.move_cache is not None:
+      return (start, target) in self.get_cached_moves()[1]
     piece = self.get_piece(start)
     return self.is_admissible_piece(piece) and piece.is_valid_move(target)
 
-class Simulator:
-  '''
-  Um einen Zug zu simulieren. Ein neues Schachspiel mit den
-  aktuellen Stellungen verändert um den zu simulierenden Zug
-  wird erzeugt, um die Bedrohung für den König der ziehenden
-  Partei zu analysieren.
-  '''
-  chessboard=None
+  def legal_moves(self,captures=False):
+    '''
+    Returns the list of all legal moves (start, target, promotion) of the
+    moving player.
 
-  def __init__(self, start_pos, target_pos):
-    piece = self.get_piece(start_pos)
-    self.set_piece(piece,target_pos)
-  
-  def get_chessboard(self):
+    promotion ist None oder der Name der Figur, in die ein Bauer verwandelt
+    wird; für jede Bauernumwandlung gibt es einen Zug je Figur aus
+    promotions. Rochaden sind Züge des Königs um zwei Felder. Mit
+    captures=True nur Schlagzüge (auch en passant) und Umwandlungen.
+
+    Mit einem move_cache werden alle Züge je position_hash gemerkt.
     '''
-    Lazy initialization of a new game from the current game
+    if self.move_cache is not None and not captures:
+      return list(self.get_cached_moves()[0])
+    return self.generate_moves(captures)
+
+  def get_cached_moves(self):
     '''
-    if not self.chessboard:
-      self.chessboard = Chessboard(str(manager.get_chessboard()))
-      self.chessboard.is_white=manager.get_chessboard().is_white
-    return self.chessboard
-  
-  def get_piece(self,pos):
-    return self.get_chessboard().get_piece(pos)
-  
-  def set_piece(self, piece, target_pos):
+    Returns the entry (moves, pairs) of move_cache for this position, see
+    MoveCache.get(). Fehlt er, werden die Züge erzeugt und gespeichert.
     '''
-    Kapselt chessboard.set_piece
-    ''' 
-    log.debug("Simulating a move...")
-    self.get_chessboard().set_piece(piece,target_pos)
-  
-  def is_safe_position_for_king(self):
+    entry = self.move_cache.get(self.position_hash)
+    if entry is None:
+      entry = self.move_cache.put(self.position_hash, self.generate_moves())
+    return entry
+
+  def generate_moves(self,captures=False):
+    '''
+    Erzeugt die Züge für legal_moves(), ohne move_cache
+    '''
+    moves = []
+    if self.bitboards:
+      king = self.get_king_of_moving_player()
+      candidates = self.bitboards.get_moves(self.is_white,self.get_en_passant_position())
+      candidates += [(king.get_position(),t) for t in king.get_admissible_positions()]
+    else:
+      candidates = []
+      for piece in self.get_pieces(self.is_white):
+        start = piece.get_position()
+        candidates += [(start,t) for t in piece.get_admissible_positions()]
+    if captures:
+      candidates = [(start,target) for start, target in candidates \
+        if self.get_piece(target) or (isinstance(self.get_piece(start),Pawn) \
+          and ((target-start) % 10 or target/10 in (1,8)))]
+    checks = self.get_checks_and_pins(self.get_king_of_moving_player())
+    for start, target in candidates:
+      piece = self.get_piece(start)
+      if self.is_legal_move((start,target),checks):
+        if isinstance(piece,Pawn) and target/10 in (1,8):
+          for name in self.promotions:
+            moves.append((start, target, name if self.is_white else name.lower()))
+        else:
+          moves.append((start, target, None))
+    return moves
+
+  def has_legal_move(self):
+    '''
+    True, sobald ein erlaubter Zug der Farbe am Zug gefunden ist. Die Züge
+    werden Figur für Figur erzeugt, beginnend beim König, so dass meist
+    nur wenige Figuren betrachtet werden. Mit einem move_cache werden
+    alle Züge erzeugt und gemerkt, sie werden meist gleich gebraucht.
+    '''
+    if self.move_cache is not None:
+      return bool(self.get_cached_moves()[0])
+    king = self.get_king_of_moving_player()
+    checks = self.get_checks_and_pins(king)
+    for piece in [king] + [p for p in self.get_pieces(self.is_white) if p is not king]:
+      start = piece.get_position()
+      for target in piece.get_admissible_positions():
+        if self.is_legal_move((start,target),checks):
+          return True
+    return False
+
+  def get_result(self):
     '''
-    Prüft, ob der eigene König durch den geplanten Zug in Bedrängnis gerät
-    '''  
-    return self.get_chessboard().get_king_of_moving_player().is_safe_position()
+    Returns CHECKMATE or STALEMATE if the moving player has no legal move,
+    FIFTY_MOVES or REPETITION for the other draws, otherwise None. Matt
+    und Patt werden je position_hash gemerkt, andere Stellungen nicht,
+    damit results nicht mit jeder gesehenen Stellung wächst. Wiederholung
+    und 50-Züge-Regel hängen vom Weg zur Stellung ab und werden jedes Mal
+    geprüft.
+    '''
+    key = self.position_hash
+    result = self.results.get(key)
+    if result is None and not self.has_legal_move():
+      if self.is_attacked(self.get_king_of_moving_player().get_position(), not self.is_white):
+        result = CHECKMATE
+      else:
+        result = STALEMATE
+      self.results[key] = result
+    if result:
+      return result
+    if self.halfmove_clock >= 100:
+      return FIFTY_MOVES
+    if self.get_repetitions() >= 3:
+      return REPETITION
+    return None
+
+  def get_repetitions(self):
+    '''
+    Wie oft die Stellung schon auf dem Brett stand, diese eingeschlossen.
+    Verglichen wird nur mit jeder zweiten Stellung (gleiche Farbe am Zug)
+    bis zum letzten Bauernzug oder Schlagen, davor kann sie nicht stehen.
+    '''
+    hashes = self.hashes
+    count = 1
+    i = len(hashes) - 3
+    stop = max(len(hashes) - 1 - self.halfmove_clock, 0)
+    while i >= stop:
+      if hashes[i] == self.position_hash:
+        count += 1
+      i -= 2
+    return count
+
+  def is_safe_move(self,move):
+    '''
+    True, wenn der König der ziehenden Figur nach dem Zug nicht im Schach
+    steht. Der Zug wird dazu auf diesem Brett ausgeführt und zurückgenommen.
+    '''
+    piece = self.get_piece(move[0])
+    king = self.white_king if piece.is_white else self.black_king
+    self.make_move(move)
+    try:
+      return king.is_safe_position()
+    finally:
+      self.unmake_move()
+
+  def is_attacked(self,pos,by_white,ignore=None):
+    '''
+    True, wenn das Feld pos von einer Figur der Farbe by_white angegriffen wird.
+
+    Mit ignore wird das Feld ignore als leer betrachtet, etwa weil die Figur
+    darauf gerade wegzieht. Dann helfen die Angriffszähler nicht weiter und
+    es wird mit find_attacker() von pos aus gesucht. Mit Bitboards fragen
+    beide Fälle die Bitboards.
+    '''
+    if self.bitboards:
+      return self.bitboards.is_attacked(pos,by_white,ignore)
+    if ignore is None:
+      return self.attacks[by_white][pos] > 0
+    return self.find_attacker(pos,by_white,ignore) is not None
+
+  def find_attacker(self,pos,by_white,ignore=None):
+    '''
+    Sucht von pos aus nach einer Figur der Farbe by_white, die pos angreift,
+    und gibt ihr Feld zurück, sonst None. Die Suche endet beim ersten
+    Angreifer.
+    '''
+    for step in self.iter_attackers(pos,by_white,ignore):
+      return step
+    return None
 
+  def get_attackers(self,pos,by_white):
+    '''
+    Die Felder aller Figuren der Farbe by_white, die pos angreifen
+    '''
+    if self.bitboards:
+      return self.bitboards.get_attackers(pos,by_white)
+    return list(self.iter_attackers(pos,by_white))
+
+  def iter_attackers(self,pos,by_white,ignore=None):
+    '''
+    Liefert nacheinander die Felder der Angreifer von pos. Gesucht wird von
+    pos aus wie ein Bauer, Springer und König und entlang der Linien und
+    Diagonalen.
+    '''
+    positions = self.positions
+    for step in (pos-9, pos-11) if by_white else (pos+9, pos+11):
+      piece = positions[step]
+      if isinstance(piece,Pawn) and piece.is_white == by_white and step != ignore:
+        yield step
+    for step in KNIGHT_SQUARES[pos]:
+      piece = positions[step]
+      if isinstance(piece,Knight) and piece.is_white == by_white and step != ignore:
+        yield step
+    for step in KING_SQUARES[pos]:
+      piece = positions[step]
+      if isinstance(piece,King) and piece.is_white == by_white and step != ignore:
+        yield step
+    for direction, ray in RAYS[pos]:
+      for step in ray:
+        piece = positions[step]
+        if piece and step != ignore:
+          if piece.is_white == by_white and piece.is_sliding and direction in piece.directions:
+            yield step
+          break
+
+  def get_checks_and_pins(self,king):
+    '''
+    Returns (evasions, pins) for king.
+
+    evasions ist None, wenn der König nicht im Schach steht, sonst die Liste
+    der Felder, auf die eine andere Figur ziehen muss: das Feld des
+    Angreifers oder eines dazwischen. Bei Doppelschach ist sie leer.
+    pins ordnet jeder gefesselten Figur die Felder ihrer Fessellinie zu.
+    '''
+    pos = king.get_position()
+    evasions = None
+    checkers = self.get_attackers(pos, not king.is_white)
+    if len(checkers) > 1:
+      evasions = []
+    elif checkers:
+      evasions = checkers
+      for direction, ray in RAYS[pos]:
+        if checkers[0] in ray:
+          evasions = ray[:ray.index(checkers[0])+1]
+    pins = {}
+    positions = self.positions
+    for direction, ray in RAYS[pos]:
+      pinned = None
+      for i, step in enumerate(ray):
+        piece = positions[step]
+        if not piece:
+          continue
+        if piece.is_white == king.is_white:
+          if pinned:
+            break
+          pinned = step
+        else:
+          if pinned and piece.is_sliding and direction in piece.directions:
+            pins[pinned] = ray[:i+1]
+          break
+    return evasions, pins
+
+  def is_legal_move(self,move,checks=None):
+    '''
+    True, wenn der pseudolegale Zug move den eigenen König nicht im Schach
+    lässt. checks ist das Ergebnis von get_checks_and_pins() für diesen
+    König und wird berechnet, falls es fehlt. Nur en passant wird
+    ausprobiert, weil dabei zwei Figuren eine Reihe verlassen.
+    '''
+    start, target = move[0], move[1]
+    piece = self.get_piece(start)
+    king = self.white_king if piece.is_white else self.black_king
+    if piece is king:
+      # Die Rochade prüft der König schon in get_admissible_positions()
+      return abs(target-start) == 2 or not self.is_attacked(target, not king.is_white, start)
+    if isinstance(piece,Pawn) and (target-start) % 10 and not self.get_piece(target):
+      return self.is_safe_move(move)
+    evasions, pins = checks or self.get_checks_and_pins(king)
+    if evasions is not None and target not in evasions:
+      return False
+    return start not in pins or target in pins[start]
@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Eröffnungsbuch im Polyglot-Format (.bin). Jeder Eintrag hat 16 Byte,
+# big-endian: Schlüssel der Stellung (64 Bit), Zug (16 Bit), Gewicht
+# (16 Bit) und ein Lernwert (32 Bit). Die Einträge sind nach dem Schlüssel
+# sortiert.
+#
+# Die Datei wird mit mmap eingeblendet und per binärer Suche durchsucht,
+# ohne Einträge in Python-Objekte zu laden. Das Öffnen kostet deshalb
+# nichts, und mehrere Prozesse teilen sich die Seiten des Buchs.
+#
+# Der Schlüssel wird mit polyglot_key() nach dem Polyglot-Verfahren aus den
+# 781 Zufallszahlen in random64.py berechnet, so dass Bücher anderer
+# Programme gelesen werden und hier geschriebene dort. Mit random64=None
+# dient stattdessen Chessboard.position_hash als Schlüssel.
+
+import logging          # Um Meldungen auszugeben
+import mmap             # Um das Buch einzublenden
+import os               # Für die Dateigröße
+import random           # Um unter den Buchzügen zu wählen
+import struct           # Um die Einträge zu lesen und zu schreiben
+from pieces import King
+from random64 import RANDOM64
+import zobrist          # Für Rochaderechte und en passant
+
+log = logging.getLogger(__name__)
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+# Umwandlungsfigur im Polyglot-Zug: 1 Springer, 2 Läufer, 3 Turm, 4 Dame
+PROMOTIONS = (None, 'S', 'L', 'T', 'D')
+# Reihenfolge der Figuren in den Polyglot-Zufallszahlen
+KINDS = 'bBsSlLtTdDkK'
+
+###############################################################################
+# Züge
+###############################################################################
+
+def decode_move(board, code):
+  '''
+  Übersetzt einen Polyglot-Zug in (start, target, promotion). Die Rochade
+  ist in Polyglot als Zug des Königs auf den eigenen Turm kodiert.
+  '''
+  target = 10 * ((code >> 3 & 7) + 1) + (code & 7) + 1
+  start = 10 * ((code >> 9 & 7) + 1) + (code >> 6 & 7) + 1
+  promotion = PROMOTIONS[code >> 12 & 7] if code >> 12 & 7 < len(PROMOTIONS) else None
+  if promotion and not board.is_white:
+    promotion = promotion.lower()
+  piece = board.get_piece(start)
+  if isinstance(piece,King) and start == piece.initial_position():
+    if target == start + 3:
+      target = start + 2
+    elif target == start - 4:
+      target = start - 2
+  return start, target, promotion
+
+def encode_move(board, move):
+  '''
+  Das Gegenstück zu decode_move()
+  '''
+  start, target = move[0], move[1]
+  promotion = move[2] if len(move) > 2 else None
+  if isinstance(board.get_piece(start),King) and abs(target - start) == 2:
+    target = start + 3 if target > start else start - 4
+  code = (target % 10 - 1) | (target / 10 - 1) << 3 | (start % 10 - 1) << 6 | (start / 10 - 1) << 9
+  if promotion:
+    code |= PROMOTIONS.index(promotion.upper()) << 12
+  return code
+
+def polyglot_key(board, random64):
+  '''
+  Der Schlüssel der Stellung nach Polyglot, random64 sind die 781
+  Zufallszahlen von Polyglot
+  '''
+  key = 0
+  for name, pieces in board.pieces.items():
+    kind = KINDS.index(name)
+    for piece in pieces:
+      pos = piece.get_position()
+      key ^= random64[64 * kind + 8 * (pos / 10 - 1) + pos % 10 - 1]
+  for i, right in enumerate(zobrist.castling_rights(board)):
+    if right:
+      key ^= random64[768 + i]
+  ep = zobrist.en_passant_file(board)
+  if ep is not None:
+    key ^= random64[772 + ep]
+  if board.is_white:
+    key ^= random64[780]
+  return key
+
+def get_key(board, random64=RANDOM64):
+  '''
+  Der Schlüssel der Stellung im Buch: polyglot_key() oder, mit
+  random64=None, board.position_hash
+  '''
+  if random64 is None:
+    return board.position_hash
+  return polyglot_key(board, random64)
+
+###############################################################################
+# Das Buch
+###############################################################################
+
+class OpeningBook(object):
+  '''
+  Ein mit mmap eingeblendetes Eröffnungsbuch aus der Datei path
+  '''
+
+  def __init__(self, path, random64=RANDOM64):
+    self.path = path
+    self.random64 = random64
+    self.file = open(path, 'rb')
+    size = os.fstat(self.file.fileno()).st_size
+    if size % ENTRY.size:
+      raise ValueError("%s is not an opening book" % path)
+    self.entries = size / ENTRY.size
+    # Eine leere Datei lässt sich nicht einblenden
+    self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else ''
+    log.debug("Opening book %s with %i entries", path, self.entries)
+
+  def __len__(self):
+    return self.entries
+
+  def close(self):
+    if self.data:
+      self.data.close()
+    self.file.close()
+
+  def get_key(self, board):
+    return get_key(board, self.random64)
+
+  def find(self, key):
+    '''
+    Der Index des ersten Eintrags mit dem Schlüssel key oder einem größeren
+    '''
+    low, high = 0, self.entries
+    while low < high:
+      middle = (low + high) / 2
+      if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+        low = middle + 1
+      else:
+        high = middle
+    return low
+
+  def get_moves(self, board):
+    '''
+    Returns a list of (move, weight) for the position on board. Nur
+    erlaubte Züge werden geliefert, Einträge mit Gewicht 0 nicht.
+    '''
+    key = self.get_key(board)
+    moves = []
+    legal_moves = None
+    i = self.find(key)
+    while i < self.entries:
+      entry_key, code, weight, learn = ENTRY.unpack_from(self.data, i * ENTRY.size)
+      if entry_key != key:
+        break
+      i += 1
+      if not weight:
+        continue
+      if legal_moves is None:
+        legal_moves = board.legal_moves()
+      move = decode_move(board, code)
+      if move in legal_moves:
+        moves.append((move, weight))
+      else:
+        log.debug("Illegal book move %s in %s", str(move), self.path)
+    return moves
+
+  def choose_move(self, board, generator=random):
+    '''
+    Wählt einen Buchzug zufällig entsprechend den Gewichten, oder None
+    '''
+    moves = self.get_moves(board)
+    if not moves:
+      return None
+    choice = generator.randint(1, sum(weight for move, weight in moves))
+    for move, weight in moves:
+      choice -= weight
+      if choice <= 0:
+        return move
+
+def write_book(path, entries, random64=RANDOM64):
+  '''
+  Schreibt ein Buch aus entries, einer Folge von (board, move, weight),
+  mit Schlüsseln wie OpeningBook mit demselben random64. Der Schlüssel
+  wird berechnet, sobald der Eintrag geliefert wird; board darf sich
+  danach also ändern. Die Einträge werden sortiert.
+  '''
+  rows = []
+  for board, move, weight in entries:
+    rows.append((get_key(board, random64), encode_move(board, move), weight))
+  rows.sort()
+  out = open(path, 'wb')
+  try:
+    for key, code, weight in rows:
+      out.write(ENTRY.pack(key, code, weight, 0))
+  finally:
+    out.close()
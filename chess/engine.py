@@ -0,0 +1,253 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Computergegner: Negamax-Suche mit Alpha-Beta-Schnitten und iterativer
+# Vertiefung. Die Züge werden auf dem Spielbrett selbst mit make_move()/
+# unmake_move() ausgeführt. Sortiert wird nach dem Zug aus der
+# Transpositionstabelle, dann Schlagzügen nach MVV-LVA (wertvollstes Opfer,
+# billigster Angreifer), dann Killerzügen. Am Horizont werden in der
+# Ruhesuche (quiescence search) nur noch Schlagzüge und Umwandlungen
+# betrachtet. Eine harte Zeitgrenze bricht die Suche ab; es zählt dann das
+# Ergebnis der letzten vollständig durchsuchten Tiefe.
+
+import logging                              # Um Meldungen auszugeben
+import time                                 # Für die Zeitgrenze
+from pieces import Pawn
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+log = logging.getLogger(__name__)
+
+# Figurenwerte in Hundertstel Bauern, nach dem Namen der Figur
+VALUES = {'B': 100, 'S': 320, 'L': 330, 'T': 500, 'D': 900, 'K': 0}
+MATE = 100000
+INFINITY = 2 * MATE
+MAX_PLY = 64
+
+# Bonus für zentrale Felder, 0 am Rand bis 6 in der Mitte
+CENTER = [0] * 100
+for pos in range(11,89):
+  if 1 <= pos % 10 <= 8:
+    CENTER[pos] = int(7 - abs(pos % 10 - 4.5) - abs(pos / 10 - 4.5))
+
+class SearchTimeout(Exception):
+  pass
+
+###############################################################################
+# Bewertung
+###############################################################################
+
+def evaluate(board):
+  '''
+  Bewertet die Stellung aus Sicht der Farbe am Zug: Material, Zentrum für
+  Springer und Läufer und vorgerückte Bauern
+  '''
+  score = 0
+  for name, pieces in board.pieces.items():
+    is_white = name.isupper()
+    name = name.upper()
+    for piece in pieces:
+      pos = piece.get_position()
+      value = VALUES[name]
+      if name in 'SL':
+        value += 4 * CENTER[pos]
+      elif name == 'B':
+        value += 5 * (pos / 10 - 2 if is_white else 7 - pos / 10) + CENTER[pos]
+      score += value if is_white else -value
+  return score if board.is_white else -score
+
+def get_victim(board, move):
+  '''
+  Die Figur, die der Zug schlägt, oder None. Berücksichtigt en passant.
+  '''
+  start, target = move[0], move[1]
+  victim = board.get_piece(target)
+  if victim:
+    return victim
+  piece = board.get_piece(start)
+  if isinstance(piece,Pawn) and (target - start) % 10:
+    return board.get_piece(target-10 if piece.is_white else target+10)
+  return None
+
+###############################################################################
+# Die Suche
+###############################################################################
+
+class Engine(object):
+  '''
+  Spielt die Farbe is_white und hat time_limit Sekunden je Zug
+  '''
+
+  def __init__(self, is_white=False, time_limit=5.0, max_depth=MAX_PLY, size_mb=16, book=None, tablebase=None):
+    self.is_white = is_white
+    self.book = book
+    self.tablebase = tablebase
+    self.time_limit = time_limit
+    self.max_depth = max_depth
+    self.table = TranspositionTable(size_mb)
+    self.nodes = 0
+    self.depth = 0
+    self.score = 0
+    self.elapsed = 0.0
+
+  def nodes_per_second(self):
+    return self.nodes / self.elapsed if self.elapsed else 0.0
+
+  def get_move(self, board):
+    '''
+    Sucht den besten Zug (start, target, promotion) für die Farbe am Zug.
+    Nach der Suche stehen in nodes, depth, score und elapsed die Knoten,
+    die erreichte Tiefe, die Bewertung und die benötigte Zeit. Steht die
+    Stellung im Eröffnungsbuch book oder in der Endspieldatenbank
+    tablebase, wird nicht gesucht (Tiefe 0).
+    '''
+    started = time.time()
+    self.deadline = started + self.time_limit
+    self.nodes = 0
+    self.depth = 0
+    if self.book:
+      move = self.book.choose_move(board)
+      if move:
+        self.elapsed = time.time() - started
+        log.debug("Book move %s", str(move))
+        return move
+    if self.tablebase:
+      move = self.tablebase.get_move(board)
+      if move:
+        self.elapsed = time.time() - started
+        log.debug("Tablebase move %s", str(move))
+        return move
+    self.killers = [[None, None] for i in range(MAX_PLY+1)]
+    self.root_move = None
+    root = len(board.undo_stack)
+    moves = board.legal_moves()
+    best_move = moves[0] if moves else None
+    for depth in range(1, self.max_depth+1):
+      if len(moves) < 2:
+        break
+      try:
+        self.score = self.negamax(board, depth, -INFINITY, INFINITY, 0)
+      except SearchTimeout:
+        while len(board.undo_stack) > root:
+          board.unmake_move()
+        break
+      if self.root_move:
+        best_move = self.root_move
+      self.depth = depth
+      log.debug("Depth %i: %s with score %i", depth, str(best_move), self.score)
+      if abs(self.score) > MATE - MAX_PLY:
+        break
+    self.elapsed = time.time() - started
+    return best_move
+
+  def check_time(self):
+    self.nodes += 1
+    if self.nodes & 255 == 0 and time.time() > self.deadline:
+      raise SearchTimeout()
+
+  def order_moves(self, board, moves, hash_move, ply):
+    '''
+    Sortiert hash move, Schlagzüge nach MVV-LVA und Killerzüge nach vorn
+    '''
+    killers = self.killers[ply]
+    def key(move):
+      if move == hash_move:
+        return -INFINITY
+      victim = get_victim(board, move)
+      if victim:
+        return -(10 * VALUES[str(victim).upper()] - VALUES[str(board.get_piece(move[0])).upper()]) - MATE
+      if move[2]:
+        return -VALUES[move[2].upper()] - MATE
+      if move in killers:
+        return -1
+      return 0
+    moves.sort(key=key)
+    return moves
+
+  def negamax(self, board, depth, alpha, beta, ply):
+    '''
+    Alpha-Beta-Suche in Negamax-Form, bewertet aus Sicht der Farbe am Zug
+    '''
+    self.check_time()
+    if depth <= 0:
+      return self.quiescence(board, alpha, beta, ply)
+    alpha_orig = alpha
+    key = board.position_hash
+    hash_move = None
+    entry = self.table.probe(key)
+    if entry:
+      hash_move, score, entry_depth, bound = entry
+      if ply and entry_depth >= depth:
+        score = self.from_table(score, ply)
+        if bound == EXACT:
+          return score
+        elif bound == LOWER and score >= beta:
+          return score
+        elif bound == UPPER and score <= alpha:
+          return score
+    moves = board.legal_moves()
+    if not moves:
+      king = board.get_king_of_moving_player()
+      if board.is_attacked(king.get_position(), not board.is_white):
+        return -MATE + ply
+      return 0
+    best_score, best_move = -INFINITY, None
+    for move in self.order_moves(board, moves, hash_move, ply):
+      board.make_move(move)
+      score = -self.negamax(board, depth-1, -beta, -alpha, ply+1)
+      board.unmake_move()
+      if score > best_score:
+        best_score, best_move = score, move
+      if score > alpha:
+        alpha = score
+      if alpha >= beta:
+        if not get_victim(board, move) and move not in self.killers[ply]:
+          self.killers[ply] = [move, self.killers[ply][0]]
+        break
+    if best_score <= alpha_orig:
+      bound = UPPER
+    elif best_score >= beta:
+      bound = LOWER
+    else:
+      bound = EXACT
+    self.table.store(key, best_move, self.to_table(best_score, ply), depth, bound)
+    if ply == 0:
+      self.root_move = best_move
+    return best_score
+
+  def quiescence(self, board, alpha, beta, ply):
+    '''
+    Ruhesuche: nur Schlagzüge und Umwandlungen, bis die Stellung ruhig ist
+    '''
+    stand_pat = evaluate(board)
+    if stand_pat >= beta or ply >= MAX_PLY:
+      return stand_pat
+    if stand_pat > alpha:
+      alpha = stand_pat
+    moves = board.legal_moves(captures=True)
+    for move in self.order_moves(board, moves, None, ply):
+      self.check_time()
+      board.make_move(move)
+      score = -self.quiescence(board, -beta, -alpha, ply+1)
+      board.unmake_move()
+      if score >= beta:
+        return score
+      if score > alpha:
+        alpha = score
+    return alpha
+
+  def to_table(self, score, ply):
+    '''
+    Mattwerte werden relativ zur Stellung gespeichert, nicht zur Wurzel
+    '''
+    if score > MATE - MAX_PLY:
+      return score + ply
+    if score < -MATE + MAX_PLY:
+      return score - ply
+    return score
+
+  def from_table(self, score, ply):
+    if score > MATE - MAX_PLY:
+      return score - ply
+    if score < -MATE + MAX_PLY:
+      return score + ply
+    return score
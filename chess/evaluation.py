@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Bewertung vieler Stellungen auf einmal mit NumPy, für Auswertungen über
+# große Mengen von Stellungen aus Partien.
+#
+# Eine Menge von N Stellungen ist ein Array der Form (N, 64) mit einem
+# Code je Feld: 0 für leer, sonst 1 + Index in PLANES. Feld a1 hat den
+# Index 0, h8 den Index 63. encode() erzeugt es aus Chessboards,
+# encode_fens() direkt aus FEN, ohne ein Chessboard aufzubauen.
+# to_planes() liefert dieselben Stellungen als (N, 12, 64) Ebenen.
+#
+# Material und Figur-Feld-Werte sind dieselben wie in engine.evaluate()
+# und werden über Tabellen nachgeschlagen. Die Beweglichkeit zählt die
+# Felder, die Springer, Läufer, Türme und Damen erreichen (ohne Fesselungen
+# und Schach), die Bauernstruktur bewertet Doppel-, isolierte und
+# Freibauern. Alle Rechnungen laufen auf dem ganzen Array, ohne Schleife
+# über die Stellungen.
+#
+# NumPy ist optional; ohne NumPy lösen die Funktionen ImportError aus.
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+from board import FEN_NAMES
+from pieces import Rook, Knight, Bishop
+from engine import VALUES, CENTER
+
+PLANES = 'BSLTDKbsltdk'
+CODES = dict((name, i + 1) for i, name in enumerate(PLANES))
+# Feld im Array -> Feld auf dem Chessboard
+BOARD_SQUARES = [10 * (i / 8 + 1) + i % 8 + 1 for i in range(64)]
+
+MOBILITY = 2                # je erreichbarem Feld
+DOUBLED = -10               # je Bauer zu viel auf einer Linie
+ISOLATED = -15              # je Bauer ohne eigene Bauern auf den Nachbarlinien
+# Freibauer nach Reihe aus Sicht seiner Farbe, Reihe 1 bis 8
+PASSED = (0, 10, 10, 15, 25, 40, 60, 0)
+
+def get_steps(directions):
+  '''
+  Die Richtungen des Chessboards als (Reihen, Linien)
+  '''
+  return [(int(round(d / 10.0)), d - 10 * int(round(d / 10.0))) for d in directions]
+
+# (Figuren, Schritte, zieht beliebig weit); die Dame zieht wie Turm und Läufer
+MOVES = [('S', get_steps(Knight.directions), False),
+         ('LD', get_steps(Bishop.directions), True),
+         ('TD', get_steps(Rook.directions), True)]
+
+def require_numpy():
+  if np is None:
+    raise ImportError("chess.evaluation needs NumPy")
+
+def get_tables():
+  '''
+  Material und Figur-Feld-Werte je Code und Feld aus Sicht von Weiß, wie in
+  engine.evaluate()
+  '''
+  material = np.zeros(len(PLANES) + 1, np.int32)
+  position = np.zeros((len(PLANES) + 1, 64), np.int32)
+  for name, code in CODES.items():
+    kind, sign = name.upper(), 1 if name.isupper() else -1
+    material[code] = sign * VALUES[kind]
+    for i, pos in enumerate(BOARD_SQUARES):
+      if kind in 'SL':
+        value = 4 * CENTER[pos]
+      elif kind == 'B':
+        value = 5 * (pos / 10 - 2 if name.isupper() else 7 - pos / 10) + CENTER[pos]
+      else:
+        value = 0
+      position[code, i] = sign * value
+  return material, position
+
+TABLES = []                 # (material, position), sobald gebraucht
+
+if np is not None:
+  POPCOUNT = np.array([bin(i).count('1') for i in range(256)], np.int32)
+  # Linien -> Felder, auf die eine Verschiebung um so viele Linien führen darf
+  ON_BOARD = {}
+  for files in range(-2, 3):
+    ON_BOARD[files] = np.uint64(sum(1 << i for i in range(64) if 0 <= i % 8 - files < 8))
+
+###############################################################################
+# Kodieren
+###############################################################################
+
+def encode(boards):
+  '''
+  Returns the positions of boards (a sequence of Chessboards) as an (N, 64)
+  array of codes and an array of N booleans, True where white is to move
+  '''
+  require_numpy()
+  boards = list(boards)
+  codes = np.zeros((len(boards), 64), np.int8)
+  for n, board in enumerate(boards):
+    for name, pieces in board.pieces.items():
+      code = CODES[name]
+      for piece in pieces:
+        pos = piece.get_position()
+        codes[n, 8 * (pos / 10 - 1) + pos % 10 - 1] = code
+  white_to_move = np.array([board.is_white for board in boards], bool)
+  return codes, white_to_move
+
+def encode_fens(fens):
+  '''
+  Wie encode(), aber direkt aus FEN-Strings. Nur die Aufstellung und die
+  Farbe am Zug werden gelesen. Raises ValueError for an invalid placement.
+  '''
+  require_numpy()
+  fens = list(fens)
+  codes = np.zeros((len(fens), 64), np.int8)
+  white_to_move = np.ones(len(fens), bool)
+  for n, fen in enumerate(fens):
+    fields = fen.split()
+    if not fields:
+      raise ValueError("Invalid FEN %s" % fen)
+    rank, i = 7, 0
+    for c in fields[0]:
+      if c == '/':
+        if i != 8:
+          raise ValueError("FEN %s does not describe 8 ranks of 8 squares" % fen)
+        rank, i = rank - 1, 0
+      elif c in '12345678':
+        i += int(c)
+      elif c in FEN_NAMES and i < 8:
+        codes[n, 8 * rank + i] = CODES[FEN_NAMES[c]]
+        i += 1
+      else:
+        raise ValueError("Invalid piece %s in FEN %s" % (c, fen))
+    if rank or i != 8:
+      raise ValueError("FEN %s does not describe 8 ranks of 8 squares" % fen)
+    white_to_move[n] = len(fields) < 2 or fields[1] == 'w'
+  return codes, white_to_move
+
+def to_planes(codes):
+  '''
+  Die Stellungen als (N, 12, 64) Array mit einer Ebene je Figur in der
+  Reihenfolge von PLANES
+  '''
+  require_numpy()
+  return codes[:, None, :] == np.arange(1, len(PLANES) + 1)[None, :, None]
+
+###############################################################################
+# Bewertung
+###############################################################################
+
+def shift(squares, ranks, files):
+  '''
+  Verschiebt (N, 8, 8) Bretter um ranks Reihen und files Linien, was über
+  den Rand geht, fällt weg
+  '''
+  result = np.zeros_like(squares)
+  result[:, max(ranks, 0):8 + min(ranks, 0), max(files, 0):8 + min(files, 0)] = \
+    squares[:, max(-ranks, 0):8 - max(ranks, 0), max(-files, 0):8 - max(files, 0)]
+  return result
+
+def to_bitboards(squares):
+  '''
+  (N, 64) Wahrheitswerte -> N Bitboards (uint64), Bit 0 ist a1 wie in
+  bitboard.py
+  '''
+  # packbits beginnt mit dem höchsten Bit, also h8 zuerst
+  return np.packbits(squares[:, ::-1], axis=1).view('>u8').ravel().astype(np.uint64)
+
+def popcount(bitboards):
+  return POPCOUNT[bitboards.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def step(bitboards, ranks, files):
+  '''
+  Verschiebt die Bitboards um ranks Reihen und files Linien, ohne dass
+  Figuren über den Rand auf die andere Seite wandern
+  '''
+  n = 8 * ranks + files
+  bitboards = bitboards << np.uint64(n) if n > 0 else bitboards >> np.uint64(-n)
+  return bitboards & ON_BOARD[files]
+
+def get_mobility(codes, is_white):
+  '''
+  Anzahl der Felder, die die Figuren einer Farbe erreichen: leer oder vom
+  Gegner besetzt
+  '''
+  names = PLANES[:6] if is_white else PLANES[6:]
+  free = ~to_bitboards((codes >= CODES[names[0]]) & (codes <= CODES[names[-1]]))
+  empty = to_bitboards(codes == 0)
+  mobility = np.zeros(len(codes), np.int32)
+  for kinds, steps, is_sliding in MOVES:
+    if not is_white:
+      kinds = kinds.lower()
+    pieces = to_bitboards(reduce(np.logical_or, [codes == CODES[kind] for kind in kinds]))
+    if not pieces.any():
+      continue
+    for ranks, files in steps:
+      # In einer Richtung erreichen zwei Figuren nie dasselbe Feld, die
+      # hintere ist von der vorderen verstellt
+      reached = step(pieces, ranks, files) & free
+      squares = reached
+      for i in range(6 if is_sliding else 0):
+        reached = step(reached & empty, ranks, files) & free
+        if not reached.any():
+          break
+        squares |= reached
+      mobility += popcount(squares)
+  return mobility
+
+def get_pawn_structure(boards, is_white):
+  '''
+  Bewertung der Bauernstruktur einer Farbe
+  '''
+  pawns = boards == CODES['B' if is_white else 'b']
+  enemy = boards == CODES['b' if is_white else 'B']
+  per_file = pawns.sum(axis=1)
+  score = DOUBLED * np.maximum(per_file - 1, 0).sum(axis=1)
+  has_pawns = per_file > 0
+  neighbours = np.zeros_like(has_pawns)
+  neighbours[:, 1:] |= has_pawns[:, :-1]
+  neighbours[:, :-1] |= has_pawns[:, 1:]
+  score += ISOLATED * (per_file * ~neighbours).sum(axis=1)
+  # Gegnerische Bauern auf derselben Linie oder den Nachbarlinien vor dem
+  # Bauern verhindern einen Freibauern
+  blockers = enemy | shift(enemy, 0, 1) | shift(enemy, 0, -1)
+  if is_white:
+    ahead = shift(np.logical_or.accumulate(blockers[:, ::-1], axis=1)[:, ::-1], -1, 0)
+    passed = np.array(PASSED, np.int32)
+  else:
+    ahead = shift(np.logical_or.accumulate(blockers, axis=1), 1, 0)
+    passed = np.array(PASSED[::-1], np.int32)
+  score += ((pawns & ~ahead).sum(axis=2) * passed).sum(axis=1)
+  return score
+
+def get_scores(codes):
+  '''
+  Returns a dict of int arrays with one score per position from the point
+  of view of white: material, position (Figur-Feld-Werte), mobility and
+  pawns
+  '''
+  require_numpy()
+  if not TABLES:
+    TABLES.append(get_tables())
+  material, position = TABLES[0]
+  codes = np.asarray(codes, np.int8)
+  boards = codes.reshape(-1, 8, 8)
+  return {'material': material.take(codes).sum(axis=1),
+          'position': position.take(codes.astype(np.intp) * 64 + np.arange(64)).sum(axis=1),
+          'mobility': MOBILITY * (get_mobility(codes, True) - get_mobility(codes, False)),
+          'pawns': get_pawn_structure(boards, True) - get_pawn_structure(boards, False)}
+
+def evaluate_batch(codes, white_to_move=None):
+  '''
+  Die Summe aus get_scores() je Stellung, aus Sicht von Weiß oder, wenn
+  white_to_move angegeben ist, wie engine.evaluate() aus Sicht der Farbe am
+  Zug
+  '''
+  scores = get_scores(codes)
+  total = scores['material'] + scores['position'] + scores['mobility'] + scores['pawns']
+  if white_to_move is not None:
+    total = np.where(white_to_move, total, -total)
+  return total
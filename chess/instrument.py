@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Zähler und Zeitmessung für die heißen Stellen der Zugerzeugung.
+#
+# Solange die Messung ausgeschaltet ist, kostet sie nichts: enable() ersetzt
+# die Methoden aus HOOKS durch Hüllen, die Aufrufe zählen und die Zeit
+# messen, disable() setzt die ursprünglichen Methoden wieder ein. Die
+# Zeiten sind inklusive der darin aufgerufenen Methoden.
+#
+# Gezählt wird in ein Counters-Objekt je Partie. Die Hüllen schreiben in
+# das gerade aktive, das mit activate() oder measuring() gewechselt wird;
+# ohne Wechsel ist es DEFAULT. Die Funktionen reset(), count(),
+# get_report() und format_report() arbeiten ohne Angabe auf dem aktiven.
+#
+#   import chess.instrument as instrument
+#   instrument.enable()
+#   ...
+#   print instrument.format_report()
+#
+#   counters = instrument.Counters()
+#   with instrument.measuring(counters):
+#     ...
+#   print counters.format_report()
+
+import time                 # Zur Zeitmessung
+from contextlib import contextmanager
+from board import Chessboard
+from pieces import Piece, Pawn, Knight, King
+import engine
+
+# Name im Bericht -> (Objekt, Name der Methode bzw. Funktion)
+HOOKS = [
+  ('board copies',             (Chessboard, '__init__')),
+  ('move generation',          (Chessboard, 'generate_moves')),
+  ('piece moves',              (Piece, 'get_admissible_positions')),
+  ('pawn moves',               (Pawn, 'get_admissible_positions')),
+  ('knight moves',             (Knight, 'get_admissible_positions')),
+  ('king moves',               (King, 'get_admissible_positions')),
+  ('checks and pins',          (Chessboard, 'get_checks_and_pins')),
+  ('safety checks',            (Chessboard, 'is_legal_move')),
+  ('attack probes',            (Chessboard, 'find_attacker')),
+  ('simulations',              (Chessboard, 'is_safe_move')),
+  ('make_move',                (Chessboard, 'make_move')),
+  ('unmake_move',              (Chessboard, 'unmake_move')),
+  ('evaluations',              (engine, 'evaluate')),
+  ('searches',                 (engine.Engine, 'get_move')),
+]
+
+ORIGINALS = {}              # Name -> ursprüngliche Methode, solange eingeschaltet
+
+class Counters(object):
+  '''
+  Die Aufrufe und Sekunden je Name aus HOOKS, dazu Ereignisse aus count(),
+  etwa einer Partie
+  '''
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    '''
+    Setzt alle Zähler und Zeiten auf 0, etwa zu Beginn einer Partie
+    '''
+    self.counts = dict((name, 0) for name, hook in HOOKS)
+    self.times = dict((name, 0.0) for name, hook in HOOKS)
+
+  def count(self, name, n=1):
+    self.counts[name] = self.counts.get(name, 0) + n
+
+  def get_report(self):
+    '''
+    Returns a list of (name, calls, seconds) for everything counted so far
+    '''
+    names = [name for name, hook in HOOKS]
+    names += sorted(name for name in self.counts if name not in self.times)
+    return [(name, self.counts.get(name, 0), self.times.get(name)) for name in names]
+
+  def format_report(self):
+    '''
+    Der Bericht als Tabelle zur Ausgabe
+    '''
+    lines = ["%-20s %12s %10s %12s" % ("", "calls", "seconds", "us/call")]
+    for name, calls, seconds in self.get_report():
+      if seconds is None:
+        lines.append("%-20s %12i" % (name, calls))
+      else:
+        lines.append("%-20s %12i %10.3f %12.1f" % \
+          (name, calls, seconds, 1e6 * seconds / calls if calls else 0))
+    return '\n'.join(lines)
+
+DEFAULT = Counters()
+active = DEFAULT            # Hierhin zählen die Hüllen
+
+def is_enabled():
+  return bool(ORIGINALS)
+
+def activate(counters):
+  '''
+  Macht counters zum aktiven Counters-Objekt und liefert das bisherige
+  '''
+  global active
+  previous, active = active, counters
+  return previous
+
+@contextmanager
+def measuring(counters):
+  '''
+  Zählt im with-Block in counters, danach wieder im vorherigen
+  '''
+  previous = activate(counters)
+  try:
+    yield counters
+  finally:
+    activate(previous)
+
+def reset(counters=None):
+  (counters or active).reset()
+
+def count(name, n=1, counters=None):
+  '''
+  Zählt ein Ereignis, das nicht an einer der Methoden aus HOOKS hängt
+  '''
+  (counters or active).count(name, n)
+
+def wrap(name, function):
+  def wrapper(*args, **kwargs):
+    # Das beim Aufruf aktive, auch wenn im Aufruf gewechselt wird
+    counters = active
+    counters.counts[name] += 1
+    started = time.time()
+    try:
+      return function(*args, **kwargs)
+    finally:
+      counters.times[name] += time.time() - started
+  wrapper.__name__ = function.__name__
+  wrapper.__doc__ = function.__doc__
+  return wrapper
+
+def enable():
+  '''
+  Schaltet die Messung ein und setzt die Zähler zurück
+  '''
+  reset()
+  if is_enabled():
+    return
+  for name, (owner, attribute) in HOOKS:
+    # Nur die in owner selbst definierte Methode, nicht die geerbte
+    original = owner.__dict__[attribute]
+    ORIGINALS[name] = original
+    setattr(owner, attribute, wrap(name, original))
+
+def disable():
+  '''
+  Schaltet die Messung aus, die Zähler bleiben erhalten
+  '''
+  for name, (owner, attribute) in HOOKS:
+    if name in ORIGINALS:
+      setattr(owner, attribute, ORIGINALS.pop(name))
+
+def get_report(counters=None):
+  '''
+  Returns a list of (name, calls, seconds) for everything counted so far
+  '''
+  return (counters or active).get_report()
+
+def format_report(counters=None):
+  '''
+  Der Bericht als Tabelle zur Ausgabe
+  '''
+  return (counters or active).format_report()
@@ -35,6 +35,14 @@ class IFChessboard():
     Fehlerbehandlung an dieser Stelle nicht erforderlich ist.
     '''
     return self.dic[pos]
+
+  def get_cell_name(self,pos):
+    '''
+    Returns the name of the numeric position pos, e.g. 'F6' for 66
+    '''
+    for name, p in self.dic.items():
+      if p == pos:
+        return name
     
   def is_valid_expression(self,pos):
     '''
@@ -92,13 +100,13 @@ class IFChessboard():
     # return the numeric start and end position
     return self.get_position(start.capitalize()),self.get_position(target.capitalize())
     
-  def get_piece(self):
+  def get_piece(self,is_white=True):
     '''
-    Reads the starting and target cell from commandline input
-    thereby validating the plausibility of the input.
+    Reads the name of the new piece for a pawn promotion of color is_white
+    from commandline input thereby validating the plausibility of the input.
     '''
     piece = ''
-    if manager.is_white_moving():
+    if is_white:
       while not piece in ['L','T','S','D']:
         piece = raw_input(manager.MSG_ASK_FOR_NEW_PIECE)
         if not piece in ['L','T','S','D']:
@@ -8,11 +8,10 @@
 # Chessboard im Modul board und zum anderen aus der Klasse Piece und
 # seinen Unterklassen im Modul pieces. 
 #
-# Der Ablauf eines Spiels wird im Modul manager gesteuert. Nur von hier
-# aus wird aUf die jewiligen Module zugegriffen. Falls aus einem Modul
-# heraus auf ein anderes zugegriffen werden muss, dann über manager, der
-# dazu Funktionen bereit stellt. Im Übrigen stellt er die Figuren aufs 
-# Brett, führt Züge aus und bestimmt, wer dran ist. Lediglich die 
+# Der Ablauf eines Spiels wird im Modul manager gesteuert. Er stellt die
+# Figuren aufs Brett, führt Züge aus und bestimmt, wer dran ist. Jede Figur
+# kennt das Brett, auf dem sie steht, so dass in einem Prozess beliebig
+# viele Spiele nebeneinander laufen können. Lediglich die 
 # Gültigkeit eines Zugs wird durch die Figuren selbst bestimmt. Die Klasse
 # Chessboard führt nach einer Plausibilitätsprüfung (Zug auf unbesetztes
 # oder vom Gegner besetztes Feld) und Befragung der zu ziehenden Figur 
@@ -21,8 +20,9 @@
 # werden soll.    
 
 import logging                              # Um Meldungen auszugeben
+import re                                   # Zum Zerlegen der Züge beim Nachspielen
 import pieces                               # Für die Figuren-Factory
-from board import Chessboard, Simulator
+from board import Chessboard, CHECKMATE, STALEMATE, REPETITION, FIFTY_MOVES
 from interface import IFChessboard 
 
 log = logging.getLogger(__name__)
@@ -43,9 +43,19 @@ MSG_ASK_FOR_POSITION                = "Wohin? Gebe die Position an: "
 MSG_INVALID_MOVE                    = "Ungültiger Zug! Probier es noch einmal!\n"
 MSG_INVALID_INPUT                   = "Ungültige Eingabe! Probier es noch einmal!\n"
 MSG_WINNER                          = "Schachmatt! %s hat gewonnen!\nDas Spiel ist beendet.\n"
+MSG_STALEMATE                       = "Patt! Das Spiel endet unentschieden.\nDas Spiel ist beendet.\n"
+MSG_REPETITION                      = "Dreimal dieselbe Stellung! Das Spiel endet unentschieden.\nDas Spiel ist beendet.\n"
+MSG_FIFTY_MOVES                     = "50 Züge ohne Bauernzug oder Schlagen! Das Spiel endet unentschieden.\nDas Spiel ist beendet.\n"
 MSG_CHECK_GIVEN                     = "Schach!\n"
 MSG_PAWN_PROMOTION                  = "Der Bauer kann verwandelt werden!\n\n"
 MSG_ASK_FOR_NEW_PIECE               = "Wähle (D|d)ame, (T|t)urm, (L|l)äufer oder (S|s)pringer\n"
+MSG_ENGINE_MOVE                     = "Der Computer zieht von %s nach %s (Tiefe %i, %i Knoten in %.1f s, %.0f Knoten/s)\n"
+MSG_NO_RESULT                       = "Die Partie ist nicht beendet.\n"
+MSG_REPLAYED                        = "%i Halbzüge in %.3f s nachgespielt (%.0f Halbzüge/s)\n"
+MSG_REPLAY_ERROR                    = "Ungültiger Zug %s im %i. Halbzug\n"
+
+# Ein Zug beim Nachspielen, z.B. E2E4, e7e8D oder E2-E4
+COORDINATE_MOVE = re.compile(r'^([A-H][1-8])-?([A-H][1-8])([DTLS])?$')
 
 CHESSBOARD = None           # Das aktuelle Schachspiel mit seinen Figuren
 INTERFACE = None            # Die Benutzerschnittstelle
@@ -89,69 +99,136 @@ def newinstance(name,pos):
 # Die Spieldurchführung
 ###############################################################################
 
-def start(positions=None):
+def start(positions=None,backend='mailbox',engine=None,fen=None):
   '''
-  Main Loop
+  Main Loop. Mit einer Engine spielt der Computer deren Farbe. Mit fen
+  beginnt das Spiel in dieser Stellung statt in positions.
   '''
-  game = get_chessboard(positions)
+  game = get_chessboard(positions,backend,fen)
   
+  result = None
   while not game.has_finnished:
+    # Das Spiel ist zu Ende, wenn die Farbe am Zug keinen Zug mehr hat, nach
+    # dreifacher Stellungswiederholung und nach der 50-Züge-Regel
+    result = game.get_result()
+    if result:
+      game.has_finnished = True
+      break
     get_interface().display_game(str(game))
     get_interface().display_msg( MSG_ROUND % game.get_color() )
-    perform_move()
-  get_interface().display_msg( MSG_WINNER % game.get_king_of_opponent().get_color() )
+    perform_move(game,engine)
+  get_interface().display_game(str(game))
+  if result:
+    get_interface().display_msg( get_result_message(game,result) )
+
+def get_result_message(game,result):
+  '''
+  Die Meldung zum Ergebnis result von game.get_result()
+  '''
+  if result == CHECKMATE:
+    return MSG_WINNER % game.get_king_of_opponent().get_color()
+  return {STALEMATE: MSG_STALEMATE, REPETITION: MSG_REPETITION,
+          FIFTY_MOVES: MSG_FIFTY_MOVES}.get(result, MSG_NO_RESULT)
 
-def perform_move():
+def perform_move(game,engine=None):
   '''
-  Performs a move
+  Performs a move on the chessboard game
   '''
   is_valid_move=False
   while not is_valid_move:
     # Zunächst prüfen, ob der ziehende Spieler im Schach steht
-    if get_chessboard().is_check_given():
+    if game.is_check_given():
       get_interface().display_msg( MSG_CHECK_GIVEN )
-    move = get_interface().get_move()
-    start_pos, target_pos = move
-    is_valid_move = get_chessboard().move_piece(move)
-    # Falls nun der Gegner schachmatt ist, wurde has_finnished gesetzt
-    if get_chessboard().has_finnished:
-      break
+    if is_computer_moving(game,engine):
+      move = get_engine_move(game,engine)
+      # Ohne gültigen Zug ist das Spiel zu Ende
+      if not move:
+        game.has_finnished = True
+        break
+    else:
+      move = get_interface().get_move()
+    start_pos, target_pos = move[0], move[1]
+    is_valid_move = game.move_piece((start_pos, target_pos))
     # Falls der Zug nicht erlaubt ist...
     if not is_valid_move: 
       get_interface().display_msg( MSG_INVALID_MOVE )
       continue
     # Falls ein Bauer in die letzte Reihe gezogen wurde...
-    elif get_piece(target_pos).can_be_promoted():
+    elif game.get_piece(target_pos).can_be_promoted():
       get_interface().display_msg( MSG_PAWN_PROMOTION )
-      piece_name = get_interface().get_piece()
-      get_positions()[ target_pos] = newinstance( piece_name, target_pos )
+      if len(move) > 2 and move[2]:
+        piece_name = move[2]
+      else:
+        piece_name = get_interface().get_piece(game.is_white)
+      game.set_cell( target_pos, newinstance( piece_name, target_pos ) )
+    else:
+      piece_name = None
     # Den Zug merken und den nächsten Spielzug ermöglichen... 
-    get_chessboard().append_history(move)
-    get_chessboard().switch_color()
+    game.append_history((start_pos, target_pos, piece_name))
+    game.switch_color()
   
+def replay(game,lines):
+  '''
+  Spielt die Züge aus lines (Datei oder Liste von Zeilen) ohne Anzeige und
+  Rückfragen auf game nach. Je Zeile können mehrere Züge durch Leerzeichen
+  getrennt stehen, alles nach # wird ignoriert. Gezogen wird wie im Spiel
+  mit move_piece(), bei der Umwandlung mit der angehängten Figur.
+
+  Returns the number of plies played. Raises ValueError at the first
+  invalid or illegal move.
+  '''
+  plies = 0
+  for line in lines:
+    for token in line.split('#')[0].split():
+      match = COORDINATE_MOVE.match(token.upper())
+      if not match:
+        raise ValueError(MSG_REPLAY_ERROR % (token, plies+1))
+      start_pos = get_interface().get_position(match.group(1))
+      target_pos = get_interface().get_position(match.group(2))
+      if not game.move_piece((start_pos, target_pos)):
+        raise ValueError(MSG_REPLAY_ERROR % (token, plies+1))
+      piece_name = None
+      if game.get_piece(target_pos).can_be_promoted():
+        piece_name = match.group(3)
+        if not piece_name:
+          raise ValueError(MSG_REPLAY_ERROR % (token, plies+1))
+        if not game.is_white:
+          piece_name = piece_name.lower()
+        game.set_cell( target_pos, newinstance( piece_name, target_pos ) )
+      game.append_history((start_pos, target_pos, piece_name))
+      game.switch_color()
+      plies += 1
+  return plies
+
 ###############################################################################
 # Auf das Schachbrett zugreifen...
 ###############################################################################
 
-def get_chessboard(positions=None):
+def get_chessboard(positions=None,backend='mailbox',fen=None):
   '''
-  Das Spielbrett einschließlich der Figuren.
-  Wird beim ersten Aufruf initialisiert (Lazy Initialization). Bei danach 
-  folgenden Aufrufen wird die Variable positions nicht mehr verarbeitet. 
+  Das Spielbrett des Spiels auf der Kommandozeile einschließlich der Figuren.
+  Wird beim ersten Aufruf initialisiert (Lazy Initialization), mit fen aus
+  einer Stellung in FEN. Bei danach folgenden Aufrufen werden die Variablen
+  positions, backend und fen nicht mehr verarbeitet. 
+
+  Die Figuren prüfen ihre Züge auf dem Brett, auf dem sie stehen. Für
+  weitere Spiele im selben Prozess genügt es deshalb, weitere Chessboard
+  Objekte zu erzeugen.
   '''
   if not CHESSBOARD:
     log.debug('Instantiating chessboard')
-    globals()['CHESSBOARD'] = Chessboard(positions)
+    if fen:
+      globals()['CHESSBOARD'] = Chessboard.from_fen(fen,backend)
+    else:
+      globals()['CHESSBOARD'] = Chessboard(positions,backend)
   return CHESSBOARD
   
 def discard_chessboard():
-  CHESSBOARD = None
-  
-def get_piece(pos):
   '''
-  Die Figur auf Position pos
+  Verwirft das aktuelle Spielbrett, der nächste Aufruf von get_chessboard()
+  erzeugt ein neues
   '''
-  return get_chessboard().get_piece(pos)
+  globals()['CHESSBOARD'] = None
 
 def get_positions():
   '''
@@ -161,37 +238,6 @@ def get_positions():
   '''
   return get_chessboard().positions
 
-def get_white_rooks():
-  '''
-  Die weißen Türme
-  '''
-  return get_chessboard().white_rooks
-
-def get_black_rooks():
-  '''
-  Die schwarzen Türme
-  '''
-  return get_chessboard().black_rooks
-
-def get_last_move():
-  '''
-  Der letzte Zug.
-  Rückgabewert: (start_pos, target_pos,piece) oder (0,0,-1)
-  '''
-  return get_chessboard().get_last_move()
-  
-def is_white_moving():
-  '''
-  Return True if white is moving
-  '''
-  return get_chessboard().is_white
-
-def finnish_game():
-  '''
-  Setzt den Trigger zu Beendigung des Spiels
-  '''
-  get_chessboard().has_finnished = True 
-
 ###############################################################################
 # Auf die Benutzerschnittstelle zugreifen...
 ###############################################################################
@@ -205,16 +251,22 @@ def get_interface():
   return INTERFACE
   
 ###############################################################################
-# Einen Spielzug simulieren...
+# Auf den Computergegner zugreifen...
 ###############################################################################
 
-def is_safe_position_for_king(start_pos,target_pos):
+def is_computer_moving(game,engine):
   '''
-  Erzeugt eine Kopie des aktuellen Spielstands, zieht von start_pos nach
-  target_pos und prüft, ob dadurch der König des ziehenden Spielers in
-  Bedrängnis gerät.
+  Return True if the engine plays the color of the current move
   '''
-  log.debug("Simulatung a move from %i to %i\
-      \n+++++++++++++++++++++++++++++++++++++++++\n",start_pos,target_pos)
-  return Simulator(start_pos,target_pos).is_safe_position_for_king()
-  
+  return engine is not None and engine.is_white == game.is_white
+
+def get_engine_move(game,engine):
+  '''
+  Lässt den Computer einen Zug suchen und meldet Tiefe und Knoten pro Sekunde
+  '''
+  move = engine.get_move(game)
+  if move:
+    get_interface().display_msg( MSG_ENGINE_MOVE % (
+      get_interface().get_cell_name(move[0]), get_interface().get_cell_name(move[1]),
+      engine.depth, engine.nodes, engine.elapsed, engine.nodes_per_second()) )
+  return move
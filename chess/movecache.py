@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Zwischenspeicher für die erlaubten Züge je Stellung, identifiziert über
+# Chessboard.position_hash. Er kann von vielen Spielbrettern gemeinsam
+# benutzt werden, etwa von allen Partien eines Servers, in denen dieselben
+# Eröffnungsstellungen immer wieder vorkommen.
+#
+# Zu jeder Stellung stehen die Züge wie von Chessboard.legal_moves() und die
+# Menge der Paare (start, target), so dass die Prüfung eines Zugs nur noch
+# ein Nachschlagen ist. Es werden höchstens capacity Stellungen gehalten;
+# ist er voll, wird die am längsten nicht benutzte verdrängt (LRU).
+
+from collections import OrderedDict # Reihenfolge der letzten Benutzung
+import logging                      # Um Meldungen auszugeben
+
+log = logging.getLogger(__name__)
+
+class MoveCache(object):
+  '''
+  Die erlaubten Züge für höchstens capacity Stellungen
+  '''
+
+  def __init__(self, capacity=4096):
+    if capacity < 1:
+      raise ValueError("Invalid capacity %s" % capacity)
+    self.capacity = capacity
+    self.entries = OrderedDict()    # position_hash -> (Züge, Paare), zuletzt benutzte am Ende
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    log.debug("Move cache for %i positions", capacity)
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __contains__(self, key):
+    return key in self.entries
+
+  def clear(self):
+    '''
+    Löscht alle Einträge und die Zähler
+    '''
+    self.entries.clear()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, key):
+    '''
+    Returns (moves, pairs) stored for the hash key or None. moves ist ein
+    Tupel der Züge (start, target, promotion), pairs ein frozenset der
+    (start, target).
+    '''
+    entry = self.entries.pop(key, None)
+    if entry is None:
+      self.misses += 1
+      return None
+    # Ans Ende, als zuletzt benutzt
+    self.entries[key] = entry
+    self.hits += 1
+    return entry
+
+  def put(self, key, moves):
+    '''
+    Speichert die Züge moves zum Hash key und liefert den Eintrag wie get()
+    '''
+    entry = (tuple(moves), frozenset((move[0], move[1]) for move in moves))
+    if key in self.entries:
+      del self.entries[key]
+    elif len(self.entries) >= self.capacity:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+    self.entries[key] = entry
+    return entry
+
+  def get_stats(self):
+    '''
+    Returns a dict with entries, capacity, hits, misses, evictions and
+    hit_rate (Anteil der Treffer an allen Abfragen)
+    '''
+    lookups = self.hits + self.misses
+    return {'entries': len(self.entries), 'capacity': self.capacity,
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0}
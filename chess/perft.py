@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# perft ("performance test") zählt alle Knoten des Zugbaums bis zu einer
+# gegebenen Tiefe. Die Knotenzahlen der Referenzstellungen sind bekannt,
+# so dass sich damit sowohl die Korrektheit von Chessboard.legal_moves()
+# als auch die Geschwindigkeit des Zuggenerators messen lässt.
+
+import logging  # Um Meldungen auszugeben
+from board import Chessboard
+from transposition import EXACT
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+# Referenzstellungen mit den bekannten Knotenzahlen für Tiefe 1, 2, 3,...
+# Alle Stellungen mit Weiß am Zug, ohne en passant Möglichkeit. Stehen König
+# und Turm unbewegt auf ihren Ausgangsfeldern, ist die Rochade erlaubt.
+###############################################################################
+
+POSITIONS = {
+  'initial': ([
+    "T,S,L,D,K,L,S,T", "B,B,B,B,B,B,B,B", ",,,,,,,", ",,,,,,,",
+    ",,,,,,,", ",,,,,,,", "b,b,b,b,b,b,b,b", "t,s,l,d,k,l,s,t"],
+    [20, 400, 8902, 197281, 4865609]),
+  'kiwipete': ([
+    "T,,,,K,,,T", "B,B,B,L,L,B,B,B", ",,S,,,D,,b", ",b,,,B,,,",
+    ",,,B,S,,,", "l,s,,,b,s,b,", "b,,b,b,d,b,l,", "t,,,,k,,,t"],
+    [48, 2039, 97862, 4085603]),
+  'position3': ([
+    ",,,,,,,", ",,,,B,,B,", ",,,,,,,", ",T,,,,b,,k",
+    "K,B,,,,,,t", ",,,b,,,,", ",,b,,,,,", ",,,,,,,"],
+    [14, 191, 2812, 43238, 674624]),
+  'position4': ([
+    "T,,,D,,T,K,", "B,b,,B,,,B,B", "d,,,,,S,,", "L,L,B,,B,,,",
+    "s,B,,,,,,", ",l,,,,s,l,S", "B,b,b,b,,b,b,b", "t,,,,k,,,t"],
+    [6, 264, 9467, 422333]),
+  'position5': ([
+    "T,S,L,D,K,,,T", "B,B,B,,S,s,B,B", ",,,,,,,", ",,L,,,,,",
+    ",,,,,,,", ",,b,,,,,", "b,b,,B,l,b,b,b", "t,s,l,d,,k,,t"],
+    [44, 1486, 62379, 2103487]),
+  'position6': ([
+    "T,,,,,T,K,", ",B,B,,D,B,B,B", "B,,S,B,,S,,", ",,L,,B,,l,",
+    ",,l,,b,,L,", "b,,s,b,,s,,", ",b,b,,d,b,b,b", "t,,,,,t,k,"],
+    [46, 2079, 89890, 3894594]),
+}
+
+###############################################################################
+# Zugbaum zählen
+###############################################################################
+
+def load(name,backend='mailbox'):
+  '''
+  Ein neues Spielbrett mit der Referenzstellung name
+  '''
+  return Chessboard(POSITIONS[name][0],backend)
+
+def perft(board, depth, table=None):
+  '''
+  Returns the number of leaf nodes of the move tree of board up to depth.
+  Die Züge werden mit make_move()/unmake_move() auf board selbst ausgeführt.
+
+  Mit einer TranspositionTable table werden die Knotenzahlen bereits
+  gezählter Teilbäume über den Hash der Stellung wiederverwendet.
+  '''
+  if depth == 0:
+    return 1
+  if table and depth > 1:
+    entry = table.probe(board.position_hash)
+    if entry and entry[2] == depth:
+      return entry[1]
+  moves = board.legal_moves()
+  if depth == 1:
+    return len(moves)
+  nodes = 0
+  for move in moves:
+    board.make_move(move)
+    nodes += perft(board, depth-1, table)
+    board.unmake_move()
+  if table:
+    table.store(board.position_hash, None, nodes, depth, EXACT)
+  return nodes
+
+def divide(board, depth):
+  '''
+  Returns a dict move -> perft(depth-1) of the position after move.
+  Hilft, einen fehlerhaften Teilbaum zu finden.
+  '''
+  result = {}
+  for move in board.legal_moves():
+    board.make_move(move)
+    result[move] = perft(board, depth-1)
+    board.unmake_move()
+  return result
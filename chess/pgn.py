@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Partien im PGN-Format (Portable Game Notation) lesen und nachspielen.
+#
+# read_games() ist ein Generator, der die Datei zeilenweise liest und jede
+# Partie einzeln liefert, so dass auch sehr große (und mit gzip gepackte)
+# Archive mit konstantem Speicher verarbeitet werden. validate_game()
+# spielt die Züge in algebraischer Kurznotation (SAN) auf einem neuen
+# Chessboard nach und meldet den ersten unerlaubten Zug.
+
+import gzip             # Für gepackte Archive
+import logging          # Um Meldungen auszugeben
+import re               # Zum Zerlegen der Züge
+import sys              # Für die Standardeingabe
+from board import Chessboard, FEN_NAMES, FILES
+
+log = logging.getLogger(__name__)
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+# Kommentare, Varianten und Anmerkungen werden beim Zerlegen übersprungen
+TOKEN = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|\d+\.+|[^\s(){};]+')
+SAN = re.compile(r'^([KQRBN])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([QRBN]))?$')
+
+###############################################################################
+# Lesen
+###############################################################################
+
+def open_pgn(filename):
+  '''
+  Öffnet eine PGN-Datei, mit der Endung .gz gepackt, '-' für die
+  Standardeingabe
+  '''
+  if filename == '-':
+    return sys.stdin
+  if filename.endswith('.gz'):
+    return gzip.open(filename, 'rb')
+  return open(filename, 'rb')
+
+def read_games(lines):
+  '''
+  Liefert nacheinander die Partien aus lines (Datei oder Liste von Zeilen)
+  als Paare (tags, movetext): tags ist ein dict der Kopfzeilen, movetext
+  der Zugteil als ein String. Eine Partie endet, sobald nach ihrem Zugteil
+  wieder eine Kopfzeile folgt, oder am Ende der Eingabe.
+  '''
+  tags, movetext = {}, []
+  for line in lines:
+    line = line.strip()
+    if line.startswith('['):
+      if movetext:
+        yield tags, ' '.join(movetext)
+        tags, movetext = {}, []
+      match = TAG.match(line)
+      if match:
+        tags[match.group(1)] = match.group(2)
+    elif line and not line.startswith('%'):
+      movetext.append(line)
+  if tags or movetext:
+    yield tags, ' '.join(movetext)
+
+def get_sans(movetext):
+  '''
+  Die Züge der Hauptvariante in SAN und das Ergebnis am Ende (oder None)
+  '''
+  sans, result, depth = [], None, 0
+  for token in TOKEN.findall(movetext):
+    if token == '(':
+      depth += 1
+    elif token == ')':
+      depth -= 1
+    elif depth or token[0] in '{;$' or token[0].isdigit() and token.endswith('.'):
+      continue
+    elif token in RESULTS:
+      result = token
+    else:
+      sans.append(token)
+  return sans, result
+
+###############################################################################
+# Nachspielen
+###############################################################################
+
+def parse_san(board, san):
+  '''
+  Returns the legal move (start, target, promotion) of the moving player
+  written as san. Raises ValueError if there is none or more than one.
+  '''
+  text = san.rstrip('+#!?')
+  if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+    king = board.get_king_of_moving_player()
+    start = king.get_position()
+    target = start + 2 if len(text) == 3 else start - 2
+    candidates = [m for m in board.legal_moves() if m[0] == start and m[1] == target]
+  else:
+    match = SAN.match(text)
+    if not match:
+      raise ValueError("Invalid move %s" % san)
+    letter, file, rank, square, promotion = match.groups()
+    name = FEN_NAMES[letter or 'P']
+    target = 10 * int(square[1]) + FILES.index(square[0]) + 1
+    if promotion:
+      promotion = FEN_NAMES[promotion] if board.is_white else FEN_NAMES[promotion].lower()
+    candidates = []
+    for move in board.legal_moves():
+      start = move[0]
+      if move[1] == target and move[2] == promotion \
+          and str(board.get_piece(start)).upper() == name \
+          and (not file or start % 10 == FILES.index(file) + 1) \
+          and (not rank or start / 10 == int(rank)):
+        candidates.append(move)
+  if not candidates:
+    raise ValueError("Illegal move %s" % san)
+  if len(candidates) > 1:
+    raise ValueError("Ambiguous move %s" % san)
+  return candidates[0]
+
+def validate_game(game):
+  '''
+  Spielt die Partie game = (tags, movetext) nach. Gestartet wird in der
+  Stellung aus dem Tag FEN, sonst in der Grundstellung.
+
+  Returns a dict with the tags, the number of plies played, the first
+  error (or None), the final position as FEN and the result.
+  '''
+  tags, movetext = game
+  sans, result = get_sans(movetext)
+  report = {'tags': tags, 'plies': 0, 'error': None, 'fen': None,
+            'result': tags.get('Result', result)}
+  try:
+    board = Chessboard.from_fen(tags['FEN']) if 'FEN' in tags else Chessboard()
+  except ValueError, e:
+    report['error'] = str(e)
+    return report
+  for san in sans:
+    try:
+      move = parse_san(board, san)
+    except ValueError, e:
+      number = (board.start_ply + len(board.history)) / 2 + 1
+      report['error'] = "%s (Zug %i, %s am Zug)" % (e, number, board.get_color())
+      break
+    board.make_move(move)
+    report['plies'] += 1
+  report['fen'] = board.to_fen()
+  return report
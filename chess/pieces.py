@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import logging  # Um Meldungen auszugeben
-import manager  # Für Zugriff auf Schachbrettfunktionen
+import manager  # Für Textkonstanten und das Spielbrett von Figuren ohne eigenes
 
 log = logging.getLogger(__name__)
 
@@ -16,12 +16,18 @@ class Piece(object):
   nur die möglichen Schrittrichtungen. Insofern wären für diese Figuren
   die Unterklassen nicht erforderlich, da ja auch die Oberklasse mit den
   erlaubten Schrittrichtungen initialisiert werden könnte.
+
+  Wegen __slots__ haben die Figuren kein __dict__, so dass viele
+  Spielbretter gleichzeitig im Speicher gehalten werden können. Alles,
+  was für eine Figurenart gleich ist, steht in der Klasse.
   '''
-  chessboard = None
-  position = None
-  has_never_been_moved = True
+  __slots__ = ('chessboard', 'position', 'is_white', 'has_never_been_moved')
+  is_sliding = True           # Läufer, Turm und Dame ziehen beliebig weit
 
   def __init__(self,pos,color=True):
+    self.chessboard = None
+    self.position = None
+    self.has_never_been_moved = True
     self.set_position(pos)
     self.is_white=color
     log.debug("%s initialized with color %s at position %i",\
@@ -31,9 +37,12 @@ class Piece(object):
     return self.position
   
   def get_chessboard(self):
-    if not self.chessboard:
-      self.chessboard = manager.get_chessboard()
-    return self.chessboard
+    '''
+    Das Spielbrett, auf dem die Figur steht. Es wird von Chessboard.set_cell()
+    gesetzt; eine Figur, die noch auf keinem Brett steht, gehört zum
+    aktuellen Spiel des managers.
+    '''
+    return self.chessboard or manager.get_chessboard()
 
   def set_position(self,pos):
     log.debug("Setting Position of %s at %s to %i",\
@@ -54,28 +63,44 @@ class Piece(object):
     '''
     Gibt eine Liste der erlaubten Zielpositionen der Figur.
     
-    Dazu wird iterativ für jede Richtung geprüft, ob ein Feld erreichbar ist.
-    Sobald ein Feld besetzt ist, bricht die Iteration für die jeweilige 
-    Richtung ab. Wenn das Feld durch eine gegnerische Figur besetzt ist, gilt
-    auch dieses Feld als erlaubt.
+    Dazu werden für jede Richtung die Felder des vorberechneten Strahls bis
+    zum Rand durchlaufen. Sobald ein Feld besetzt ist, bricht die Iteration
+    für die jeweilige Richtung ab. Wenn das Feld durch eine gegnerische Figur
+    besetzt ist, gilt auch dieses Feld als erlaubt.
     
-    Die erlaubten Richtungen sind Eigenschaften der jeweiligen Spielfiguren.
+    Die erlaubten Richtungen sind Eigenschaften der jeweiligen Spielfiguren,
+    die Strahlen stehen in rays.
     '''
     admissible_positions=[]
-    directions = list(self.directions)
-    log.debug("Possible directions for %s at %i are %s", self.__class__.__name__, self.get_position(),str(directions))
-    for direction in directions:
-      pos = self.get_position()
-      step = pos + direction
-      log.debug("Checking position %i for %s at %i", step, self.__class__.__name__, self.get_position())
-      while self.is_allowed_cell(step) and not manager.get_piece(step):
-        log.debug("Appending %i", step)
-        admissible_positions.append(step)
-        step += direction
-      if self.is_allowed_cell(step):
-        log.debug("Appending %i, because %s belongs to opponent", step, manager.get_piece(step).__class__.__name__)
-        admissible_positions.append(step)      
+    positions = self.get_chessboard().positions
+    for ray in self.rays[self.position]:
+      for step in ray:
+        cell_occupation = positions[step]
+        if not cell_occupation:
+          admissible_positions.append(step)
+        else:
+          if cell_occupation.is_white != self.is_white:
+            admissible_positions.append(step)
+          break
     return admissible_positions
+
+  def get_attacked_positions(self, pos=None):
+    '''
+    Gibt eine Liste der Felder, die die Figur angreift, wenn sie auf pos
+    steht (ohne pos auf ihrer aktuellen Position).
+
+    Anders als bei get_admissible_positions() zählen auch Felder, auf denen
+    eigene Figuren stehen, denn die sind dann gedeckt. Für Läufer, Turm und
+    Dame endet jede Richtung am ersten besetzten Feld.
+    '''
+    attacked_positions = []
+    positions = self.get_chessboard().positions
+    for ray in self.rays[pos or self.position]:
+      for step in ray:
+        attacked_positions.append(step)
+        if positions[step]:
+          break
+    return attacked_positions
     
   #############################################################################
   # Einige Prüffunktionen
@@ -97,7 +122,7 @@ class Piece(object):
     '''
     True if piece belongs to the moving player
     '''
-    return manager.is_white_moving() == self.is_white
+    return self.get_chessboard().is_white == self.is_white
    
   def is_king_of_moving_player(self):
     '''
@@ -117,11 +142,12 @@ class Piece(object):
     '''
     if target < 11 or target > 88:
       return False
-    elif manager.get_piece(target):
-      return self.is_white != manager.get_piece(target).is_white
+    cell_occupation = self.get_chessboard().get_piece(target)
+    if cell_occupation:
+      return self.is_white != cell_occupation.is_white
       # True if opponent's color, False otherwise
     else:
-      return manager.get_piece(target) is not None 
+      return cell_occupation is not None 
       # True if empty string, i.e a valid but un-occupied position
 
   def is_piece_of_opponent(self, o):
@@ -132,20 +158,14 @@ class Piece(object):
     
   def is_safe_position(self, target_pos=None):
     '''
-    Prüft, ob die Figur auf der angegebenen Position in Bedrängnis gerät
-    '''
-    is_safe_position = True
-    pos = target_pos if target_pos else self.get_position()
-    opposing_pieces = filter( lambda o: self.is_piece_of_opponent(o) ,manager.get_positions())
-    log.debug("Checking if %s at %i is check given", self.__class__.__name__,pos )
-    for piece in opposing_pieces:
-      log.debug('Checking if %s at %i attacks',piece.__class__.__name__,piece.get_position())
-      admissible_positions = piece.get_admissible_positions()
-      if admissible_positions and pos in admissible_positions:
-        log.debug( "%s at %i attacks at %i!\n" , piece.__class__.__name__,piece.get_position(),pos)
-        is_safe_position = False
-        break
-    return is_safe_position
+    Prüft, ob die Figur auf der angegebenen Position in Bedrängnis gerät.
+    Dabei gilt ihr bisheriges Feld als frei, sie zieht ja von dort weg.
+    '''
+    board = self.get_chessboard()
+    if not target_pos:
+      return not board.is_attacked(self.get_position(), not self.is_white)
+    log.debug("Checking if %s at %i is check given", self.__class__.__name__,target_pos)
+    return not board.is_attacked(target_pos, not self.is_white, self.get_position())
   
   def is_valid_move(self, pos):
     '''
@@ -158,7 +178,7 @@ class Piece(object):
     if admissible_positions and pos in admissible_positions:
       log.debug("Checking if King is in danger when %s is moved from %i to %i",self.__class__.__name__,self.get_position(),pos)
       # Wenn der eigene König nach Durchführung des geplanten Zugs im Schach stünde... 
-      if not manager.is_safe_position_for_king(self.get_position(), pos):
+      if not self.get_chessboard().is_legal_move((self.get_position(), pos)):
         log.debug("Move from %i to %i is not possible, because King is in danger!\n",
               self.get_position(),pos)
         return False
@@ -180,9 +200,12 @@ class Pawn(Piece):
   das negative Vorzeichen.
   '''
   
-  def __init__(self,pos,color=True):
-    super(Pawn,self).__init__( pos, color)
-    self.directions = (9,10,11) if self.is_white else (-9,-10,-11)
+  __slots__ = ()
+  is_sliding = False
+
+  @property
+  def directions(self):
+    return (9,10,11) if self.is_white else (-9,-10,-11)
     
   def __str__(self):
     if self.is_white:
@@ -194,87 +217,78 @@ class Pawn(Piece):
     '''
     Zur Bedienung der "Schlagen en passant"-Regel.
     '''
-    start, target, piece = manager.get_last_move()
-    # Wenn pawn gerade erst um zwei Felder gezogen wurde und tatsächlich ein Bauer
-    # ist
-    if piece == self and abs(target-start) == 20:
-      return True
-    return False
+    pos = self.get_chessboard().get_en_passant_position()
+    # Wenn pawn gerade erst um zwei Felder gezogen wurde, steht er vor dem
+    # übersprungenen Feld
+    return pos is not None and self.get_position() == (pos+10 if self.is_white else pos-10)
   
   def can_be_promoted(self):
     '''
-    Falls der Bauerin der letzten Reihe angekommen ist...
+    Falls der Bauer in der letzten Reihe angekommen ist...
     '''
-    if self.is_white and self.get_position()/80 ==1:
-      return True
-    elif not self.is_white and self.get_position()/10 ==1:
-      return True
-    else:
+    return self.position in PROMOTION_SQUARES[self.is_white]
+
+  def can_capture(self,target):
+    '''
+    True, wenn auf target ein Gegner steht oder target das Feld ist, auf dem
+    der gerade um zwei Felder gezogene gegnerische Bauer en passant
+    geschlagen wird
+    '''
+    board = self.get_chessboard()
+    cell_occupation = board.positions[target]
+    if cell_occupation:
+      return cell_occupation.is_white != self.is_white
+    if target != board.get_en_passant_position():
       return False
+    # Der Bauer, der geschlagen wird, steht neben dem schlagenden Bauern
+    p = board.positions[target-10 if self.is_white else target+10]
+    return isinstance(p,Pawn) and p.is_white != self.is_white
       
   def is_allowed_cell(self,target, direction = None):
     '''
     Bei Bauern ist es richtungsabhängig, ob sie auf besetzte Felder können. 
     '''
-    # Für diagonale Richtungen muss das benachbarte Feld mit einem Gegner besetzt sein...
-    is_occupied = bool(manager.get_piece(target))
-    if abs(direction) == 9:
-      pos_en_passant = target - direction - direction/abs(direction)
-    elif abs(direction) == 11:
-      pos_en_passant = target - direction + direction/abs(direction)
-    else:
-      pos_en_passant = 10
-    p = manager.get_piece(pos_en_passant)
-    is_occupied_en_passant = bool(p)
+    # Für diagonale Richtungen muss das Feld mit einem Gegner besetzt sein
+    # oder en passant geschlagen werden können...
     if abs(direction) in [9,11]:
-      if super(Pawn,self).is_allowed_cell(target):
-        if is_occupied:
-          return True
-        elif is_occupied_en_passant and p.can_be_hit_en_passant():
-          return True
-        else:
-          return False
-      else:
-        return False
+      return on_board(target) and self.can_capture(target)
     # Ansonsten geht es nur für unbesetzte Felder
     else:
-      return manager.get_piece(target) == ''
+      return self.get_chessboard().get_piece(target) == ''
       
   def get_max_steps(self,direction):
     '''
     Bauern können nur aus der Startreihe zwei Schritte gehen
     '''
-    pos = self.get_position()
-    if self.is_white:
-      if pos/20 == 1 and direction == 10:
-        return 2
-      else:
-        return 1
-    else:
-      if pos/70 == 1 and direction == -10:
-        return 2
-      else:
-        return 1
+    if abs(direction) == 10:
+      return len(PAWN_PUSHES[self.is_white][self.position])
+    return 1
 
   def get_admissible_positions(self):
     '''
-    Berechnet eine Liste der erlaubten Zielpositionen des Bauern.
+    Berechnet eine Liste der erlaubten Zielpositionen des Bauern, in der
+    Reihenfolge der directions: schräg, geradeaus, schräg.
     '''
     admissible_positions=[]
-    directions = list(self.directions)
-    log.debug("Possible directions for %s at %i are %s", self.__class__.__name__, self.get_position(),str(directions))
-    for direction in directions:
-      pos = self.get_position()
-      step = pos + direction
-      count = 0
-      log.debug("Checking position %i for %s at %i", step, self.__class__.__name__, self.get_position())
-      while count < self.get_max_steps(direction) and self.is_allowed_cell(step,direction):
-        log.debug("Appending %i", step)
-        admissible_positions.append(step)
-        step += direction
-        count += 1
+    pos = self.position
+    positions = self.get_chessboard().positions
+    first, second = PAWN_CAPTURES[self.is_white][pos]
+    if first and self.can_capture(first):
+      admissible_positions.append(first)
+    for step in PAWN_PUSHES[self.is_white][pos]:
+      if positions[step] != '':
+        break
+      admissible_positions.append(step)
+    if second and self.can_capture(second):
+      admissible_positions.append(second)
     return admissible_positions
 
+  def get_attacked_positions(self, pos=None):
+    '''
+    Der Bauer greift nur die beiden Felder schräg vor sich an
+    '''
+    return PAWN_ATTACKS[self.is_white][pos or self.position]
+
 ###############################################################################
 # Der Turm
 ###############################################################################
@@ -282,6 +296,7 @@ class Pawn(Piece):
 class Rook(Piece):
   
   directions = (-10,-1,1,10)
+  __slots__ = ()
 
   def __str__(self):
     if self.is_white:
@@ -300,6 +315,8 @@ class Knight(Piece):
   '''
   
   directions = (-21,-19,-12,-8,8,12,19,21)
+  __slots__ = ()
+  is_sliding = False
   
   def __str__(self):
     if self.is_white:
@@ -309,14 +326,18 @@ class Knight(Piece):
   
   def get_admissible_positions(self):
     '''
-    Erlaubt sind alle Züge, die erlaubt sind.
+    Erlaubt sind alle Felder aus KNIGHT_SQUARES, die leer oder vom Gegner
+    besetzt sind.
     '''
-    pos = self.get_position()
-    log.debug("Going to check Knight at %i...", pos)
-    directions = [pos+d for d in self.directions]
-    admissible_positions = filter( lambda p : self.is_allowed_cell(p),directions )
-    log.debug("Can reach %s",str(admissible_positions))
-    return admissible_positions
+    positions = self.get_chessboard().positions
+    return [pos for pos in KNIGHT_SQUARES[self.position] \
+            if not positions[pos] or positions[pos].is_white != self.is_white]
+
+  def get_attacked_positions(self, pos=None):
+    '''
+    Alle Felder auf dem Brett, die der Springer erreicht
+    '''
+    return KNIGHT_SQUARES[pos or self.position]
     
 ###############################################################################
 # Der Läufer
@@ -325,6 +346,7 @@ class Knight(Piece):
 class Bishop(Piece):
 
   directions = (-11,-9,9,11)
+  __slots__ = ()
 
   def __str__(self):
     if self.is_white:
@@ -339,6 +361,7 @@ class Bishop(Piece):
 class Queen(Piece):
 
   directions = (-11,-10,-9,-1,1,9,10,11)
+  __slots__ = ()
 
   def __str__(self):
     if self.is_white:
@@ -353,7 +376,12 @@ class Queen(Piece):
 class King(Piece):
 
   directions = (-11,-10,-9,-1,1,9,10,11)
-  is_check_given = False
+  __slots__ = ('is_check_given',)
+  is_sliding = False
+
+  def __init__(self,pos,color=True):
+    self.is_check_given = False
+    super(King,self).__init__( pos, color)
 
   def __str__(self):
     if self.is_white:
@@ -384,40 +412,37 @@ class King(Piece):
     Der König darf nicht im Schach stehen.
     '''
     log.debug("Checking if %s can move from %i to %i",self.__class__.__name__,self.get_position(),pos)
-    admissible_positions = self.get_safe_positions()
-    if admissible_positions and pos in admissible_positions:
-      return True
-    else:
-      # Wenn der König schachmatt ist...
-      if self.is_check_given and not admissible_positions:
-        log.debug("No available position found!")
-        manager.finnish_game()
-      return False
+    return pos in self.get_safe_positions()
 
   def get_admissible_positions(self):
     '''
     Berechnet die grundsätzlich für den König erreichbaren Felder
     '''
-    position = self.get_position()
-    positions = [position+d for d in self.directions]
-    log.debug("Going to check King at %i...", position)
-    admissible_positions = filter(lambda pos: self.is_allowed_cell(pos),positions)
-    log.debug("Can reach %s", admissible_positions)
+    position = self.position
+    positions = self.get_chessboard().positions
+    admissible_positions = [pos for pos in KING_SQUARES[position] \
+      if not positions[pos] or positions[pos].is_white != self.is_white]
     # Hinzu kommen noch die Felder, auf die der König durch rochieren gelangen 
-    # könnte
-    if self.has_never_been_moved:
+    # könnte. Dazu muss er noch auf seinem Ausgangsfeld stehen und darf nicht
+    # im Schach stehen.
+    if self.has_never_been_moved and position == self.initial_position() \
+        and self.is_safe_position():
+      board = self.get_chessboard()
       if self.is_white:
-        rooks = manager.get_white_rooks()  
+        rooks = board.white_rooks
       else: 
-        rooks = manager.get_black_rooks()
+        rooks = board.black_rooks
       for r in rooks:
-        if r.has_never_been_moved:
-          pos_r = r.get_position()
+        pos_r = r.get_position()
+        # Der Turm muss unbewegt in seiner Ecke stehen und darf nicht
+        # geschlagen worden sein
+        if r.has_never_been_moved and pos_r in (position-4, position+3) \
+            and board.get_piece(pos_r) is r:
           pos_k = self.get_position()
           # Zunächst die Prüfung für die große Rochade...
           if pos_r < pos_k:
             # Keine Figur darf zwischen Turm und König stehen...
-            fields = manager.get_positions()[pos_r+1:pos_k]
+            fields = board.positions[pos_r+1:pos_k]
             if not filter(lambda p: isinstance(p,Piece),fields):
               is_safe_position = True
               # ...und der König auf seinem Weg auch nirgends im Schach stehen...
@@ -429,16 +454,28 @@ class King(Piece):
                 admissible_positions.append(position - 2)
           # ...dann die für die kleine Rochade...
           else:
-            fields = manager.get_positions()[pos_k+1:pos_r]
+            fields = board.positions[pos_k+1:pos_r]
             if not filter(lambda p: isinstance(p,Piece),fields):
               is_safe_position = True
-              for pos in range(pos_k+1,pos_r-1):
+              for pos in range(pos_k+1,pos_r):
                 if not self.is_safe_position(pos):
                   is_safe_position = False
               if is_safe_position:
                 log.debug("Die kleine Rochade ist für %s möglich.",self.get_color())          
                 admissible_positions.append(position + 2)
     return admissible_positions         
+
+  def get_attacked_positions(self, position=None):
+    '''
+    Die Nachbarfelder des Königs, ohne Rochade
+    '''
+    return KING_SQUARES[position or self.position]
+
+  def initial_position(self):
+    '''
+    Das Ausgangsfeld des Königs, e1 bzw. e8
+    '''
+    return 15 if self.is_white else 85
     
   def get_safe_positions(self):
     '''
@@ -453,3 +490,54 @@ class King(Piece):
         admissible_positions.remove(pos)
     return admissible_positions
 
+###############################################################################
+# Vorberechnete Zugtabellen. Für jedes Feld des Spielfelds stehen dort die
+# erreichbaren Felder, so dass bei der Zugerzeugung weder der Rand geprüft
+# noch gerechnet werden muss. Der Rand ist nur ein Feld breit, Springerzüge
+# können also über positions hinaus reichen.
+###############################################################################
+
+SQUARES = [pos for pos in range(11,89) if 1 <= pos % 10 <= 8]
+
+def on_board(pos):
+  return 11 <= pos <= 88 and 1 <= pos % 10 <= 8
+
+def get_ray(pos, direction):
+  '''
+  Die Felder von pos aus in direction bis zum Rand, ohne pos
+  '''
+  ray = []
+  step = pos + direction
+  while on_board(step):
+    ray.append(step)
+    step += direction
+  return ray
+
+KNIGHT_SQUARES = [None] * 100    # Felder, die ein Springer von pos erreicht
+KING_SQUARES = [None] * 100      # Nachbarfelder von pos
+RAYS = [None] * 100              # (Richtung, Strahl) in alle Richtungen bis zum Rand
+for pos in SQUARES:
+  KNIGHT_SQUARES[pos] = tuple(pos+d for d in Knight.directions if on_board(pos+d))
+  KING_SQUARES[pos] = tuple(pos+d for d in King.directions if on_board(pos+d))
+  RAYS[pos] = [(d, get_ray(pos, d)) for d in King.directions if on_board(pos+d)]
+
+# Läufer, Turm und Dame: je Feld die Strahlen ihrer Richtungen
+for piece_class in (Rook, Bishop, Queen):
+  piece_class.rays = [None] * 100
+  for pos in SQUARES:
+    piece_class.rays[pos] = tuple(ray for d, ray in RAYS[pos] if d in piece_class.directions)
+
+# Bauern nach Farbe: die Felder geradeaus, aus der Startreihe zwei, die
+# beiden Felder schräg vor ihm in der Reihenfolge der directions, None am
+# Rand, und dieselben ohne None als angegriffene Felder
+PAWN_PUSHES = {True: [None] * 100, False: [None] * 100}
+PAWN_CAPTURES = {True: [None] * 100, False: [None] * 100}
+PAWN_ATTACKS = {True: [None] * 100, False: [None] * 100}
+PROMOTION_SQUARES = {True: frozenset(range(81,89)), False: frozenset(range(11,19))}
+for is_white, forward, start_rank, diagonals in ((True, 10, 2, (9,11)), (False, -10, 7, (-9,-11))):
+  for pos in SQUARES:
+    steps = 2 if pos / 10 == start_rank else 1
+    PAWN_PUSHES[is_white][pos] = tuple(get_ray(pos, forward)[:steps])
+    captures = tuple(pos+d if on_board(pos+d) else None for d in diagonals)
+    PAWN_CAPTURES[is_white][pos] = captures
+    PAWN_ATTACKS[is_white][pos] = tuple(p for p in captures if p)
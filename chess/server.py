@@ -0,0 +1,346 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Ein Spielserver für viele Partien in einem Prozess. Die Spieler und
+# Zuschauer verbinden sich über TCP und schicken Befehle zeilenweise:
+#
+#   NEW                        -> GAME <id>
+#   JOIN <id> WHITE|BLACK      -> JOINED <id> <color>, dann BOARD
+#   WATCH <id>                 -> WATCHING <id>, dann BOARD
+#   MOVE <id> E2 E4 [D]        -> an alle der Partie: MOVED, BOARD, ggf. RESULT
+#   GAMES                      -> GAMES <id> <id> ...
+#   QUIT
+#
+#   BOARD <id> <FEN>
+#   MOVED <id> <Start> <Ziel> [<Figur>]
+#   RESULT <id> checkmate|stalemate|repetition|fifty-moves <Gewinner oder ->
+#   LEFT <id> <color>
+#   ERROR <Meldung>
+#
+# Bei RESULT steht der Gewinner nur nach checkmate, die anderen Ergebnisse
+# sind remis: Patt, dreimal dieselbe Stellung und 50 Züge ohne Bauernzug
+# oder Schlagen.
+#
+# Die Felder werden wie in IFChessboard.dic bezeichnet (E2 -> 25), die
+# Figur bei der Umwandlung mit D, T, L oder S.
+#
+# Eine Partie wird entfernt, sobald alle Spieler und Zuschauer gegangen
+# sind, und, solange noch ein Platz frei ist, auch ihr Ersteller. Eine
+# Verbindung kann höchstens MAX_GAMES solche offenen Partien haben.
+#
+# Python 2 hat kein asyncio; der Server läuft deshalb in der Ereignisschleife
+# von asyncore, jede Verbindung ist ein asynchat.async_chat. Mit poll()
+# statt select() gibt es keine Grenze von 1024 Verbindungen.
+#
+# Die Verteilung der Züge beachtet, wie viel eine Verbindung noch nicht
+# abgenommen hat: Zuschauer, die mehr als HIGH_WATER Bytes im Rückstand
+# sind, bekommen keine Zwischenstände mehr, sondern nur den letzten BOARD
+# je Partie, sobald ihr Puffer wieder geleert ist. Spieler bekommen alles;
+# wer mehr als MAX_PENDING Bytes nicht abnimmt, wird getrennt.
+#
+# Mit cache_size teilen sich alle Partien einen MoveCache für die erlaubten
+# Züge, die Eröffnungsstellungen werden dann nur einmal berechnet.
+
+import asynchat         # Zeilenweise lesen und gepuffert schreiben
+import asyncore         # Die Ereignisschleife
+import itertools        # Für die Nummern der Partien
+import logging          # Um Meldungen auszugeben
+import socket           # Für den Server-Socket
+from board import Chessboard, CHECKMATE
+from interface import IFChessboard
+from movecache import MoveCache
+import instrument       # Zähler und Zeiten je Partie
+
+log = logging.getLogger(__name__)
+
+HIGH_WATER = 16 * 1024      # Ab diesem Rückstand werden Zuschauer ausgedünnt
+MAX_PENDING = 256 * 1024    # Ab diesem Rückstand wird ein Spieler getrennt
+MAX_LINE = 1024             # Längste erlaubte Befehlszeile
+MAX_GAMES = 32              # Partien mit freiem Platz je Ersteller
+COLORS = {'WHITE': True, 'BLACK': False}
+
+class Game(object):
+  '''
+  Eine Partie auf dem Server mit ihren Spielern und Zuschauern
+  '''
+
+  def __init__(self, game_id, fen=None, move_cache=None):
+    self.id = game_id
+    self.board = Chessboard.from_fen(fen) if fen else Chessboard()
+    self.board.move_cache = move_cache
+    self.players = {True: None, False: None}
+    self.spectators = set()
+    self.owner = None       # Ersteller mit NEW, bis beide Plätze besetzt sind
+    self.result = None
+    self.counters = instrument.Counters()  # Messung der Züge, wenn eingeschaltet
+
+  def get_connections(self):
+    '''
+    Spieler und Zuschauer, jede Verbindung nur einmal, auch wenn sie beide
+    Farben spielt
+    '''
+    connections = []
+    for connection in [self.players[True], self.players[False]] + list(self.spectators):
+      if connection and connection not in connections:
+        connections.append(connection)
+    return connections
+
+  def get_board_line(self):
+    return "BOARD %i %s" % (self.id, self.board.to_fen())
+
+  def broadcast(self, line):
+    '''
+    Schickt line an alle Spieler und Zuschauer
+    '''
+    for connection in self.get_connections():
+      connection.send_line(line)
+
+  def broadcast_move(self, line):
+    '''
+    Schickt die MOVED-Zeile line und die neue Stellung. Zuschauer im
+    Rückstand bekommen nur die Stellung, und zwar später.
+    '''
+    board_line = self.get_board_line()
+    for connection in self.get_connections():
+      connection.send_update(self.id, line)
+      connection.send_update(self.id, board_line, is_board=True)
+
+  def is_abandoned(self):
+    return self.owner is None and not self.get_connections()
+
+###############################################################################
+# Verbindungen
+###############################################################################
+
+class Connection(asynchat.async_chat):
+  '''
+  Eine Verbindung zu einem Spieler oder Zuschauer
+  '''
+
+  def __init__(self, sock, server):
+    asynchat.async_chat.__init__(self, sock, server.map)
+    self.server = server
+    self.set_terminator('\n')
+    self.buffer = []
+    self.seats = {}         # Partie -> gespielte Farbe
+    self.created = set()    # Mit NEW erstellte Partien
+    self.watching = set()   # Partien als Zuschauer
+    self.stale = {}         # Partie -> zurückgehaltene BOARD-Zeile
+
+  def collect_incoming_data(self, data):
+    self.buffer.append(data)
+    if sum(len(d) for d in self.buffer) > MAX_LINE:
+      log.info("Line too long, closing %s", str(self.addr))
+      self.handle_close()
+
+  def found_terminator(self):
+    line = ''.join(self.buffer).strip()
+    self.buffer = []
+    if line:
+      try:
+        self.server.handle_command(self, line.split())
+      except ValueError, e:
+        self.send_line("ERROR %s" % e)
+
+  def get_pending(self):
+    '''
+    Bytes, die noch nicht gesendet werden konnten
+    '''
+    return sum(len(data) for data in self.producer_fifo if data)
+
+  def send_line(self, line):
+    if not self.connected:
+      return
+    if self.get_pending() > MAX_PENDING:
+      log.info("Client %s is not reading, closing", str(self.addr))
+      self.handle_close()
+      return
+    self.push(line + '\n')
+
+  def send_update(self, game_id, line, is_board=False):
+    '''
+    Wie send_line(), aber Zuschauer im Rückstand überspringen Züge; von den
+    BOARD-Zeilen wird nur die letzte je Partie aufgehoben
+    '''
+    if game_id in self.seats or self.get_pending() < HIGH_WATER:
+      self.send_line(line)
+    elif is_board:
+      self.stale[game_id] = line
+
+  def handle_write(self):
+    asynchat.async_chat.handle_write(self)
+    if self.stale and self.get_pending() < HIGH_WATER:
+      stale, self.stale = self.stale, {}
+      for game_id, line in sorted(stale.items()):
+        self.send_line(line)
+
+  def writable(self):
+    return asynchat.async_chat.writable(self) or (bool(self.stale) and self.connected)
+
+  def handle_close(self):
+    self.close()
+    self.server.remove_connection(self)
+
+###############################################################################
+# Der Server
+###############################################################################
+
+class GameServer(asyncore.dispatcher):
+  '''
+  Nimmt Verbindungen auf host:port an, port 0 wählt einen freien Port.
+  Jeder Server hat seine eigene Ereignisschleife map. Mit cache_size > 0
+  merkt er sich die erlaubten Züge von so vielen Stellungen.
+  '''
+
+  def __init__(self, host='127.0.0.1', port=0, cache_size=0):
+    self.map = {}
+    asyncore.dispatcher.__init__(self, map=self.map)
+    self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.set_reuse_addr()
+    self.bind((host, port))
+    self.listen(128)
+    self.address = self.socket.getsockname()
+    self.games = {}
+    self.game_ids = itertools.count(1)
+    self.interface = IFChessboard()
+    self.move_cache = MoveCache(cache_size) if cache_size else None
+    log.info("Game server listening on %s:%i", self.address[0], self.address[1])
+
+  def handle_accept(self):
+    pair = self.accept()
+    if pair:
+      sock, addr = pair
+      log.debug("Connection from %s", str(addr))
+      Connection(sock, self)
+
+  def poll(self, timeout=0.0, count=1):
+    '''
+    Bearbeitet anstehende Ereignisse, für Tests und eigene Schleifen
+    '''
+    asyncore.loop(timeout, True, self.map, count)
+
+  def serve_forever(self, timeout=30.0):
+    asyncore.loop(timeout, True, self.map)
+
+  def close_all(self):
+    for dispatcher in self.map.values():
+      dispatcher.close()
+    if self.move_cache is not None:
+      log.info("Move cache: %(entries)i positions, %(hits)i hits, %(misses)i misses, "
+               "%(evictions)i evictions", self.move_cache.get_stats())
+
+  def new_game(self, fen=None):
+    game = Game(next(self.game_ids), fen, self.move_cache)
+    self.games[game.id] = game
+    return game
+
+  def get_game(self, game_id):
+    try:
+      return self.games[int(game_id)]
+    except (KeyError, ValueError):
+      raise ValueError("No game %s" % game_id)
+
+  def remove_connection(self, connection):
+    for game_id in list(connection.seats) + list(connection.watching) + list(connection.created):
+      game = self.games.get(game_id)
+      if not game:
+        continue
+      if game.owner is connection:
+        game.owner = None
+      game.spectators.discard(connection)
+      for color, player in game.players.items():
+        if player is connection:
+          game.players[color] = None
+          # broadcast() kann eine andere Verbindung trennen und über deren
+          # remove_connection() die Partie schon entfernt haben
+          if self.games.get(game_id) is game:
+            game.broadcast("LEFT %i %s" % (game_id, 'WHITE' if color else 'BLACK'))
+      if game.is_abandoned() and self.games.pop(game_id, None):
+        log.debug("Game %i abandoned", game_id)
+    connection.seats.clear()
+    connection.watching.clear()
+    connection.created.clear()
+
+  ###########################################################################
+  # Befehle
+  ###########################################################################
+
+  def handle_command(self, connection, words):
+    '''
+    Führt einen Befehl aus. Raises ValueError for an invalid command.
+    '''
+    command, args = words[0].upper(), words[1:]
+    if command == 'NEW' and not args:
+      # Partien, die inzwischen entfernt wurden, zählen nicht mehr
+      connection.created.intersection_update(self.games)
+      if len(connection.created) >= MAX_GAMES:
+        raise ValueError("Too many open games")
+      game = self.new_game()
+      game.owner = connection
+      connection.created.add(game.id)
+      connection.send_line("GAME %i" % game.id)
+    elif command == 'JOIN' and len(args) == 2:
+      self.join(connection, self.get_game(args[0]), args[1].upper())
+    elif command == 'WATCH' and len(args) == 1:
+      game = self.get_game(args[0])
+      game.spectators.add(connection)
+      connection.watching.add(game.id)
+      connection.send_line("WATCHING %i" % game.id)
+      connection.send_line(game.get_board_line())
+    elif command == 'MOVE' and len(args) in (3, 4):
+      game = self.get_game(args[0])
+      with instrument.measuring(game.counters):
+        self.move(connection, game, args[1:])
+    elif command == 'GAMES' and not args:
+      connection.send_line(' '.join(['GAMES'] + [str(i) for i in sorted(self.games)]))
+    elif command == 'QUIT' and not args:
+      connection.close_when_done()
+    else:
+      raise ValueError("Invalid command %s" % ' '.join(words))
+
+  def join(self, connection, game, color):
+    if color not in COLORS:
+      raise ValueError("Invalid color %s" % color)
+    is_white = COLORS[color]
+    if game.players[is_white] not in (None, connection):
+      raise ValueError("%s is taken in game %i" % (color, game.id))
+    game.players[is_white] = connection
+    connection.seats[game.id] = is_white
+    if game.owner and game.players[True] and game.players[False]:
+      game.owner.created.discard(game.id)
+      game.owner = None
+    connection.send_line("JOINED %i %s" % (game.id, color))
+    connection.send_line(game.get_board_line())
+
+  def move(self, connection, game, args):
+    '''
+    Führt einen Zug in Koordinaten aus, z.B. E2 E4, und verteilt ihn
+    '''
+    board = game.board
+    if game.result:
+      raise ValueError("Game %i is over" % game.id)
+    if game.players[board.is_white] is not connection:
+      raise ValueError("Not your move in game %i" % game.id)
+    cells = [cell.upper() for cell in args[:2]]
+    for cell in cells:
+      if not self.interface.is_valid_expression(cell):
+        raise ValueError("Invalid square %s" % cell)
+    start, target = [self.interface.get_position(cell) for cell in cells]
+    promotion = args[2].upper() if len(args) > 2 else None
+    if promotion and promotion not in ('D', 'T', 'L', 'S'):
+      raise ValueError("Invalid piece %s" % args[2])
+    if promotion and not board.is_white:
+      promotion = promotion.lower()
+    moves = [m for m in board.legal_moves() if m[0] == start and m[1] == target]
+    if not moves:
+      raise ValueError("Illegal move %s %s" % tuple(cells))
+    if moves[0][2] and not promotion:
+      raise ValueError("Missing promotion piece for %s %s" % tuple(cells))
+    move = (start, target, promotion if moves[0][2] else None)
+    board.make_move(move)
+    game.broadcast_move(' '.join(["MOVED %i %s %s" % (game.id, cells[0], cells[1])] + \
+      ([move[2].upper()] if move[2] else [])))
+    game.result = board.get_result()
+    if game.result:
+      winner = ('BLACK' if board.is_white else 'WHITE') if game.result == CHECKMATE else '-'
+      game.broadcast("RESULT %i %s %s" % (game.id, game.result, winner))
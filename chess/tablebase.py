@@ -0,0 +1,575 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Endspieldatenbanken (tablebases) für drei und vier Figuren, z.B. KDK,
+# KTK, KBK oder KLSK, mit der Entfernung zum Matt in Halbzügen.
+#
+# generate() berechnet eine Tabelle durch Rückwärtsanalyse: zuerst werden
+# alle Mattstellungen bestimmt, dann wird von ihnen aus rückwärts gezogen.
+# Eine Stellung ist gewonnen, sobald ein Zug in eine verlorene Stellung
+# führt, und verloren, wenn alle Züge in gewonnene Stellungen des Gegners
+# führen. Schlagzüge und Umwandlungen führen in kleinere Tabellen, die
+# vorher berechnet oder geladen werden. Die Zugregeln kommen aus den
+# Figurenklassen (directions, is_sliding) und den Tabellen aus board.
+#
+# Eine Tabelle ist eine Datei mit einem vorzeichenbehafteten Byte je
+# Stellung: 0 remis (oder unmöglich), n > 0 die Farbe am Zug setzt in n
+# Halbzügen matt, n < 0 sie wird in -n-1 Halbzügen matt gesetzt.
+# Tablebase blendet die Dateien mit mmap ein und beantwortet probe() für
+# ein Chessboard ohne die Tabelle zu laden.
+#
+# Der Index einer Stellung setzt sich aus der Farbe am Zug und den Feldern
+# der Figuren zusammen, zuerst der weiße, dann der schwarze König. Ohne
+# Bauern wird das Brett so gedreht und gespiegelt, dass der weiße König im
+# Dreieck a1-d1-d4 steht, mit Bauern nur gespiegelt, so dass er auf den
+# Linien a-d steht. Rochade und en passant werden nicht berücksichtigt.
+
+import logging          # Um Meldungen auszugeben
+import mmap             # Um die Tabellen einzublenden
+import os               # Für die Dateien der Tabellen
+import struct           # Um einzelne Werte zu lesen
+import time             # Um die Rechenzeit zu melden
+from array import array # Für die Werte während der Berechnung
+from board import SQUARES, KING_SQUARES, KNIGHT_SQUARES, RAYS
+from pieces import Rook, Knight, Bishop, Queen, King, Pawn
+import zobrist          # Für Rochaderechte und en passant
+
+log = logging.getLogger(__name__)
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+SIGNED = struct.Struct('b')
+CLASSES = {'K': King, 'D': Queen, 'T': Rook, 'L': Bishop, 'S': Knight, 'B': Pawn}
+ORDER = 'DTLSB'               # Reihenfolge der Figuren nach dem König
+PROMOTIONS = 'DTLS'
+MAX_PIECES = 4
+
+class TablebaseError(Exception):
+  pass
+
+###############################################################################
+# Felder, Symmetrien und Linien
+###############################################################################
+
+INDEX = dict((pos, i) for i, pos in enumerate(SQUARES))
+
+def transform(pos, t):
+  '''
+  Das Feld pos nach Symmetrie t (0-7): Bit 0 spiegelt die Linien, Bit 1 die
+  Reihen, Bit 2 vertauscht Linien und Reihen
+  '''
+  f, r = pos % 10 - 1, pos / 10 - 1
+  if t & 4:
+    f, r = r, f
+  if t & 1:
+    f = 7 - f
+  if t & 2:
+    r = 7 - r
+  return 10 * (r + 1) + f + 1
+
+TRANSFORMS = [dict((pos, transform(pos, t)) for pos in SQUARES) for t in range(8)]
+# Erlaubte Felder des weißen Königs ohne und mit Bauern
+TRIANGLE = [pos for pos in SQUARES if pos % 10 - 1 <= 3 and pos / 10 - 1 <= pos % 10 - 1]
+HALF = [pos for pos in SQUARES if pos % 10 - 1 <= 3]
+
+# LINE[a][b] ist die Richtung von a nach b, falls b auf einer Linie oder
+# Diagonale von a liegt, BETWEEN[a][b] die Felder dazwischen
+LINE = [None] * 100
+BETWEEN = [None] * 100
+SLIDES = [None] * 100         # Richtung -> Felder bis zum Rand
+for pos in SQUARES:
+  LINE[pos] = {}
+  BETWEEN[pos] = {}
+  SLIDES[pos] = dict(RAYS[pos])
+  for direction, ray in RAYS[pos]:
+    for i, step in enumerate(ray):
+      LINE[pos][step] = direction
+      BETWEEN[pos][step] = ray[:i]
+KING_SETS = [set(s) if s else None for s in KING_SQUARES]
+KNIGHT_SETS = [set(s) if s else None for s in KNIGHT_SQUARES]
+
+###############################################################################
+# Material
+###############################################################################
+
+def parse_signature(signature):
+  '''
+  'KDK' -> ['K','k','D'], 'KTKL' -> ['K','k','T','l']: die Namen der
+  Figuren in der Reihenfolge des Index
+  '''
+  if signature.count('K') != 2 or not signature.startswith('K'):
+    raise TablebaseError("Invalid signature %s" % signature)
+  split = signature.index('K', 1)
+  white, black = signature[1:split], signature[split+1:]
+  if [c for c in white + black if c not in ORDER] or len(signature) > MAX_PIECES:
+    raise TablebaseError("Invalid signature %s" % signature)
+  return ['K', 'k'] + sorted(white, key=ORDER.index) + sorted(black.lower(), key=ORDER.lower().index)
+
+def get_signature(names):
+  '''
+  Das Gegenstück zu parse_signature()
+  '''
+  white = ''.join(sorted([n for n in names if n.isupper() and n != 'K'], key=ORDER.index))
+  black = ''.join(sorted([n.upper() for n in names if n.islower() and n != 'k'], key=ORDER.index))
+  return 'K' + white + 'K' + black
+
+def strength(part):
+  return (len(part), [-ORDER.index(c) for c in part])
+
+def is_flipped(signature):
+  '''
+  True, wenn Schwarz das stärkere Material hat. Tabellen werden nur für
+  Weiß als stärkere Seite berechnet, sonst werden die Farben getauscht.
+  '''
+  split = signature.index('K', 1)
+  return strength(signature[split+1:]) > strength(signature[1:split])
+
+def flip(names, squares, stm):
+  '''
+  Tauscht die Farben: Reihen spiegeln, Namen und Farbe am Zug umdrehen
+  '''
+  return ([n.swapcase() for n in names], [TRANSFORMS[2][pos] for pos in squares], 1 - stm)
+
+def is_insufficient(names):
+  '''
+  Nur die Könige, oder dazu ein Läufer oder Springer: remis
+  '''
+  others = [n for n in names if n not in 'Kk']
+  return not others or len(others) == 1 and others[0] in 'LSls'
+
+###############################################################################
+# Stellungen ohne Chessboard: names und squares gleich lang, stm 0 (Weiß)
+# oder 1 (Schwarz)
+###############################################################################
+
+def attacks(name, pos, target, occupied):
+  '''
+  True, wenn die Figur name auf pos das Feld target angreift
+  '''
+  kind = name.upper()
+  if kind == 'K':
+    return target in KING_SETS[pos]
+  if kind == 'S':
+    return target in KNIGHT_SETS[pos]
+  if kind == 'B':
+    return (target - pos if name == 'B' else pos - target) in (9, 11)
+  direction = LINE[pos].get(target)
+  if direction is None or direction not in CLASSES[kind].directions:
+    return False
+  for step in BETWEEN[pos][target]:
+    if step in occupied:
+      return False
+  return True
+
+def is_attacked(target, by_white, names, squares, occupied):
+  for name, pos in zip(names, squares):
+    if pos and name.isupper() == by_white and attacks(name, pos, target, occupied):
+      return True
+  return False
+
+def is_legal(names, squares, stm):
+  '''
+  Die Figuren stehen auf verschiedenen Feldern, keine Bauern auf der
+  ersten oder letzten Reihe, und die Farbe, die nicht am Zug ist, steht
+  nicht im Schach
+  '''
+  occupied = set(squares)
+  if len(occupied) < len(squares):
+    return False
+  for name, pos in zip(names, squares):
+    if name in 'Bb' and pos / 10 in (1, 8):
+      return False
+  king = squares[1] if stm == 0 else squares[0]
+  return not is_attacked(king, stm == 0, names, squares, occupied)
+
+def get_moves(names, squares, stm):
+  '''
+  Die erlaubten Züge der Farbe am Zug als (i, target, captured, promotion):
+  Figur i zieht nach target, captured ist der Index der geschlagenen Figur
+  oder None, promotion der Name der neuen Figur oder None
+  '''
+  white = stm == 0
+  occupied = dict((pos, i) for i, pos in enumerate(squares))
+  king = 0 if white else 1
+  moves = []
+  for i, (name, pos) in enumerate(zip(names, squares)):
+    if name.isupper() != white:
+      continue
+    kind = name.upper()
+    targets = []
+    if kind == 'K':
+      targets = KING_SQUARES[pos]
+    elif kind == 'S':
+      targets = KNIGHT_SQUARES[pos]
+    elif kind == 'B':
+      step = 10 if white else -10
+      if pos + step not in occupied:
+        targets = [pos + step]
+        if pos / 10 == (2 if white else 7) and pos + 2 * step not in occupied:
+          targets.append(pos + 2 * step)
+      for capture in (step - 1, step + 1):
+        j = occupied.get(pos + capture)
+        if j is not None and names[j].isupper() != white:
+          targets.append(pos + capture)
+    else:
+      for direction in CLASSES[kind].directions:
+        for step in SLIDES[pos].get(direction, ()):
+          targets.append(step)
+          if step in occupied:
+            break
+    for target in targets:
+      j = occupied.get(target)
+      if j is not None and names[j].isupper() == white:
+        continue
+      # Den Zug ausführen und prüfen, ob der eigene König sicher steht
+      after = list(squares)
+      after[i] = target
+      if j is not None:
+        after[j] = None
+      others = set(p for p in after if p)
+      if is_attacked(after[king], not white, names, after, others):
+        continue
+      if kind == 'B' and target / 10 in (1, 8):
+        for promotion in PROMOTIONS:
+          moves.append((i, target, j, promotion if white else promotion.lower()))
+      else:
+        moves.append((i, target, j, None))
+  return moves
+
+def get_unmoves(names, squares, stm):
+  '''
+  Die Stellungen, aus denen die Farbe, die nicht am Zug ist, mit einem
+  Zug ohne Schlagen und ohne Umwandlung in diese Stellung gezogen haben
+  kann. Liefert die Felder der Figuren vor dem Zug.
+  '''
+  white = stm == 1
+  occupied = set(squares)
+  result = []
+  for i, (name, pos) in enumerate(zip(names, squares)):
+    if name.isupper() != white:
+      continue
+    kind = name.upper()
+    if kind == 'K':
+      origins = [p for p in KING_SQUARES[pos] if p not in occupied]
+    elif kind == 'S':
+      origins = [p for p in KNIGHT_SQUARES[pos] if p not in occupied]
+    elif kind == 'B':
+      step = 10 if white else -10
+      origins = []
+      if pos - step not in occupied and (pos - step) / 10 not in (1, 8):
+        origins.append(pos - step)
+        if pos / 10 == (4 if white else 5) and pos - 2 * step not in occupied:
+          origins.append(pos - 2 * step)
+    else:
+      origins = []
+      for direction in CLASSES[kind].directions:
+        for step in SLIDES[pos].get(direction, ()):
+          if step in occupied:
+            break
+          origins.append(step)
+    for origin in origins:
+      before = list(squares)
+      before[i] = origin
+      result.append(before)
+  return result
+
+###############################################################################
+# Tabellen
+###############################################################################
+
+class Table(object):
+  '''
+  Die Werte einer Tabelle für das Material signature, in values (array,
+  mmap oder bytearray) mit einem Byte je Index
+  '''
+
+  def __init__(self, signature, values=None):
+    self.signature = signature
+    self.names = parse_signature(signature)
+    self.has_pawns = bool([n for n in self.names if n in 'Bb'])
+    self.kings = HALF if self.has_pawns else TRIANGLE
+    self.king_index = dict((pos, i) for i, pos in enumerate(self.kings))
+    self.transforms = (0, 1) if self.has_pawns else range(8)
+    self.size = 2 * len(self.kings) * 64 ** (len(self.names) - 1)
+    self.values = values
+
+  def encode(self, squares, stm):
+    index = stm * len(self.kings) + self.king_index[squares[0]]
+    for pos in squares[1:]:
+      index = index * 64 + INDEX[pos]
+    return index
+
+  def decode(self, index):
+    squares = []
+    for i in range(len(self.names) - 1):
+      index, square = divmod(index, 64)
+      squares.append(SQUARES[square])
+    stm, king = divmod(index, len(self.kings))
+    squares.append(self.kings[king])
+    squares.reverse()
+    return squares, stm
+
+  def canonical(self, squares, stm):
+    '''
+    Der kleinste Index aller symmetrischen Stellungen, in denen der weiße
+    König auf einem erlaubten Feld steht
+    '''
+    best = None
+    for t in self.transforms:
+      mapping = TRANSFORMS[t]
+      if mapping[squares[0]] not in self.king_index:
+        continue
+      moved = [mapping[pos] for pos in squares]
+      # Gleiche Figuren sind austauschbar
+      for i in range(3, len(moved)):
+        if self.names[i] == self.names[i-1] and moved[i] < moved[i-1]:
+          moved[i-1], moved[i] = moved[i], moved[i-1]
+      index = self.encode(moved, stm)
+      if best is None or index < best:
+        best = index
+    return best
+
+  def get_value(self, index):
+    return SIGNED.unpack_from(self.values, index)[0]
+
+  def lookup(self, squares, stm):
+    '''
+    Returns (result, plies) for the position, result from the point of
+    view of the side to move
+    '''
+    return to_result(self.get_value(self.canonical(squares, stm)))
+
+def to_result(value):
+  if value > 0:
+    return WIN, value
+  if value < 0:
+    return LOSS, -value - 1
+  return DRAW, 0
+
+###############################################################################
+# Berechnung
+###############################################################################
+
+class Generator(object):
+  '''
+  Berechnet Tabellen und die dafür nötigen kleineren Tabellen. Vorhandene
+  Dateien in directory werden verwendet, neue dort gespeichert.
+  '''
+
+  def __init__(self, directory=None):
+    self.directory = directory
+    self.tables = {}
+
+  def get_table(self, signature):
+    if signature not in self.tables:
+      path = self.directory and os.path.join(self.directory, signature + '.tb')
+      if path and os.path.exists(path):
+        values = array('b')
+        values.fromstring(open(path, 'rb').read())
+        self.tables[signature] = Table(signature, values)
+      else:
+        self.tables[signature] = self.generate(signature)
+    return self.tables[signature]
+
+  def lookup(self, names, squares, stm):
+    '''
+    (result, plies) für eine Stellung nach einem Schlagzug oder einer
+    Umwandlung, aus Sicht der Farbe am Zug
+    '''
+    present = [(n, p) for n, p in zip(names, squares) if p]
+    names, squares = [n for n, p in present], [p for n, p in present]
+    if is_insufficient(names):
+      return DRAW, 0
+    signature = get_signature(names)
+    if is_flipped(signature):
+      names, squares, stm = flip(names, squares, stm)
+      signature = get_signature(names)
+    table = self.get_table(signature)
+    # In die Reihenfolge der Tabelle bringen
+    order = sorted(range(len(names)), key=lambda i: (table.names.index(names[i]), i))
+    return table.lookup([squares[i] for i in order], stm)
+
+  def generate(self, signature):
+    '''
+    Berechnet die Tabelle für signature, z.B. 'KDK'
+    '''
+    if is_flipped(signature):
+      raise TablebaseError("Generate %s with white as the stronger side" % signature)
+    started = time.time()
+    table = Table(signature)
+    names = table.names
+    size = table.size
+    values = array('b', [0]) * size
+    remaining = array('B', [0]) * size
+    resolved = bytearray(size)
+    blocked = bytearray(size)       # Hat einen Zug ins Remis, kann nicht verlieren
+    exit_loss = {}                  # Längster Verlust über Schlagen/Umwandeln
+    buckets = {}
+    def push(plies, index, result):
+      buckets.setdefault(plies, []).append((index, result))
+
+    # Vorwärts: Züge zählen, Matt, Patt und Wechsel in andere Tabellen
+    for index in xrange(size):
+      squares, stm = table.decode(index)
+      if not is_legal(names, squares, stm) or table.canonical(squares, stm) != index:
+        resolved[index] = 1
+        continue
+      moves = get_moves(names, squares, stm)
+      if not moves:
+        king = squares[0] if stm == 0 else squares[1]
+        if is_attacked(king, stm == 1, names, squares, set(squares)):
+          push(0, index, LOSS)
+        else:
+          resolved[index] = 1
+        continue
+      # Gezählt werden verschiedene Folgestellungen, nicht Züge: symmetrische
+      # Züge führen in dieselbe Stellung und werden rückwärts nur einmal
+      # gefunden
+      internal, best_win, worst_loss = set(), None, None
+      for i, target, captured, promotion in moves:
+        after = list(squares)
+        after[i] = target
+        if captured is None and promotion is None:
+          internal.add(table.canonical(after, 1 - stm))
+          continue
+        if captured is not None:
+          after[captured] = None
+        moved = list(names)
+        if promotion:
+          moved[i] = promotion
+        result, plies = self.lookup(moved, after, 1 - stm)
+        if result == LOSS:
+          best_win = plies + 1 if best_win is None else min(best_win, plies + 1)
+        elif result == WIN:
+          worst_loss = plies + 1 if worst_loss is None else max(worst_loss, plies + 1)
+        else:
+          blocked[index] = 1
+      remaining[index] = len(internal)
+      if best_win is not None:
+        blocked[index] = 1
+        push(best_win, index, WIN)
+      if worst_loss is not None:
+        exit_loss[index] = worst_loss
+      if not internal and not blocked[index] and best_win is None:
+        push(worst_loss, index, LOSS)
+
+    # Rückwärts, nach der Zahl der Halbzüge bis zum Matt geordnet
+    plies = 0
+    while buckets:
+      for index, result in buckets.pop(plies, ()):
+        if resolved[index]:
+          continue
+        resolved[index] = 1
+        if plies > 126:
+          raise TablebaseError("Distance to mate %i does not fit into a byte" % plies)
+        values[index] = plies if result == WIN else -plies - 1
+        squares, stm = table.decode(index)
+        previous_indices = set(table.canonical(before, 1 - stm) \
+          for before in get_unmoves(names, squares, stm) if is_legal(names, before, 1 - stm))
+        for previous in previous_indices:
+          if resolved[previous]:
+            continue
+          if result == LOSS:
+            push(plies + 1, previous, WIN)
+          else:
+            remaining[previous] -= 1
+            if not remaining[previous] and not blocked[previous]:
+              push(max(plies, exit_loss.get(previous, 0) - 1) + 1, previous, LOSS)
+      plies += 1
+    table.values = values
+    log.info("Generated %s with %i entries in %.1f s", signature, size, time.time() - started)
+    if self.directory:
+      out = open(os.path.join(self.directory, signature + '.tb'), 'wb')
+      try:
+        values.tofile(out)
+      finally:
+        out.close()
+    return table
+
+###############################################################################
+# Abfragen
+###############################################################################
+
+class Tablebase(object):
+  '''
+  Die Tabellen in directory, mit mmap eingeblendet, sobald sie gebraucht
+  werden
+  '''
+
+  def __init__(self, directory):
+    self.directory = directory
+    self.tables = {}
+
+  def get_table(self, signature):
+    '''
+    Die Tabelle für signature oder None, falls es keine Datei dafür gibt
+    '''
+    if signature not in self.tables:
+      table = None
+      path = os.path.join(self.directory, signature + '.tb')
+      if os.path.exists(path):
+        f = open(path, 'rb')
+        try:
+          table = Table(signature, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        finally:
+          f.close()
+        if len(table.values) != table.size:
+          raise TablebaseError("%s has the wrong size" % path)
+      self.tables[signature] = table
+    return self.tables[signature]
+
+  def probe(self, board):
+    '''
+    Returns (result, plies) for the position on board from the point of
+    view of the side to move, with result WIN, DRAW or LOSS and plies the
+    distance to mate. None if there is no table for the position, if the
+    side not to move is in check, or if castling or en passant is possible.
+    '''
+    names, squares = [], []
+    for name, pieces in board.pieces.items():
+      for piece in pieces:
+        names.append(name)
+        squares.append(piece.get_position())
+    if len(names) > MAX_PIECES or 'K' not in names or 'k' not in names:
+      return None
+    if is_insufficient(names):
+      return DRAW, 0
+    if True in zobrist.castling_rights(board) or zobrist.en_passant_file(board) is not None:
+      return None
+    stm = 0 if board.is_white else 1
+    signature = get_signature(names)
+    if is_flipped(signature):
+      names, squares, stm = flip(names, squares, stm)
+      signature = get_signature(names)
+    table = self.get_table(signature)
+    if table is None:
+      return None
+    order = sorted(range(len(names)), key=lambda i: (table.names.index(names[i]), i))
+    squares = [squares[i] for i in order]
+    if not is_legal(table.names, squares, stm):
+      return None
+    return table.lookup(squares, stm)
+
+  def get_move(self, board):
+    '''
+    Der beste Zug nach der Tabelle: gewinnen so schnell wie möglich,
+    verlieren so spät wie möglich. None, wenn die Stellung oder eine
+    Folgestellung nicht in den Tabellen steht.
+    '''
+    best_move, best_key = None, None
+    for move in board.legal_moves():
+      board.make_move(move)
+      try:
+        probe = self.probe(board)
+      finally:
+        board.unmake_move()
+      if probe is None:
+        return None
+      result, plies = probe
+      # Aus Sicht des Ziehenden: Verlust des Gegners zuerst, schnellster Sieg
+      key = (-result, -plies if result == LOSS else plies)
+      if best_key is None or key > best_key:
+        best_move, best_key = move, key
+    return best_move
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Transpositionstabelle: merkt sich zu einer Stellung, identifiziert über
+# Chessboard.position_hash, den besten Zug, die Bewertung, die Suchtiefe
+# und die Art der Bewertung (exakt, untere oder obere Schranke).
+#
+# Die Tabelle hat eine feste Größe und legt die Einträge in typisierten
+# Arrays ab statt in einem dict, so dass der Speicher nicht mit der Zahl
+# der Stellungen wächst. Je zwei Einträge bilden einen Eimer: der erste
+# wird nur von einer mindestens gleich tiefen Suche ersetzt, der zweite
+# immer.
+
+from array import array   # Für die Einträge der Tabelle
+import logging            # Um Meldungen auszugeben
+from board import pack_move, unpack_move, NO_MOVE
+
+log = logging.getLogger(__name__)
+
+EMPTY = 0       # Art der Bewertung: kein Eintrag
+EXACT = 1       # exakter Wert
+LOWER = 2       # untere Schranke (beta cut-off)
+UPPER = 3       # obere Schranke (kein Zug hat alpha verbessert)
+
+# Python 2 kennt kein 'q'. Wo long nur 32 Bit hat, werden die Werte als
+# double abgelegt, das ist bis 2**53 ebenfalls exakt.
+SCORE_TYPE = 'l' if array('l').itemsize >= 8 else 'd'
+# Prüfschlüssel (obere 32 Bit des Hash), Zug, Wert, Tiefe, Art
+ENTRY_SIZE = array('I').itemsize + array('H').itemsize + array(SCORE_TYPE).itemsize + 2
+
+###############################################################################
+# Die Tabelle
+###############################################################################
+
+class TranspositionTable(object):
+  '''
+  Transpositionstabelle mit höchstens size_mb Megabyte für die Einträge
+  '''
+
+  def __init__(self, size_mb=16):
+    # Anzahl der Eimer als Zweierpotenz, damit der Index eine Bitmaske ist
+    buckets = 1
+    while buckets * 4 * ENTRY_SIZE <= size_mb * 1024 * 1024:
+      buckets *= 2
+    self.mask = buckets - 1
+    size = 2 * buckets
+    self.keys = array('I', [0]) * size
+    self.moves = array('H', [NO_MOVE]) * size
+    self.scores = array(SCORE_TYPE, [0]) * size
+    self.depths = array('b', [0]) * size
+    self.bounds = array('B', [EMPTY]) * size
+    self.hits = 0
+    self.misses = 0
+    log.debug("Transposition table with %i entries", size)
+
+  def __len__(self):
+    return len(self.keys)
+
+  def clear(self):
+    '''
+    Löscht alle Einträge
+    '''
+    self.bounds = array('B', [EMPTY]) * len(self)
+    self.hits = 0
+    self.misses = 0
+
+  def probe(self, key):
+    '''
+    Returns (move, score, depth, bound) stored for the hash key or None
+    '''
+    check = key >> 32 & 0xffffffff
+    i = 2 * (key & self.mask)
+    for slot in (i, i+1):
+      if self.bounds[slot] != EMPTY and self.keys[slot] == check:
+        self.hits += 1
+        return (unpack_move(self.moves[slot]), self.scores[slot],
+                self.depths[slot], self.bounds[slot])
+    self.misses += 1
+    return None
+
+  def store(self, key, move, score, depth, bound):
+    '''
+    Speichert einen Eintrag. Der erste Platz des Eimers wird nur bei
+    gleicher Stellung oder mindestens gleicher Tiefe ersetzt, sonst
+    landet der Eintrag auf dem zweiten Platz.
+    '''
+    check = key >> 32 & 0xffffffff
+    i = 2 * (key & self.mask)
+    if self.bounds[i] == EMPTY or self.keys[i] == check or depth >= self.depths[i]:
+      slot = i
+    else:
+      slot = i + 1
+    self.keys[slot] = check
+    self.moves[slot] = pack_move(move)
+    self.scores[slot] = score
+    self.depths[slot] = depth
+    self.bounds[slot] = bound
+
+  def usage(self):
+    '''
+    Anteil der belegten Einträge
+    '''
+    return float(len(self) - self.bounds.count(EMPTY)) / len(self)
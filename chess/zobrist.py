@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# Zobrist-Hashwerte für Stellungen. Jede Kombination aus Figur und Feld,
+# die Farbe am Zug, jedes Rochaderecht und jede Linie, auf der en passant
+# geschlagen werden kann, erhält eine feste 64-Bit-Zufallszahl. Der Hash
+# einer Stellung ist die XOR-Verknüpfung der zutreffenden Zahlen und kann
+# deshalb bei jedem Zug durch einige XOR-Operationen nachgeführt werden,
+# statt die Stellung jedesmal mit str() zu vergleichen.
+
+import random   # Für die Zufallszahlen
+from pieces import King, Rook, Pawn
+
+# Fester Startwert, damit die Hashwerte in allen Prozessen gleich sind
+generator = random.Random(20151118)
+
+NAMES = 'BTSLDKbtsldk'
+PIECES = dict((name, [generator.getrandbits(64) for pos in range(100)]) for name in NAMES)
+BLACK_TO_MOVE = generator.getrandbits(64)
+# Rochaderechte in der Reihenfolge weiß kurz, weiß lang, schwarz kurz, schwarz lang
+CASTLING = [generator.getrandbits(64) for i in range(4)]
+# en passant je Linie a-h
+EN_PASSANT = [generator.getrandbits(64) for i in range(8)]
+
+CORNERS = ((15, 18), (15, 11), (85, 88), (85, 81))
+
+def castling_rights(board):
+  '''
+  Die Rochaderechte als Liste von vier Wahrheitswerten. Ein Recht besteht,
+  solange König und Turm unbewegt auf ihren Ausgangsfeldern stehen.
+  '''
+  rights = []
+  for pos_k, pos_r in CORNERS:
+    king, rook = board.get_piece(pos_k), board.get_piece(pos_r)
+    is_white = pos_k == 15
+    rights.append(isinstance(king,King) and isinstance(rook,Rook) \
+      and king.is_white == is_white and rook.is_white == is_white \
+      and king.has_never_been_moved and rook.has_never_been_moved)
+  return rights
+
+def en_passant_file(board):
+  '''
+  Die Linie (0-7), auf der en passant geschlagen werden kann, oder None.
+  Gezählt wird nur, wenn auch ein gegnerischer Bauer daneben steht.
+  '''
+  pos = board.get_en_passant_position()
+  if pos is None:
+    return None
+  # Die Farbe folgt aus der Reihe des übersprungenen Felds, denn der Bauer
+  # selbst ist nach dem Schlagen en passant schon vom Brett, bevor der Zug
+  # in history steht
+  is_white = pos / 10 == 3
+  target = pos+10 if is_white else pos-10
+  if not isinstance(board.get_piece(target),Pawn):
+    return None
+  for neighbour in (target-1, target+1):
+    p = board.get_piece(neighbour)
+    if isinstance(p,Pawn) and p.is_white != is_white:
+      return pos % 10 - 1
+  return None
+
+def state_key(board):
+  '''
+  Der Anteil von Rochaderechten und en passant am Hash
+  '''
+  key = 0
+  for i, right in enumerate(castling_rights(board)):
+    if right:
+      key ^= CASTLING[i]
+  ep = en_passant_file(board)
+  if ep is not None:
+    key ^= EN_PASSANT[ep]
+  return key
+
+def compute(board):
+  '''
+  Berechnet den Hash einer Stellung vollständig. Chessboard führt ihn
+  dagegen bei jeder Änderung nach.
+  '''
+  key = 0
+  for pos, piece in enumerate(board.positions):
+    if piece:
+      key ^= PIECES[str(piece)][pos]
+  if not board.is_white:
+    key ^= BLACK_TO_MOVE
+  return key ^ state_key(board)
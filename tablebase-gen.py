@@ -0,0 +1,31 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging                  # Um Meldungen auszugeben
+import argparse                 # Damit beim Programmaufruf Werte übergeben werden können
+import os                       # Für das Verzeichnis der Tabellen
+import chess.tablebase as tablebase # Endspieldatenbanken berechnen
+
+parser = argparse.ArgumentParser(description="Berechnet Endspieldatenbanken mit der Entfernung zum Matt")
+parser.add_argument("signatures", nargs="+", metavar="SIGNATURE",
+                    help="material of the white and the black side, e.g. KDK, KTK or KLSK")
+parser.add_argument("-d", "--directory", default="tablebases",
+                    help="directory for the tables (default: tablebases)")
+parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+log = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+  if not os.path.isdir(args.directory):
+    os.makedirs(args.directory)
+  generator = tablebase.Generator(args.directory)
+  for signature in args.signatures:
+    try:
+      table = generator.get_table(signature)
+    except tablebase.TablebaseError, e:
+      log.error("%s: %s", signature, e)
+      raise SystemExit(1)
+    values = [table.get_value(i) for i in range(table.size)]
+    print "%s: %i positions, longest win %i plies" % (signature, table.size, max(values))
@@ -1,8 +1,11 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import logging  # Um Meldungen auszugeben
-import chess.manager, chess.pieces, chess.board
-import unittest
+import chess.manager, chess.pieces, chess.board, chess.perft, chess.zobrist
+import chess.transposition, chess.engine, chess.pgn, chess.instrument, chess.book, chess.tablebase
+import chess.evaluation, chess.server, chess.movecache
+from array import array
+import os, shutil, socket, tempfile, unittest
 
 logging.basicConfig(level=logging.DEBUG) # Setze auf logging.DEBUG, damit Meldungen ausgegeben werden
 log = logging.getLogger(__name__)
@@ -14,6 +17,9 @@ class TestChessPieces(unittest.TestCase):
         self.white_pawn = self.cb.get_piece(23)
         self.black_pawn = self.cb.get_piece(71)
 
+    def tearDown(self):
+        chess.manager.discard_chessboard()
+
     def test_pawn(self):
         self.assertEqual(self.white_pawn.get_admissible_positions(), [33,43],
                     "Bauer kann auf unerlaubte Positionen")
@@ -60,31 +66,882 @@ class TestChessPieces(unittest.TestCase):
         cb.black_king=chess.manager.newinstance('k',85)
         wr1=chess.manager.newinstance('T',11)
         wr2=chess.manager.newinstance('T',18)
-        cb.white_rooks.append(wr1)
-        cb.white_rooks.append(wr2)
         br=chess.manager.newinstance('t',86)
-        cb.black_rooks.append(br)
         cb.black_king=chess.manager.newinstance('k',85)
         cb.black_king=chess.manager.newinstance('k',85)
-        chess.manager.get_positions()[11] = wr1
-        chess.manager.get_positions()[15] = cb.white_king
-        chess.manager.get_positions()[18] = wr2
-        chess.manager.get_positions()[85] = cb.black_king
-        chess.manager.get_positions()[86] = br
+        cb.set_cell(11, wr1)
+        cb.set_cell(15, cb.white_king)
+        cb.set_cell(18, wr2)
+        cb.set_cell(85, cb.black_king)
+        cb.set_cell(86, br)
         self.assertFalse(cb.move_piece((15,17)),
                     "Die kleine Rochade geht nicht, aber Zug wird ausgeführt")
         self.assertTrue(cb.get_piece(18),
                     "Der Turm sollte noch da stehen")
+        # Der Turm auf f8 greift f1 und f2 an: ohne kleine Rochade
         ap = cb.get_king_of_moving_player().get_admissible_positions()
-        self.assertEqual(ap,[1],
+        self.assertEqual(ap,[14,16,24,25,26,13],
                     "Der König erreicht %s" % ap)
+        sp = cb.get_king_of_moving_player().get_safe_positions()
+        self.assertEqual(sp,[14,24,25,13],
+                    "Der König kann sicher auf %s" % sp)
         self.assertTrue(cb.move_piece((15,13)),
                     "Die große Rochade sollte gehen, aber Zug wird nicht ausgeführt")
         self.assertTrue(isinstance(cb.get_piece(13),chess.pieces.King)\
                     and isinstance(cb.get_piece(14),chess.pieces.Rook),
                     "Die große Rochade sollte durchgeführt sein, aber die Figuren stehen falsch")
-        
-        
+
+
+class TestMakeUnmake(unittest.TestCase):
+
+    def setUp(self):
+        chess.manager.discard_chessboard()
+
+    def tearDown(self):
+        chess.manager.discard_chessboard()
+
+    def assertRestored(self, cb, move):
+        before = str(cb)
+        depth = len(cb.undo_stack)
+        pieces = [(p, p.get_position(), p.has_never_been_moved) for p in cb.positions if p]
+        cb.make_move(move)
+        self.assertNotEqual(str(cb), before, "Zug %s wurde nicht ausgeführt" % str(move))
+        cb.unmake_move()
+        self.assertEqual(str(cb), before, "Zug %s wurde nicht zurückgenommen" % str(move))
+        self.assertEqual(pieces,
+                    [(p, p.get_position(), p.has_never_been_moved) for p in cb.positions if p],
+                    "Figuren nach Rücknahme von %s verändert" % str(move))
+        self.assertEqual(len(cb.undo_stack), depth, "undo_stack wurde nicht abgebaut")
+
+    def test_simple_move(self):
+        cb = chess.manager.get_chessboard()
+        self.assertRestored(cb, (25,45))
+        self.assertTrue(cb.is_white, "Weiß sollte wieder am Zug sein")
+        self.assertEqual(list(cb.history), [], "Die history sollte leer sein")
+
+    def test_castling(self):
+        cb = chess.manager.get_chessboard("T,,,,K,,,T\n,,,,,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,,,,,\n,,,,,,,\n,,,,,,,\n,,,,k,,,")
+        self.assertRestored(cb, (15,17))
+        self.assertRestored(cb, (15,13))
+        cb.make_move((15,17))
+        self.assertTrue(isinstance(cb.get_piece(16),chess.pieces.Rook),
+                    "Der Turm sollte auf 16 stehen")
+
+    def test_en_passant_and_promotion(self):
+        cb = chess.manager.get_chessboard(",,,,K,,,\n,,,,,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,B,,,,\n,,,,,,,\nb,,,,b,,,B\n,,,,k,,,")
+        cb.switch_color()
+        cb.make_move((75,55))
+        self.assertRestored(cb, (54,65))
+        cb.make_move((54,65))
+        self.assertFalse(cb.get_piece(55), "Der Bauer auf 55 hätte en passant geschlagen werden müssen")
+        cb.unmake_move()
+        cb.unmake_move()
+        cb.switch_color()
+        self.assertRestored(cb, (78,88,'D'))
+        cb.black_king.is_check_given = True
+        self.assertRestored(cb, (85,84))
+        self.assertTrue(cb.black_king.is_check_given, "is_check_given wurde nicht wiederhergestellt")
+
+    def test_independent_boards(self):
+        cb1 = chess.board.Chessboard()
+        cb2 = chess.board.Chessboard(",,,,K,,,\n,,,,S,,,\n,,,,,,,\n,,,,,,,\n"
+                                     ",,,,,,,\n,,,,,,,\n,,,,,,,\n,,,,t,,,k")
+        self.assertTrue(cb1.move_piece((25,45)), "E2E4 sollte auf dem ersten Brett gehen")
+        self.assertTrue(cb1.get_piece(45).get_chessboard() is cb1,
+                    "Der Bauer kennt sein Brett nicht")
+        self.assertFalse(cb2.is_valid_move((25,46)),
+                    "Der Springer auf dem zweiten Brett ist gefesselt, darf aber ziehen")
+        self.assertEqual(len(cb2.legal_moves()), 4, "Der König hat auf dem zweiten Brett 4 Züge")
+        self.assertEqual(len(cb1.legal_moves()), 30, "Nach E2E4 hat Weiß 30 Züge")
+        self.assertTrue(chess.manager.CHESSBOARD is None,
+                    "Das Spielbrett des managers sollte nicht angelegt werden")
+
+    def test_pinned_piece(self):
+        cb = chess.manager.get_chessboard(",,,,K,,,\n,,,,S,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,,,,,\n,,,,,,,\n,,,,,,,\n,,,,t,,,k")
+        self.assertFalse(cb.is_valid_move((25,46)),
+                    "Der Springer ist gefesselt, darf aber ziehen")
+        self.assertTrue(cb.is_valid_move((15,14)),
+                    "Der König darf ausweichen")
+
+    def test_attack_maps(self):
+        cb = chess.perft.load('kiwipete')
+        self.assertEqual(cb.attacks, cb.compute_attacks())
+        self.assertTrue(cb.is_attacked(54, False), "d5 wird vom Springer auf f6 angegriffen")
+        for move in cb.legal_moves():
+            cb.make_move(move)
+            for reply in cb.legal_moves():
+                cb.make_move(reply)
+                self.assertEqual(cb.attacks, cb.compute_attacks(),
+                            "Angriffe nach %s, %s falsch nachgeführt" % (str(move), str(reply)))
+                cb.unmake_move()
+            cb.unmake_move()
+        self.assertEqual(cb.attacks, cb.compute_attacks())
+
+    def test_piece_lists(self):
+        cb = chess.manager.get_chessboard(",,,,K,,,\n,,,,,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,,,,,\n,,,,,,,\nB,,,,,,,\n,t,,,k,,,")
+        rook = cb.get_piece(82)
+        cb.make_move((71,82,'T'))
+        self.assertEqual(cb.black_rooks, [], "Der geschlagene Turm steht noch in der Liste")
+        self.assertEqual(cb.white_rooks, [cb.get_piece(82)], "Der neue Turm fehlt")
+        self.assertEqual(cb.pieces['B'], [])
+        cb.unmake_move()
+        self.assertEqual(cb.black_rooks, [rook])
+        self.assertEqual(cb.white_rooks, [])
+        self.assertEqual(len(cb.get_pieces(True)), 2)
+
+    def test_game_result(self):
+        # Die Dame auf g7 ist durch den Läufer gedeckt: matt
+        cb = chess.board.Chessboard.from_fen("6k1/6Q1/5B2/8/8/8/8/6K1 b - - 0 1")
+        self.assertEqual(cb.get_result(), chess.board.CHECKMATE)
+        self.assertEqual(cb.results, {cb.position_hash: chess.board.CHECKMATE})
+        cb = chess.board.Chessboard()
+        self.assertEqual(cb.get_result(), None)
+        self.assertEqual(cb.results, {}, "Nur Matt und Patt werden gemerkt")
+        # Der König kann nicht ausweichen, der Springer aber den Turm schlagen
+        cb = chess.board.Chessboard.from_fen("6k1/5ppp/3n4/8/8/8/8/4R1K1 w - - 0 1")
+        self.assertTrue(cb.move_piece((15,85)))
+        cb.append_history((15,85))
+        cb.switch_color()
+        self.assertEqual(cb.black_king.get_safe_positions(), [])
+        self.assertEqual(cb.get_result(), None, "Der Springer kann den Turm schlagen")
+        self.assertFalse(cb.has_finnished)
+        # Patt: Schwarz hat keinen Zug, steht aber nicht im Schach
+        cb = chess.board.Chessboard.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertFalse(cb.has_legal_move())
+        self.assertEqual(cb.get_result(), chess.board.STALEMATE)
+
+    def test_slots(self):
+        cb = chess.manager.get_chessboard()
+        for piece in cb.get_pieces(True) + cb.get_pieces(False):
+            self.assertFalse(hasattr(piece, '__dict__'), "%s hat ein __dict__" % piece.__class__.__name__)
+        self.assertEqual(''.join(map(str, cb.positions[11:19])), "TSLDKLST")
+        self.assertEqual(cb.get_piece(72).directions, (-9,-10,-11))
+
+    def test_find_attacker(self):
+        cb = chess.perft.load('kiwipete')
+        for pos in chess.board.SQUARES:
+            for by_white in (True, False):
+                self.assertEqual(cb.find_attacker(pos, by_white) is not None,
+                            cb.is_attacked(pos, by_white),
+                            "Angriff auf %i falsch gefunden" % pos)
+        self.assertEqual(cb.find_attacker(54, False), 65, "d5 wird zuerst vom Bauern auf e6 gefunden")
+        # Der König darf nicht entlang der Linie des Turms ausweichen
+        cb = chess.manager.get_chessboard(",,,,K,,,\n,,,,,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,,,,,\n,,,,,,,\n,,,,,,,\nt,,,,,,,k")
+        cb.set_piece(cb.get_piece(81), 11)
+        self.assertFalse(cb.white_king.is_safe_position(16), "f1 steht hinter dem König im Schach")
+        self.assertEqual(sorted(cb.white_king.get_safe_positions()), [24, 25, 26])
+
+
+    def test_history(self):
+        cb = chess.board.Chessboard()
+        for move in [(25,45), (72,52), (45,55), (74,54), (55,64), (52,42), (64,73), (42,32), (73,82,'D')]:
+            cb.make_move(move)
+        self.assertEqual(cb.history.itemsize, 2)
+        self.assertEqual(chess.board.get_flag(cb.history[0]), chess.board.DOUBLE_STEP)
+        self.assertEqual(chess.board.get_flag(cb.history[2]), 0)
+        self.assertEqual(cb.get_last_move(), (73,82,'D'))
+        data = str(cb.get_history_data())
+        self.assertEqual(len(data), 18)
+        codes = array('H')
+        codes.fromstring(data)
+        self.assertEqual([chess.board.unpack_move(c)[:2] for c in codes][:3], [(25,45), (72,52), (45,55)])
+        cb.unmake_move()
+        self.assertEqual(len(cb.history), 8)
+        self.assertEqual(cb.get_last_move(), (42,32,None))
+        self.assertEqual(chess.board.unpack_move(chess.board.pack_move((15,17), chess.board.CASTLING)),
+                         (15,17,None))
+
+    def test_draws(self):
+        cb = chess.board.Chessboard()
+        shuffle = [(17,36), (87,66), (36,17), (66,87)]
+        for move in shuffle:
+            cb.make_move(move)
+        self.assertEqual(cb.get_repetitions(), 2)
+        self.assertEqual(cb.halfmove_clock, 4)
+        self.assertEqual(cb.get_result(), None)
+        for move in shuffle:
+            cb.make_move(move)
+        self.assertEqual(cb.get_result(), chess.board.REPETITION)
+        cb.unmake_move()
+        self.assertEqual(cb.get_result(), None)
+        self.assertEqual(cb.halfmove_clock, 7)
+        # Nach einem Bauernzug wird nicht weiter zurück verglichen
+        cb.make_move((66,87))
+        cb.make_move((25,45))
+        self.assertEqual(cb.halfmove_clock, 0)
+        self.assertEqual(cb.get_repetitions(), 1)
+        # 50-Züge-Regel, aber Matt geht vor
+        cb = chess.board.Chessboard.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80")
+        cb.make_move((17,28))
+        self.assertEqual(cb.get_result(), chess.board.FIFTY_MOVES)
+        cb.unmake_move()
+        cb.make_move((11,81))
+        self.assertEqual(cb.halfmove_clock, 100)
+        self.assertEqual(cb.get_result(), chess.board.CHECKMATE)
+        cb.unmake_move()
+        self.assertEqual(cb.halfmove_clock, 99)
+        self.assertEqual(cb.to_fen(), "6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80")
+
+class TestFen(unittest.TestCase):
+
+    def test_round_trip(self):
+        for fen in ["rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+                    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 12 40",
+                    "r3k2r/8/8/8/8/8/8/R3K2R b Qk - 3 17"]:
+            self.assertEqual(chess.board.Chessboard.from_fen(fen).to_fen(), fen)
+
+    def test_reference_positions(self):
+        cb = chess.board.Chessboard.from_fen(
+            "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+        self.assertEqual(cb.position_hash, chess.perft.load('kiwipete').position_hash)
+        self.assertEqual(chess.perft.perft(cb, 2), 2039)
+        self.assertEqual(chess.perft.load('initial').to_fen(),
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+
+    def test_moves(self):
+        cb = chess.board.Chessboard.from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+        cb.make_move((25,45))
+        self.assertEqual(cb.to_fen(), "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1")
+        cb.make_move((75,55))
+        cb.make_move((15,25))
+        self.assertEqual(cb.to_fen(), "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPPKPPP/RNBQ1BNR b kq - 1 2")
+        # Schwarz darf en passant schlagen
+        cb = chess.board.Chessboard.from_fen("4k3/8/8/8/3pP3/8/8/4K3 b - e3 0 1")
+        self.assertTrue((44,35,None) in cb.legal_moves(), "en passant fehlt")
+
+    def test_invalid(self):
+        for fen in ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w",
+                    "8/8/8/8/8/8/8/8 x", "8/8/8/8/8/8/8/8 w - e4"]:
+            self.assertRaises(ValueError, chess.board.Chessboard.from_fen, fen)
+
+
+class TestPgn(unittest.TestCase):
+
+    games = """[Event "Oper"]
+[White "Morphy"]
+[Black "Herzog von Braunschweig"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 {ein schwacher Zug} 4. dxe5 Bxf3 5. Qxf3 dxe5
+6. Bc4 Nf6 7. Qb3 Qe7 8. Nc3 c6 9. Bg5 b5 (9... Qb4 10. Qxb4) 10. Nxb5 cxb5
+11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7 14. Rd1 Qe6 15. Bxd7+ Nxd7
+16. Qb8+ Nxb8 17. Rd8# 1-0
+
+[Event "Fehler"]
+[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+
+1. a8=Q+ Kd7 2. Qb8 Ke9 *
+"""
+
+    def test_read_games(self):
+        games = list(chess.pgn.read_games(self.games.splitlines()))
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[0][0]['White'], "Morphy")
+        sans, result = chess.pgn.get_sans(games[0][1])
+        self.assertEqual(len(sans), 33, "Kommentare und Varianten gehören nicht zur Partie")
+        self.assertEqual(result, '1-0')
+
+    def test_validate_game(self):
+        morphy, error = map(chess.pgn.validate_game, chess.pgn.read_games(self.games.splitlines()))
+        self.assertEqual(morphy['error'], None)
+        self.assertEqual(morphy['plies'], 33)
+        self.assertEqual(morphy['fen'], "1n1Rkb1r/p4ppp/4q3/4p1B1/4P3/8/PPP2PPP/2K5 b k - 1 17")
+        self.assertEqual(error['plies'], 3)
+        self.assertTrue(error['error'].startswith("Invalid move Ke9"), error['error'])
+
+    def test_parse_san(self):
+        cb = chess.perft.load('kiwipete')
+        self.assertEqual(chess.pgn.parse_san(cb, 'O-O'), (15,17,None))
+        self.assertEqual(chess.pgn.parse_san(cb, 'Bxa6'), (25,61,None))
+        self.assertEqual(chess.pgn.parse_san(cb, 'Nxf7'), (55,76,None))
+        self.assertRaises(ValueError, chess.pgn.parse_san, cb, 'Ke3')
+
+
+class TestInstrument(unittest.TestCase):
+
+    def tearDown(self):
+        chess.instrument.disable()
+
+    def test_counters(self):
+        legal_moves = chess.board.Chessboard.__dict__['legal_moves']
+        chess.instrument.enable()
+        self.assertTrue(chess.instrument.is_enabled())
+        cb = chess.perft.load('initial')
+        self.assertEqual(chess.perft.perft(cb, 2), 400)
+        report = dict((name, calls) for name, calls, seconds in chess.instrument.get_report())
+        self.assertEqual(report['board copies'], 1)
+        self.assertEqual(report['move generation'], 21)
+        self.assertEqual(report['make_move'], 20)
+        chess.instrument.disable()
+        self.assertTrue(chess.board.Chessboard.__dict__['legal_moves'] is legal_moves,
+                    "Nach disable() sollen die ursprünglichen Methoden wieder gelten")
+        chess.perft.perft(cb, 1)
+        report = dict((name, calls) for name, calls, seconds in chess.instrument.get_report())
+        self.assertEqual(report['move generation'], 21)
+
+    def test_counters_per_game(self):
+        chess.instrument.enable()
+        games = [chess.instrument.Counters(), chess.instrument.Counters()]
+        for counters, depth in zip(games, (1, 2)):
+            with chess.instrument.measuring(counters):
+                chess.perft.perft(chess.perft.load('initial'), depth)
+        self.assertEqual([c.counts['make_move'] for c in games], [0, 20])
+        self.assertEqual([c.counts['move generation'] for c in games], [1, 21])
+        report = dict((name, calls) for name, calls, seconds in chess.instrument.get_report())
+        self.assertEqual(report['make_move'], 0, "Die Partien zählen nicht im aktiven Objekt")
+        self.assertTrue(chess.instrument.active is chess.instrument.DEFAULT)
+        chess.instrument.count('book hits', 2, games[0])
+        self.assertEqual(games[0].get_report()[-1], ('book hits', 2, None))
+
+
+class TestOpeningBook(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        cb = chess.perft.load('initial')
+        def entries():
+            yield cb, (25,45,None), 3
+            yield cb, (24,44,None), 1
+            yield cb, (22,32,None), 0
+            cb.make_move((25,45))
+            yield cb, (73,53,None), 5
+            # Stellungen, die im Buch nur die Suche füllen
+            for move in cb.legal_moves():
+                cb.make_move(move)
+                yield cb, cb.legal_moves()[0], 1
+                cb.unmake_move()
+        chess.book.write_book(self.path, entries())
+        self.book = chess.book.OpeningBook(self.path)
+
+    def tearDown(self):
+        self.book.close()
+        os.remove(self.path)
+
+    def test_get_moves(self):
+        cb = chess.perft.load('initial')
+        self.assertEqual(len(self.book), 24)
+        self.assertEqual(sorted(self.book.get_moves(cb)), [((24,44,None), 1), ((25,45,None), 3)])
+        cb.make_move((25,45))
+        self.assertEqual(self.book.get_moves(cb), [((73,53,None), 5)])
+        cb.make_move((73,53))
+        self.assertEqual(self.book.get_moves(cb), [((21,31,None), 1)])
+        cb.make_move((21,31))
+        self.assertEqual(self.book.get_moves(cb), [], "Die Stellung steht nicht im Buch")
+        engine = chess.engine.Engine(True, book=self.book)
+        self.assertTrue(engine.get_move(chess.perft.load('initial')) in [(24,44,None), (25,45,None)])
+        self.assertEqual(engine.depth, 0, "Ein Buchzug braucht keine Suche")
+
+    def test_polyglot_key(self):
+        # Die Schlüssel aus der Beschreibung des Polyglot-Buchformats
+        cb = chess.perft.load('initial')
+        keys = [0x463b96181691fc9c, 0x823c9b50fd114196, 0x0756b94461c50fb0,
+                0x662fafb965db29d4, 0x22a48b5a8e47ff78, 0x652a607ca3f242c1,
+                0x00fdd303c946bdd9]
+        self.assertEqual(chess.book.get_key(cb), keys[0])
+        for move, key in zip([(25,45), (74,54), (45,55), (76,56), (15,25), (85,76)], keys[1:]):
+            cb.make_move(move)
+            self.assertEqual(chess.book.get_key(cb), key, "Schlüssel nach %s" % str(move))
+        # Ein Buch eines anderen Programms: e2e4 in der Grundstellung
+        out = open(self.path, 'wb')
+        out.write(chess.book.ENTRY.pack(keys[0], 4 | 3 << 3 | 4 << 6 | 1 << 9, 1, 0))
+        out.close()
+        book = chess.book.OpeningBook(self.path)
+        self.assertEqual(book.get_moves(chess.perft.load('initial')), [((25,45,None), 1)])
+        book.close()
+
+    def test_encode_move(self):
+        cb = chess.perft.load('kiwipete')
+        for move in cb.legal_moves():
+            self.assertEqual(chess.book.decode_move(cb, chess.book.encode_move(cb, move)), move)
+        self.assertEqual(chess.book.encode_move(cb, (15,17,None)) & 63, 7, "Rochade als Zug auf h1")
+
+
+class TestTablebase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        chess.tablebase.Generator(cls.directory).get_table('KDK')
+        cls.tablebase = chess.tablebase.Tablebase(cls.directory)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def probe(self, fen):
+        return self.tablebase.probe(chess.board.Chessboard.from_fen(fen))
+
+    def test_signature(self):
+        self.assertEqual(chess.tablebase.parse_signature('KDK'), ['K','k','D'])
+        self.assertEqual(chess.tablebase.parse_signature('KTKL'), ['K','k','T','l'])
+        self.assertEqual(chess.tablebase.get_signature(['k','L','K','T']), 'KTLK')
+        self.assertTrue(chess.tablebase.is_flipped('KKD'))
+        self.assertRaises(chess.tablebase.TablebaseError, chess.tablebase.parse_signature, 'KDXK')
+
+    def test_probe(self):
+        WIN, DRAW, LOSS = chess.tablebase.WIN, chess.tablebase.DRAW, chess.tablebase.LOSS
+        self.assertEqual(self.probe("k7/8/1K6/8/8/8/7Q/8 w - - 0 1"), (WIN, 1))
+        self.assertEqual(self.probe("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1"), (LOSS, 0))
+        self.assertEqual(self.probe("k7/2Q5/8/8/8/8/8/7K b - - 0 1"), (DRAW, 0), "Patt")
+        # Gespiegelt und mit vertauschten Farben
+        self.assertEqual(self.probe("8/7q/8/8/8/1k6/8/K7 b - - 0 1"), (WIN, 1))
+        self.assertEqual(self.probe("7k/8/6K1/8/8/8/Q7/8 w - - 0 1"), (WIN, 1))
+        self.assertEqual(self.probe("k7/8/1K6/8/8/8/8/7R w - - 0 1"), None,
+                         "Für KTK gibt es keine Tabelle")
+        self.assertEqual(self.probe("k7/8/1K6/8/8/8/8/7N w - - 0 1"), (DRAW, 0))
+        self.assertEqual(self.probe("k7/8/1K6/8/8/8/8/7Q w - - 0 1"), None, "Schwarz steht im Schach")
+        self.assertEqual(self.probe(chess.board.Chessboard().to_fen()), None)
+        values = [self.tablebase.get_table('KDK').get_value(i) for i in range(81920)]
+        self.assertEqual(max(values), 19, "KDK ist in höchstens 10 Zügen matt")
+
+    def test_engine(self):
+        engine = chess.engine.Engine(True, tablebase=self.tablebase)
+        cb = chess.board.Chessboard.from_fen("k7/8/1K6/8/8/8/7Q/8 w - - 0 1")
+        self.assertEqual(engine.get_move(cb), (28,88,None))
+        self.assertEqual(engine.depth, 0, "Ein Zug aus der Tabelle braucht keine Suche")
+
+@unittest.skipIf(chess.evaluation.np is None, "NumPy is not installed")
+class TestEvaluation(unittest.TestCase):
+
+    def test_engine_scores(self):
+        names = ['initial', 'kiwipete', 'position3', 'position4', 'position5']
+        boards = [chess.perft.load(name) for name in names]
+        codes, white_to_move = chess.evaluation.encode(boards)
+        self.assertEqual(codes.shape, (5, 64))
+        scores = chess.evaluation.get_scores(codes)
+        total = scores['material'] + scores['position']
+        for board, score, is_white in zip(boards, total, white_to_move):
+            self.assertEqual(score if is_white else -score, chess.engine.evaluate(board))
+
+    def test_encode_fens(self):
+        boards = [chess.perft.load('kiwipete'), chess.perft.load('position4')]
+        codes, white_to_move = chess.evaluation.encode(boards)
+        fen_codes, fen_white_to_move = chess.evaluation.encode_fens([b.to_fen() for b in boards])
+        self.assertTrue((codes == fen_codes).all())
+        self.assertEqual(list(white_to_move), list(fen_white_to_move))
+        self.assertEqual(chess.evaluation.to_planes(codes).shape, (2, 12, 64))
+        self.assertEqual(chess.evaluation.to_planes(codes)[0, 5].sum(), 1, "Ein weißer König")
+        self.assertRaises(ValueError, chess.evaluation.encode_fens, ["8/8/8/8/8/8/8/9 w - - 0 1"])
+
+    def test_mobility_and_pawns(self):
+        codes, white_to_move = chess.evaluation.encode_fens([
+            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+            "4k3/8/8/8/8/8/P1PP3P/4K3 w - - 0 1",
+            "4k3/p7/8/8/8/8/PP6/4K3 w - - 0 1"])
+        scores = chess.evaluation.get_scores(codes)
+        # Nach e4: Springer 5, Läufer 5, Dame 4 gegen die beiden Springer mit 4
+        self.assertEqual(scores['mobility'][0], chess.evaluation.MOBILITY * (14 - 4))
+        # Zwei isolierte Bauern, vier Freibauern auf der zweiten Reihe
+        self.assertEqual(scores['pawns'][1], 2 * chess.evaluation.ISOLATED + 4 * chess.evaluation.PASSED[1])
+        self.assertEqual(scores['pawns'][2], -chess.evaluation.ISOLATED)
+        total = chess.evaluation.evaluate_batch(codes, white_to_move)
+        self.assertEqual(total[0], -chess.evaluation.evaluate_batch(codes)[0])
+
+class TestServer(unittest.TestCase):
+    '''
+    Die Clients sind einfache Sockets im selben Prozess; die Ereignisschleife
+    des Servers läuft, während auf Antworten gewartet wird
+    '''
+
+    def setUp(self):
+        self.high_water = chess.server.HIGH_WATER
+        self.server = chess.server.GameServer()
+
+    def tearDown(self):
+        chess.server.HIGH_WATER = self.high_water
+        self.server.close_all()
+
+    def connect(self, rcvbuf=None):
+        client = socket.socket()
+        if rcvbuf:
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        client.connect(self.server.address)
+        client.setblocking(0)
+        self.server.poll(0.01)
+        return [client, '']
+
+    def talk(self, client, line=None, n=1):
+        if line:
+            client[0].sendall(line + '\n')
+        lines = []
+        for i in range(200):
+            self.server.poll(0.001)
+            try:
+                client[1] += client[0].recv(65536)
+            except socket.error:
+                pass
+            while '\n' in client[1] and len(lines) < n:
+                answer, client[1] = client[1].split('\n', 1)
+                lines.append(answer)
+            if len(lines) >= n:
+                break
+        return lines
+
+    def test_game(self):
+        white, black, spectator = self.connect(), self.connect(), self.connect()
+        self.assertEqual(self.talk(white, 'NEW'), ['GAME 1'])
+        initial = 'BOARD 1 rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+        self.assertEqual(self.talk(white, 'JOIN 1 white', 2), ['JOINED 1 WHITE', initial])
+        self.assertEqual(self.talk(black, 'JOIN 1 BLACK', 2), ['JOINED 1 BLACK', initial])
+        self.assertEqual(self.talk(spectator, 'WATCH 1', 2), ['WATCHING 1', initial])
+        self.assertEqual(self.talk(black, 'JOIN 1 WHITE'), ['ERROR WHITE is taken in game 1'])
+        self.assertEqual(self.talk(black, 'MOVE 1 E7 E5'), ['ERROR Not your move in game 1'])
+        self.assertEqual(self.talk(white, 'MOVE 1 E2 E5'), ['ERROR Illegal move E2 E5'])
+        self.assertEqual(self.talk(white, 'MOVE 1 E2 X5'), ['ERROR Invalid square X5'])
+        for player, move in [(white, 'E2 E4'), (black, 'E7 E5'), (white, 'F1 C4'), (black, 'B8 C6'),
+                             (white, 'D1 H5'), (black, 'G8 F6'), (white, 'H5 F7')]:
+            opponent = black if player is white else white
+            self.assertEqual(self.talk(player, 'MOVE 1 ' + move, 2)[0], 'MOVED 1 ' + move)
+            self.assertEqual(self.talk(opponent, None, 2)[0], 'MOVED 1 ' + move)
+        self.assertEqual(self.talk(white, None), ['RESULT 1 checkmate WHITE'])
+        self.assertEqual(self.talk(black, None), ['RESULT 1 checkmate WHITE'])
+        lines = self.talk(spectator, None, 15)
+        self.assertEqual(len([l for l in lines if l.startswith('MOVED')]), 7)
+        self.assertEqual(lines[-1], 'RESULT 1 checkmate WHITE')
+        self.assertEqual(self.talk(black, 'MOVE 1 E8 F7'), ['ERROR Game 1 is over'])
+        self.assertEqual(self.talk(white, 'GAMES'), ['GAMES 1'])
+        self.assertEqual(self.talk(white, 'HELLO'), ['ERROR Invalid command HELLO'])
+
+    def test_slow_spectator(self):
+        chess.server.HIGH_WATER = 1000
+        player, spectator = self.connect(), self.connect(rcvbuf=1024)
+        games = range(1, 7)
+        for game in games:
+            self.talk(player, 'NEW')
+            self.talk(player, 'JOIN %i WHITE' % game, 2)
+            self.talk(player, 'JOIN %i BLACK' % game, 2)
+            self.talk(spectator, 'WATCH %i' % game, 2)
+        for connection in self.server.map.values():
+            if isinstance(connection, chess.server.Connection) and connection.watching:
+                connection.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024)
+        # Der Zuschauer liest nicht, während 6 * 32 Züge gespielt werden
+        moves = []
+        for f in 'ABCDEFGH':
+            moves += ['%s2 %s3' % (f, f), '%s7 %s6' % (f, f), '%s3 %s4' % (f, f), '%s6 %s5' % (f, f)]
+        for game in games:
+            for move in moves:
+                self.assertEqual(self.talk(player, 'MOVE %i %s' % (game, move), 2)[0],
+                                 'MOVED %i %s' % (game, move))
+        lines = self.talk(spectator, None, 10000)
+        self.assertTrue(len([l for l in lines if l.startswith('MOVED')]) < 6 * 32, "Züge werden übersprungen")
+        for game in games:
+            boards = [l for l in lines if l.startswith('BOARD %i ' % game)]
+            self.assertEqual(boards[-1], self.server.get_game(game).get_board_line(),
+                             "Die letzte Stellung kommt an")
+
+    def test_invalid_promotion(self):
+        game = self.server.new_game("4k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+        fen = game.board.to_fen()
+        player = self.connect()
+        self.talk(player, 'JOIN %i WHITE' % game.id, 2)
+        for piece in ('DT', 'DTLS', 'K', 'B'):
+            self.assertEqual(self.talk(player, 'MOVE %i A7 A8 %s' % (game.id, piece)),
+                             ['ERROR Invalid piece %s' % piece])
+        self.assertEqual(game.board.to_fen(), fen, "Die Stellung wurde verändert")
+        self.assertEqual(game.board.undo_stack, [])
+        self.assertEqual(self.talk(player, 'MOVE %i A7 A8 D' % game.id, 2)[0],
+                         'MOVED %i A7 A8 D' % game.id)
+
+    def test_unjoined_games(self):
+        creator, other = self.connect(), self.connect()
+        for i in range(chess.server.MAX_GAMES):
+            self.assertEqual(self.talk(creator, 'NEW'), ['GAME %i' % (i + 1)])
+        self.assertEqual(self.talk(creator, 'NEW'), ['ERROR Too many open games'])
+        # Mit beiden Spielern zählt die Partie nicht mehr als offen
+        self.talk(creator, 'JOIN 1 WHITE', 2)
+        self.talk(other, 'JOIN 1 BLACK', 2)
+        self.assertEqual(self.talk(creator, 'NEW'), ['GAME %i' % (chess.server.MAX_GAMES + 1)])
+        creator[0].close()
+        for i in range(20):
+            self.server.poll(0.01)
+        self.assertEqual(sorted(self.server.games), [1],
+                         "Nur die Partie mit einem verbliebenen Spieler bleibt")
+        other[0].close()
+        for i in range(20):
+            self.server.poll(0.01)
+        self.assertEqual(self.server.games, {})
+
+    def test_nested_remove(self):
+        server = self.server
+
+        class Closing(object):
+            '''Trennt sich beim Senden, wie eine Verbindung über MAX_PENDING'''
+            def __init__(self):
+                self.seats, self.watching, self.created = {}, set(), set()
+            def send_line(self, line):
+                server.remove_connection(self)
+
+        player, spectator = Closing(), Closing()
+        game = server.new_game()
+        game.players[True] = player
+        player.seats[game.id] = True
+        game.spectators.add(spectator)
+        spectator.watching.add(game.id)
+        server.remove_connection(player)
+        self.assertFalse(game.id in server.games, "Die verlassene Partie bleibt")
+
+    def test_move_cache(self):
+        self.server.close_all()
+        self.server = chess.server.GameServer(cache_size=16)
+        player = self.connect()
+        for game in (1, 2):
+            self.talk(player, 'NEW')
+            self.talk(player, 'JOIN %i WHITE' % game, 2)
+            self.talk(player, 'JOIN %i BLACK' % game, 2)
+            for move in ('E2 E4', 'E7 E5'):
+                self.assertEqual(self.talk(player, 'MOVE %i %s' % (game, move), 2)[0],
+                                 'MOVED %i %s' % (game, move))
+        stats = self.server.move_cache.get_stats()
+        self.assertEqual(stats['entries'], 3, "Drei Stellungen, in beiden Partien dieselben")
+        self.assertTrue(stats['hits'] >= 2, "Die zweite Partie nutzt die Einträge der ersten")
+
+class TestReplay(unittest.TestCase):
+
+    def test_replay(self):
+        cb = chess.board.Chessboard()
+        plies = chess.manager.replay(cb, ["E2E4 E7E5 # Königsbauer\n", "f1c4 b8c6\n", "\n", "D1-H5 G8F6 H5F7"])
+        self.assertEqual(plies, 7)
+        self.assertEqual(cb.get_result(), chess.board.CHECKMATE)
+        self.assertEqual(cb.to_fen(), "r1bqkb1r/pppp1Qpp/2n2n2/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR b KQkq - 0 4")
+
+    def test_promotion(self):
+        cb = chess.board.Chessboard()
+        chess.manager.replay(cb, ["A2A4 H7H5 A4A5 H5H4 A5A6 H4H3 A6B7 H3G2 B7A8D G2H1T"])
+        self.assertEqual(str(cb.get_piece(81)), 'D')
+        self.assertEqual(str(cb.get_piece(18)), 't')
+        self.assertTrue(cb.is_white)
+        self.assertRaises(ValueError, chess.manager.replay, chess.board.Chessboard(),
+                          ["A2A4 H7H5 A4A5 H5H4 A5A6 H4H3 A6B7 H3G2 B7A8"])
+
+    def test_invalid_moves(self):
+        self.assertRaises(ValueError, chess.manager.replay, chess.board.Chessboard(), ["E2E4 E7E5 E4E5"])
+        self.assertRaises(ValueError, chess.manager.replay, chess.board.Chessboard(), ["E2E9"])
+        self.assertRaises(ValueError, chess.manager.replay, chess.board.Chessboard(), ["E7E5"])
+
+class TestMoveGeneration(unittest.TestCase):
+
+    def tearDown(self):
+        chess.manager.discard_chessboard()
+
+    def assertPerft(self, name, depth, backend='mailbox'):
+        cb = chess.perft.load(name, backend)
+        expected = chess.perft.POSITIONS[name][1][depth-1]
+        self.assertEqual(chess.perft.perft(cb, depth), expected,
+                    "perft(%i) für %s sollte %i sein" % (depth, name, expected))
+
+    def test_legal_moves(self):
+        cb = chess.manager.get_chessboard()
+        moves = cb.legal_moves()
+        self.assertEqual(len(moves), 20, "Zu Beginn gibt es 20 Züge, nicht %i" % len(moves))
+        self.assertTrue((25,45,None) in moves, "E2E4 fehlt")
+
+    def test_check_evasions(self):
+        cb = chess.manager.get_chessboard(",S,,,K,,,\nT,,,,,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,,,,,\n,,,,,,,\n,,,,,,,\n,,,,t,,,k")
+        evasions, pins = cb.get_checks_and_pins(cb.white_king)
+        self.assertEqual(evasions, [25, 35, 45, 55, 65, 75, 85])
+        self.assertEqual(sorted(cb.legal_moves()),
+                    [(15,14,None), (15,16,None), (15,24,None), (15,26,None), (21,25,None)],
+                    "Nur Ausweichen oder Dazwischenziehen hebt das Schach auf")
+
+    def test_move_tables(self):
+        pieces = chess.pieces
+        self.assertEqual(pieces.KNIGHT_SQUARES[11], (23, 32))
+        self.assertEqual(pieces.KING_SQUARES[88], (77, 78, 87))
+        self.assertEqual(pieces.Rook.rays[11], ([12, 13, 14, 15, 16, 17, 18],
+                                                [21, 31, 41, 51, 61, 71, 81]))
+        self.assertEqual(len(pieces.Queen.rays[44]), 8)
+        self.assertEqual(pieces.PAWN_PUSHES[True][25], (35, 45))
+        self.assertEqual(pieces.PAWN_PUSHES[False][35], (25,))
+        self.assertEqual(pieces.PAWN_CAPTURES[False][71], (62, None))
+        self.assertEqual(pieces.PAWN_ATTACKS[True][18], (27,))
+
+    def test_perft(self):
+        self.assertPerft('initial', 2)
+        self.assertPerft('position3', 2)
+        for name in ('kiwipete', 'position4', 'position5', 'position6'):
+            self.assertPerft(name, 1)
+
+    def test_bitboard_backend(self):
+        for name in sorted(chess.perft.POSITIONS):
+            self.assertPerft(name, 2, 'bitboard')
+        cb = chess.perft.load('kiwipete', 'bitboard')
+        pieces = dict(cb.bitboards.pieces)
+        for move in cb.legal_moves():
+            cb.make_move(move)
+            cb.unmake_move()
+        self.assertEqual(cb.bitboards.pieces, pieces, "Bitboards nach unmake_move verändert")
+        self.assertTrue(cb.is_attacked(45, False), "e4 wird vom Springer auf f6 angegriffen")
+        self.assertFalse(cb.is_attacked(18, False), "h1 wird nicht angegriffen")
+        # Mit ignore fragen die Bitboards, das Ergebnis muss zu find_attacker() passen
+        for ignore in (15, 46, 65):
+            for pos in chess.board.SQUARES:
+                for by_white in (True, False):
+                    self.assertEqual(cb.is_attacked(pos, by_white, ignore),
+                                     cb.find_attacker(pos, by_white, ignore) is not None,
+                                     "is_attacked(%i, %s, %i)" % (pos, by_white, ignore))
+        # Ohne Angriffszähler müssen die Bitboards dieselben Angreifer finden
+        self.assertEqual(cb.attacks, None)
+        mailbox = chess.perft.load('kiwipete')
+        for pos in chess.board.SQUARES:
+            for by_white in (True, False):
+                self.assertEqual(sorted(cb.get_attackers(pos, by_white)),
+                                 sorted(mailbox.get_attackers(pos, by_white)),
+                                 "get_attackers(%i, %s)" % (pos, by_white))
+                self.assertEqual(cb.is_attacked(pos, by_white), mailbox.is_attacked(pos, by_white))
+
+
+class TestZobrist(unittest.TestCase):
+
+    def tearDown(self):
+        chess.manager.discard_chessboard()
+
+    def play(self, cb, moves):
+        for move in moves:
+            cb.make_move(move)
+            self.assertEqual(cb.position_hash, chess.zobrist.compute(cb),
+                        "Hash nach %s nicht korrekt nachgeführt" % str(move))
+        return cb.position_hash
+
+    def test_transposition(self):
+        cb = chess.manager.get_chessboard()
+        initial = cb.position_hash
+        h1 = self.play(cb, [(17,36), (87,66), (12,33), (82,63)])
+        for i in range(4):
+            cb.unmake_move()
+        self.assertEqual(cb.position_hash, initial, "Hash nach unmake_move nicht wiederhergestellt")
+        h2 = self.play(cb, [(12,33), (82,63), (17,36), (87,66)])
+        self.assertEqual(h1, h2, "Gleiche Stellung, aber unterschiedlicher Hash")
+
+    def test_en_passant_capture(self):
+        # Gegnerische Bauern auf beiden Seiten des Bauern auf e5
+        cb = chess.board.Chessboard.from_fen("4k3/8/8/3PpP2/8/8/8/4K3 w - e6 0 1")
+        h = cb.position_hash
+        moves = cb.legal_moves()
+        for move in [(54,65,None), (56,65,None)]:
+            self.assertTrue(move in moves, "%s fehlt" % str(move))
+            cb.make_move(move)
+            self.assertFalse(cb.get_piece(55), "Der Bauer auf 55 wurde nicht geschlagen")
+            self.assertEqual(cb.position_hash, chess.zobrist.compute(cb))
+            cb.unmake_move()
+            self.assertEqual(cb.position_hash, h, "Hash nach Rücknahme verändert")
+
+    def test_rights(self):
+        cb = chess.perft.load('kiwipete')
+        for move in cb.legal_moves():
+            self.play(cb, [move])
+            for reply in cb.legal_moves():
+                self.play(cb, [reply])
+                cb.unmake_move()
+            cb.unmake_move()
+        # Nach Ke1-f1-e1 ist dieselbe Stellung ohne Rochaderechte erreicht
+        h = cb.position_hash
+        self.play(cb, [(15,16), (85,86), (16,15), (86,85)])
+        self.assertNotEqual(cb.position_hash, h, "Rochaderechte fehlen im Hash")
+        # e2-e4 ermöglicht en passant nur, wenn ein schwarzer Bauer daneben steht
+        cb = chess.perft.load('initial')
+        self.play(cb, [(25,45), (72,52), (45,55), (74,54)])
+        with_ep = cb.position_hash
+        self.play(cb, [(12,33), (87,66), (33,12), (66,87)])
+        self.assertNotEqual(cb.position_hash, with_ep, "en passant fehlt im Hash")
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def tearDown(self):
+        chess.manager.discard_chessboard()
+
+    def test_replacement(self):
+        table = chess.transposition.TranspositionTable(1)
+        self.assertTrue(len(table) * chess.transposition.ENTRY_SIZE <= 1024*1024,
+                    "Die Tabelle ist größer als 1 MB")
+        key = 0x123456789abcdef0
+        other = key + (len(table) << 40)       # gleicher Eimer, andere Stellung
+        table.store(key, (25,45), 17, 5, chess.transposition.EXACT)
+        table.store(other, (72,81,'d'), -3, 2, chess.transposition.LOWER)
+        self.assertEqual(table.probe(key), ((25,45,None), 17, 5, chess.transposition.EXACT),
+                    "Der tiefere Eintrag wurde verdrängt")
+        self.assertEqual(table.probe(other), ((72,81,'d'), -3, 2, chess.transposition.LOWER),
+                    "Der flachere Eintrag fehlt auf dem zweiten Platz")
+        self.assertEqual(table.probe(key ^ 1 << 50), None, "Falscher Treffer")
+        table.clear()
+        self.assertEqual(table.probe(key), None, "Tabelle wurde nicht geleert")
+
+    def test_perft(self):
+        table = chess.transposition.TranspositionTable(1)
+        cb = chess.perft.load('position3', 'bitboard')
+        self.assertEqual(chess.perft.perft(cb, 3, table), 2812, "perft mit Tabelle ist falsch")
+        self.assertEqual(chess.perft.perft(cb, 3, table), 2812, "perft aus der Tabelle ist falsch")
+        self.assertTrue(table.hits, "Die Tabelle wurde nicht genutzt")
+
+
+class TestMoveCache(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = chess.movecache.MoveCache(2)
+        cache.put(1, [(25,45,None)])
+        cache.put(2, [(72,52,None)])
+        self.assertEqual(cache.get(1), (((25,45,None),), frozenset([(25,45)])))
+        cache.put(3, [])
+        self.assertTrue(2 not in cache, "Der am längsten nicht benutzte Eintrag bleibt")
+        self.assertEqual(cache.get(2), None)
+        self.assertEqual(cache.get(3), ((), frozenset()))
+        stats = cache.get_stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['evictions']),
+                         (2, 2, 1, 1))
+        self.assertRaises(ValueError, chess.movecache.MoveCache, 0)
+
+    def test_board(self):
+        cache = chess.movecache.MoveCache(64)
+        cb = chess.perft.load('kiwipete')
+        moves = cb.legal_moves()
+        cb.move_cache = cache
+        self.assertEqual(cb.legal_moves(), moves)
+        self.assertEqual(chess.perft.perft(cb, 2), 2039, "perft mit move_cache ist falsch")
+        for start in chess.board.SQUARES:
+            for target in chess.board.SQUARES:
+                self.assertEqual(cb.is_valid_move((start,target)),
+                                 (start,target,None) in moves or (start,target,'D') in moves)
+        other = chess.perft.load('kiwipete')
+        other.move_cache = cache
+        hits = cache.hits
+        self.assertEqual(other.legal_moves(), moves)
+        self.assertEqual(cache.hits, hits + 1, "Das zweite Brett nutzt den Eintrag nicht")
+        self.assertTrue(len(cache) <= 64)
+
+
+class TestEngine(unittest.TestCase):
+
+    def tearDown(self):
+        chess.manager.discard_chessboard()
+
+    def test_mate_in_one(self):
+        cb = chess.manager.get_chessboard("T,,,,,,,\n,,,,,,,\n,,,,,,,\n,,,,,,,\n"
+                                          ",,,,,,,\n,,,,,,K,\n,,,,,,,\n,,,,,,,k", 'bitboard')
+        engine = chess.engine.Engine(True, 10.0, max_depth=3)
+        self.assertEqual(engine.get_move(cb), (11,81,None), "Ta8 ist matt")
+        self.assertTrue(engine.score > chess.engine.MATE - chess.engine.MAX_PLY,
+                    "Das Matt wurde nicht erkannt")
+
+    def test_time_limit(self):
+        cb = chess.perft.load('kiwipete', 'bitboard')
+        before = str(cb)
+        engine = chess.engine.Engine(True, 0.3)
+        move = engine.get_move(cb)
+        self.assertTrue(move in cb.legal_moves(), "%s ist kein gültiger Zug" % str(move))
+        self.assertTrue(engine.elapsed < 2.0, "Die Zeitgrenze wurde nicht eingehalten")
+        self.assertEqual(str(cb), before, "Die Suche hat die Stellung verändert")
+        self.assertEqual(cb.undo_stack, [], "Die Suche hat Züge nicht zurückgenommen")
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging                  # Um Meldungen auszugeben
+import argparse                 # Damit beim Programmaufruf Werte übergeben werden können
+import itertools                # Um die Partien in Portionen zu verteilen
+import multiprocessing          # Für die parallele Prüfung
+import time                     # Zur Zeitmessung
+import chess.pgn as pgn         # PGN lesen und nachspielen
+
+parser = argparse.ArgumentParser(description="Spielt die Partien aus PGN-Dateien nach und meldet unerlaubte Züge")
+parser.add_argument("files", nargs="+", metavar="FILE", help="PGN file, may be gzipped (.gz), - for stdin")
+parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                    help="number of worker processes (default: number of CPUs)")
+parser.add_argument("--batch", type=int, default=1000,
+                    help="games handed to the workers at a time, bounds the memory used")
+parser.add_argument("-v", "--verbose", action="store_true", help="print the final position of every game")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.WARN)
+log = logging.getLogger(__name__)
+
+def describe(report):
+  '''
+  Eine Zeile mit den wichtigsten Tags der Partie
+  '''
+  tags = report['tags']
+  return "%s - %s (%s)" % (tags.get('White', '?'), tags.get('Black', '?'), tags.get('Event', '?'))
+
+if __name__ == "__main__":
+  pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+  games, plies, illegal = 0, 0, 0
+  started = time.time()
+  for filename in args.files:
+    stream = pgn.read_games(pgn.open_pgn(filename))
+    while True:
+      # Nur je eine Portion Partien lesen, damit der Speicher nicht mit der
+      # Größe der Datei wächst
+      batch = list(itertools.islice(stream, args.batch))
+      if not batch:
+        break
+      reports = pool.map(pgn.validate_game, batch) if pool else map(pgn.validate_game, batch)
+      for report in reports:
+        games += 1
+        plies += report['plies']
+        if report['error']:
+          illegal += 1
+          print "%s game %i: %s: %s" % (filename, games, describe(report), report['error'])
+        elif args.verbose:
+          print "%s game %i: %s: %s %s" % (filename, games, describe(report), report['fen'], report['result'])
+  elapsed = time.time() - started
+  if pool:
+    pool.close()
+    pool.join()
+  print "%i games, %i plies, %i with errors in %.2f s: %.1f games/s, %.0f plies/s" % \
+    (games, plies, illegal, elapsed, games/elapsed if elapsed else 0, plies/elapsed if elapsed else 0)
+  raise SystemExit(1 if illegal else 0)